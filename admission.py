@@ -0,0 +1,154 @@
+import asyncio
+import heapq
+import itertools
+
+from fastapi import HTTPException, status
+
+# Приоритеты маршрутов: чем меньше число, тем раньше запрос получает соединение
+READ = 0
+WRITE = 1
+BULK = 2
+
+
+class Overloaded(Exception):
+    """
+    Очередь ожидания переполнена или запрос ждал слишком долго.
+    """
+
+
+class PriorityLimiter:
+    """
+    Ограничитель конкурентности с приоритетной очередью ожидания.
+
+    Одновременно выполняется не больше capacity запросов. Остальные ждут в очереди,
+    освободившийся слот получает ожидающий с наименьшим значением приоритета,
+    при равных приоритетах - пришедший раньше. Если очередь заполнена, новый запрос
+    вытесняет из нее последний ожидающий запрос с худшим приоритетом, и отказ получает
+    тот: при перегрузке первыми отбрасываются BULK, затем WRITE.
+    """
+
+    def __init__(self, capacity: int, max_queue: int, max_wait: float):
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_use = 0
+        self.queued = 0
+        self._waiters = []
+        self._counter = itertools.count()
+
+    async def acquire(self, priority: int) -> None:
+        """
+        Занимает слот, при необходимости дожидаясь своей очереди.
+
+        Args:
+        priority (int): Приоритет запроса.
+
+        Raises:
+        Overloaded: Если очередь заполнена или слот не освободился за max_wait секунд.
+        """
+        if self.in_use < self.capacity and not self.queued:
+            self.in_use += 1
+            return
+        if self.queued >= self.max_queue and not self._shed(priority):
+            raise Overloaded()
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), waiter))
+        self.queued += 1
+        try:
+            await asyncio.wait({waiter}, timeout=self.max_wait)
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        if not waiter.done():
+            self._abandon(waiter)
+            raise Overloaded()
+        # Вытесненный запрос получает Overloaded из future
+        waiter.result()
+
+    def release(self) -> None:
+        """
+        Освобождает слот, передавая его следующему ожидающему, если он есть.
+        """
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if waiter.done():
+                continue
+            self.queued -= 1
+            # Слот передается напрямую, in_use не меняется
+            waiter.set_result(None)
+            return
+        self.in_use -= 1
+
+    def _shed(self, priority: int) -> bool:
+        """
+        Вытесняет из очереди последний пришедший запрос с приоритетом хуже priority.
+
+        Returns:
+        bool: True, если место в очереди освободилось.
+        """
+        waiting = [entry for entry in self._waiters if not entry[2].done()]
+        if not waiting:
+            return False
+        victim = max(waiting)
+        if victim[0] <= priority:
+            return False
+        victim[2].set_exception(Overloaded())
+        self.queued -= 1
+        return True
+
+    def _abandon(self, waiter) -> None:
+        if waiter.done():
+            # Слот успели выдать одновременно с отменой - возвращаем его. Вытесненный
+            # запрос слота не получал и уже не учитывается в очереди
+            if not waiter.cancelled() and waiter.exception() is None:
+                self.release()
+            return
+        waiter.cancel()
+        self.queued -= 1
+
+
+class AdmissionController:
+    """
+    Допуск запросов к маршрутам, работающим с БД.
+
+    Размер ограничителя равен емкости пула соединений (pool_size + max_overflow),
+    поэтому запросы ждут в приоритетной очереди до того, как займут поток и сессию,
+    а при перегрузке сразу получают 503 с заголовком Retry-After.
+    """
+
+    def __init__(self, capacity: int, max_queue: int, max_wait: float, retry_after: int,
+                 enabled: bool = True):
+        self.enabled = enabled
+        self.retry_after = retry_after
+        self.limiter = PriorityLimiter(capacity, max_queue, max_wait)
+
+    def slot(self, priority: int):
+        """
+        Создает зависимость FastAPI, удерживающую слот на время обработки запроса.
+
+        Args:
+        priority (int): Приоритет маршрута (READ, WRITE или BULK).
+
+        Returns:
+        Асинхронная функция-зависимость для параметра dependencies маршрута.
+        """
+
+        async def admit():
+            if not self.enabled:
+                yield
+                return
+            try:
+                await self.limiter.acquire(priority)
+            except Overloaded:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="service overloaded",
+                    headers={"Retry-After": str(self.retry_after)},
+                )
+            try:
+                yield
+            finally:
+                self.limiter.release()
+
+        return admit
@@ -1,3 +1,4 @@
+import re
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
@@ -33,6 +34,14 @@ target_metadata = Base.metadata
 # ... etc.
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    # Секции таблицы блюд создаются событием DDL в models.py и в метаданных не описаны
+    table = object if type_ == "table" else getattr(object, "table", None)
+    if reflected and table is not None and re.fullmatch(r"dishes_p\d+", table.name):
+        return False
+    return True
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -50,6 +59,7 @@ def run_migrations_offline() -> None:
         url=url,
         target_metadata=target_metadata,
         literal_binds=True,
+        include_object=include_object,
         dialect_opts={"paramstyle": "named"},
     )
 
@@ -77,6 +87,7 @@ def run_migrations_online():
         context.configure(
             connection=connection,
             target_metadata=Base.metadata,  # Используем метаданные из моделей
+            include_object=include_object,
         )
 
         with context.begin_transaction():
@@ -0,0 +1,83 @@
+"""Partition dishes by menu
+
+Revision ID: 3f1d9c2b7e60
+Revises: 7bcce707d21d
+Create Date: 2026-10-19 13:20:44.918203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1d9c2b7e60'
+down_revision: Union[str, None] = '7bcce707d21d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Должно совпадать с models.DISH_PARTITIONS
+PARTITIONS = 16
+
+INDEXES = ('menu_id', 'title', 'submenu_id', 'change_seq')
+
+
+def _drop_indexes() -> None:
+    for column in INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS ix_dishes_{column}')
+
+
+def _create_indexes() -> None:
+    for column in INDEXES:
+        op.create_index(op.f(f'ix_dishes_{column}'), 'dishes', [column], unique=False)
+
+
+def upgrade() -> None:
+    # Секционировать существующую таблицу нельзя: строки переносятся в новую таблицу
+    op.rename_table('dishes', 'dishes_unpartitioned')
+    op.execute('ALTER INDEX dishes_pkey RENAME TO dishes_unpartitioned_pkey')
+    _drop_indexes()
+    op.create_table('dishes',
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('menu_id', sa.Uuid(), nullable=False),
+    sa.Column('title', sa.String(), nullable=True),
+    sa.Column('description', sa.String(), nullable=True),
+    sa.Column('price', sa.String(), nullable=True),
+    sa.Column('submenu_id', sa.Uuid(), nullable=True),
+    sa.Column('change_seq', sa.BigInteger(), nullable=True),
+    sa.ForeignKeyConstraint(['menu_id'], ['menus.id'], ),
+    sa.ForeignKeyConstraint(['submenu_id'], ['submenus.id'], ),
+    sa.PrimaryKeyConstraint('id', 'menu_id'),
+    postgresql_partition_by='HASH (menu_id)'
+    )
+    for remainder in range(PARTITIONS):
+        op.execute(f'CREATE TABLE dishes_p{remainder} PARTITION OF dishes '
+                   f'FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder})')
+    _create_indexes()
+    # Блюда без подменю не принадлежат ни одному меню и не переносятся
+    op.execute('INSERT INTO dishes (id, menu_id, title, description, price, submenu_id, change_seq) '
+               'SELECT d.id, s.menu_id, d.title, d.description, d.price, d.submenu_id, d.change_seq '
+               'FROM dishes_unpartitioned d JOIN submenus s ON s.id = d.submenu_id')
+    op.drop_table('dishes_unpartitioned')
+
+
+def downgrade() -> None:
+    op.rename_table('dishes', 'dishes_partitioned')
+    _drop_indexes()
+    op.execute('ALTER INDEX dishes_pkey RENAME TO dishes_partitioned_pkey')
+    op.create_table('dishes',
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('title', sa.String(), nullable=True),
+    sa.Column('description', sa.String(), nullable=True),
+    sa.Column('price', sa.String(), nullable=True),
+    sa.Column('submenu_id', sa.Uuid(), nullable=True),
+    sa.Column('change_seq', sa.BigInteger(), nullable=True),
+    sa.ForeignKeyConstraint(['submenu_id'], ['submenus.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute('INSERT INTO dishes (id, title, description, price, submenu_id, change_seq) '
+               'SELECT id, title, description, price, submenu_id, change_seq FROM dishes_partitioned')
+    op.drop_table('dishes_partitioned')
+    for column in INDEXES[1:]:
+        op.create_index(op.f(f'ix_dishes_{column}'), 'dishes', [column], unique=False)
@@ -0,0 +1,41 @@
+"""Add change sequence and tombstones
+
+Revision ID: af6a65cdd651
+Revises: 0184174fa974
+Create Date: 2026-10-19 10:12:40.518312
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'af6a65cdd651'
+down_revision: Union[str, None] = '0184174fa974'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(sa.schema.CreateSequence(sa.Sequence('catalogue_change_seq')))
+    for table in ('menus', 'submenus', 'dishes'):
+        op.add_column(table, sa.Column('change_seq', sa.BigInteger(), nullable=True))
+        # Существующие строки получают отметки, чтобы попасть в первую полную синхронизацию
+        op.execute(f"UPDATE {table} SET change_seq = nextval('catalogue_change_seq')")
+        op.create_index(op.f(f'ix_{table}_change_seq'), table, ['change_seq'], unique=False)
+    op.create_table('tombstones',
+    sa.Column('change_seq', sa.BigInteger(), nullable=False),
+    sa.Column('entity', sa.String(), nullable=False),
+    sa.Column('entity_id', sa.UUID(), nullable=False),
+    sa.PrimaryKeyConstraint('change_seq')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('tombstones')
+    for table in ('dishes', 'submenus', 'menus'):
+        op.drop_index(op.f(f'ix_{table}_change_seq'), table_name=table)
+        op.drop_column(table, 'change_seq')
+    op.execute(sa.schema.DropSequence(sa.Sequence('catalogue_change_seq')))
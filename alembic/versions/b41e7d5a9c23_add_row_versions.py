@@ -0,0 +1,30 @@
+"""Add row versions
+
+Revision ID: b41e7d5a9c23
+Revises: 3f1d9c2b7e60
+Create Date: 2026-10-19 15:42:07.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41e7d5a9c23'
+down_revision: Union[str, None] = '3f1d9c2b7e60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Постоянное значение по умолчанию не переписывает таблицы; у секций блюд колонка
+    # появляется вместе с родительской таблицей
+    for table in ('menus', 'submenus', 'dishes'):
+        op.add_column(table, sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    for table in ('dishes', 'submenus', 'menus'):
+        op.drop_column(table, 'version')
@@ -0,0 +1,80 @@
+"""
+Сравнение размера и стоимости сжатия типичных ответов API.
+
+Запуск:
+    python benchmarks/bench_compression.py --menus 200 --dishes 40
+"""
+import argparse
+import json
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from middleware import BrotliCompressor, GzipCompressor, brotli  # noqa: E402
+
+
+def make_menus_payload(count: int) -> bytes:
+    menus = [
+        {
+            "id": str(uuid.uuid4()),
+            "title": f"Menu {i}",
+            "description": f"Description for menu number {i}",
+            "submenus_count": i % 7,
+            "dishes_count": i % 31,
+        }
+        for i in range(count)
+    ]
+    return json.dumps(menus).encode()
+
+
+def make_dishes_payload(count: int) -> bytes:
+    dishes = [
+        {
+            "id": str(uuid.uuid4()),
+            "title": f"Dish {i}",
+            "description": "Fresh seasonal ingredients, slowly cooked and served hot. " * 3,
+            "price": f"{10 + i * 0.37:.2f}",
+        }
+        for i in range(count)
+    ]
+    return json.dumps(dishes).encode()
+
+
+def measure(name: str, factory, payload: bytes, rounds: int):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        compressor = factory()
+        compressed = compressor.compress(payload) + compressor.finish()
+    elapsed = (time.perf_counter() - started) / rounds
+    ratio = len(compressed) / len(payload)
+    print(f"  {name:<12} {len(compressed):>10} B  ratio {ratio:6.3f}  "
+          f"{elapsed * 1e6:10.1f} us/op  {len(payload) / elapsed / 1e6:8.1f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--menus", type=int, default=200)
+    parser.add_argument("--dishes", type=int, default=40)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    payloads = {
+        f"read_menus ({args.menus})": make_menus_payload(args.menus),
+        f"read_dishes ({args.dishes})": make_dishes_payload(args.dishes),
+        "read_menu (1)": make_menus_payload(1)[1:-1],
+    }
+    codecs = [(f"gzip-{level}", lambda level=level: GzipCompressor(level)) for level in (1, 6, 9)]
+    if brotli is not None:
+        codecs += [(f"br-{quality}", lambda quality=quality: BrotliCompressor(quality)) for quality in (1, 4, 11)]
+
+    for title, payload in payloads.items():
+        print(f"{title}: {len(payload)} B uncompressed")
+        for name, factory in codecs:
+            measure(name, factory, payload, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Сравнение запросов со счетчиками подменю и блюд: GROUP BY по соединению menus -> submenus -> dishes
+против заранее агрегированных подзапросов из crud.py на синтетическом наборе данных.
+Печатает время на вызов, а для Postgres еще и планы EXPLAIN ANALYZE.
+
+Запуск:
+    python benchmarks/bench_counts.py --menus 200 --submenus 10 --dishes 20 [--url postgresql://...]
+"""
+import argparse
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import Integer, bindparam, distinct, func, insert, select, text  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+import crud  # noqa: E402
+import models  # noqa: E402
+from database import Base, build_engine, config_url  # noqa: E402
+
+# Запросы в том виде, в котором они были до перехода на агрегирующие подзапросы
+JOINED_MENUS_WITH_COUNTS = (
+    select(
+        *crud._MENU_COLUMNS,
+        func.coalesce(func.count(models.SubMenu.id), 0).label("submenus_count"),
+        func.coalesce(func.count(models.Dish.id), 0).label("dishes_count"),
+    )
+    .outerjoin(models.SubMenu, models.Menu.id == models.SubMenu.menu_id)
+    .outerjoin(models.Dish, models.SubMenu.id == models.Dish.submenu_id)
+    .group_by(models.Menu.id)
+    .offset(bindparam("skip", type_=Integer))
+    .limit(bindparam("limit", type_=Integer))
+)
+
+JOINED_MENU_WITH_COUNTS = (
+    select(
+        *crud._MENU_COLUMNS,
+        func.count(distinct(models.SubMenu.id)).label("submenus_count"),
+        func.count(models.Dish.id).label("dishes_count"),
+    )
+    .outerjoin(models.SubMenu, models.Menu.id == models.SubMenu.menu_id)
+    .outerjoin(models.Dish, models.SubMenu.id == models.Dish.submenu_id)
+    .where(models.Menu.id == bindparam("menu_id"))
+    .group_by(models.Menu.id)
+)
+
+JOINED_SUBMENU_WITH_COUNT = (
+    select(*crud._SUBMENU_COLUMNS, func.count(distinct(models.Dish.id)).label("dishes_count"))
+    .outerjoin(models.SubMenu.dishes)
+    .where(models.SubMenu.id == bindparam("submenu_id"), models.SubMenu.menu_id == bindparam("menu_id"))
+    .group_by(models.SubMenu.id)
+)
+
+
+def seed(db: Session, menus: int, submenus: int, dishes: int):
+    menu_rows = [{"id": uuid.uuid4(), "title": f"Bench {i}", "description": "Bench"} for i in range(menus)]
+    submenu_rows = [{"id": uuid.uuid4(), "title": "Bench", "description": "Bench", "menu_id": menu["id"]}
+                    for menu in menu_rows for _ in range(submenus)]
+    dish_rows = [{"id": uuid.uuid4(), "title": f"Bench {i}", "description": "Bench", "price": "1.00",
+                  "submenu_id": submenu["id"], "menu_id": submenu["menu_id"]}
+                 for submenu in submenu_rows for i in range(dishes)]
+    for model, rows in ((models.Menu, menu_rows), (models.SubMenu, submenu_rows), (models.Dish, dish_rows)):
+        db.execute(insert(model), rows)
+    db.commit()
+    if db.bind.dialect.name == "postgresql":
+        # Без свежей статистики планировщик считает таблицы пустыми и выбирает не те планы
+        db.execute(text("ANALYZE menus, submenus, dishes"))
+        db.commit()
+    return menu_rows[0]["id"], submenu_rows[0]["id"]
+
+
+def measure(name: str, fn, calls: int):
+    result = fn()
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    elapsed = (time.perf_counter() - started) / calls
+    print(f"  {name:<8} {elapsed * 1e3:10.2f} ms/call")
+    return elapsed, result
+
+
+def explain(db: Session, statement, params):
+    sql = statement.params(params).compile(dialect=db.bind.dialect, compile_kwargs={"literal_binds": True})
+    rows = db.connection().exec_driver_sql(f"EXPLAIN (ANALYZE, COSTS OFF) {sql}")
+    return "\n".join(f"    {row[0]}" for row in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--menus", type=int, default=200)
+    parser.add_argument("--submenus", type=int, default=10, help="подменю в каждом меню")
+    parser.add_argument("--dishes", type=int, default=20, help="блюд в каждом подменю")
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--url", default="sqlite://", help="БД для замера, по умолчанию SQLite в памяти")
+    args = parser.parse_args()
+
+    engine = build_engine(args.url, config_url.pool)
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        menu_id, submenu_id = seed(db, args.menus, args.submenus, args.dishes)
+        print(f"{args.menus} menus, {args.menus * args.submenus} submenus, "
+              f"{args.menus * args.submenus * args.dishes} dishes")
+        cases = {
+            "get_menus": (JOINED_MENUS_WITH_COUNTS, crud._MENUS_WITH_COUNTS, {"skip": 0, "limit": args.menus}),
+            "get_menu_with_counts": (JOINED_MENU_WITH_COUNTS, crud._MENU_WITH_COUNTS, {"menu_id": menu_id}),
+            "get_specific_submenu": (JOINED_SUBMENU_WITH_COUNT, crud._SUBMENU_WITH_COUNT,
+                                     {"menu_id": menu_id, "submenu_id": submenu_id}),
+        }
+        try:
+            for title, (joined, aggregated, params) in cases.items():
+                print(f"{title}:")
+                before, old_rows = measure("join", lambda: db.execute(joined, params).mappings().all(), args.calls)
+                after, new_rows = measure("subquery", lambda: db.execute(aggregated, params).mappings().all(),
+                                          args.calls)
+                print(f"  time per call: {(1 - after / before) * 100:.0f}% less")
+                wrong = sum(dict(old) != dict(new) for old, new in zip(
+                    sorted(old_rows, key=lambda row: row["id"]), sorted(new_rows, key=lambda row: row["id"])))
+                if wrong:
+                    print(f"  counts differ in {wrong} rows (the join inflates submenus_count)")
+                if engine.dialect.name == "postgresql":
+                    print(f"  join plan:\n{explain(db, joined, params)}")
+                    print(f"  subquery plan:\n{explain(db, aggregated, params)}")
+        finally:
+            db.rollback()
+            for model in (models.Dish, models.SubMenu, models.Menu):
+                db.query(model).filter(model.title.like("Bench%")).delete(synchronize_session=False)
+            db.commit()
+
+
+if __name__ == "__main__":
+    main()
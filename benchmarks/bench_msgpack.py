@@ -0,0 +1,100 @@
+"""
+Сравнение JSON и MessagePack для ответов списков: размер тела (без сжатия и с gzip)
+и стоимость кодирования на сервере и декодирования у клиента.
+
+Запуск:
+    python benchmarks/bench_msgpack.py --menus 200 --submenus 50 --dishes 200
+"""
+import argparse
+import json
+import sys
+import time
+import uuid
+import zlib
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from negotiation import msgpack  # noqa: E402
+
+
+def make_menus(count: int) -> list:
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "title": f"Menu {i}",
+            "description": f"Description for menu number {i}",
+            "submenus_count": i % 7,
+            "dishes_count": i % 31,
+        }
+        for i in range(count)
+    ]
+
+
+def make_submenus(count: int) -> list:
+    return [
+        {"id": str(uuid.uuid4()), "title": f"Submenu {i}", "description": "Закуски", "dishes_count": i % 23}
+        for i in range(count)
+    ]
+
+
+def make_dishes(count: int) -> list:
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "title": f"Dish {i}",
+            "description": "Fresh seasonal ingredients, slowly cooked and served hot.",
+            "price": f"{10 + i * 0.37:.2f}",
+        }
+        for i in range(count)
+    ]
+
+
+def per_op(fn, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - started) / rounds
+
+
+def report(title: str, json_value: float, msgpack_value: float, unit: str) -> None:
+    change = (1 - msgpack_value / json_value) * 100
+    print(f"  {title:<16} {json_value:12.1f} {msgpack_value:12.1f} {unit:<6}"
+          f"{abs(change):5.0f}% {'less' if change >= 0 else 'more'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--menus", type=int, default=200)
+    parser.add_argument("--submenus", type=int, default=50)
+    parser.add_argument("--dishes", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+    if msgpack is None:
+        parser.error("msgpack не установлен")
+
+    # Сервер кодирует тем же JSONResponse.render, что и обычные ответы
+    render_json = JSONResponse(None).render
+    payloads = {
+        f"read_menus ({args.menus})": make_menus(args.menus),
+        f"read_submenus ({args.submenus})": make_submenus(args.submenus),
+        f"read_dishes ({args.dishes})": make_dishes(args.dishes),
+    }
+    for title, content in payloads.items():
+        as_json = render_json(content)
+        as_msgpack = msgpack.packb(content, use_bin_type=True)
+        assert msgpack.unpackb(as_msgpack) == json.loads(as_json)
+        print(f"{title}")
+        print(f"  {'':<16} {'json':>12} {'msgpack':>12}")
+        report("size", len(as_json), len(as_msgpack), "B")
+        report("size gzip-6", len(zlib.compress(as_json, 6)), len(zlib.compress(as_msgpack, 6)), "B")
+        report("encode", per_op(lambda: render_json(content), args.rounds) * 1e6,
+               per_op(lambda: msgpack.packb(content, use_bin_type=True), args.rounds) * 1e6, "us/op")
+        report("decode", per_op(lambda: json.loads(as_json), args.rounds) * 1e6,
+               per_op(lambda: msgpack.unpackb(as_msgpack), args.rounds) * 1e6, "us/op")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Сравнение обычной и секционированной хешем по menu_id таблицы блюд в Postgres: загрузка
+с построением индексов, чтения с ключом секционирования, удаление целых меню и VACUUM.
+Таблицы строятся в отдельной схеме bench_partitions и удаляются после замера.
+
+Запуск:
+    python benchmarks/bench_partitions.py --url postgresql://... --rows 10000000 --menus 10000
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import text  # noqa: E402
+
+import models  # noqa: E402
+from database import build_engine, config_url  # noqa: E402
+
+SCHEMA = "bench_partitions"
+
+COLUMNS = """
+    id uuid NOT NULL,
+    menu_id uuid NOT NULL,
+    title varchar,
+    description varchar,
+    price varchar,
+    submenu_id uuid,
+    change_seq bigint,
+    PRIMARY KEY (id, menu_id)
+"""
+
+# Те же индексы, что у models.Dish
+INDEXES = ("menu_id", "title", "submenu_id", "change_seq")
+
+
+def menu_uuid(number: int) -> str:
+    return f"md5('menu {number}')::uuid"
+
+
+def create_table(conn, name: str, partitions: int) -> None:
+    if partitions:
+        conn.execute(text(f"CREATE TABLE {name} ({COLUMNS}) PARTITION BY HASH (menu_id)"))
+        for remainder in range(partitions):
+            conn.execute(text(f"CREATE TABLE {name}_p{remainder} PARTITION OF {name} "
+                              f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"))
+    else:
+        conn.execute(text(f"CREATE TABLE {name} ({COLUMNS})"))
+
+
+def load(conn, name: str, rows: int, menus: int, submenus: int) -> None:
+    conn.execute(text(f"""
+        INSERT INTO {name} (id, menu_id, title, description, price, submenu_id, change_seq)
+        SELECT gen_random_uuid(),
+               md5('menu ' || (i % :menus))::uuid,
+               'Dish ' || i,
+               'Bench',
+               '1.00',
+               md5('submenu ' || (i % :menus) || ' ' || (i / :menus % :submenus))::uuid,
+               i
+        FROM generate_series(1, :rows) AS i
+    """), {"rows": rows, "menus": menus, "submenus": submenus})
+    for column in INDEXES:
+        conn.execute(text(f"CREATE INDEX ON {name} ({column})"))
+    # Карта видимости и статистика для обеих таблиц, иначе результат зависит от автоочистки
+    conn.execute(text(f"VACUUM ANALYZE {name}"))
+
+
+def timed(fn) -> float:
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def report(title: str, plain: float, partitioned: float, unit: str = "ms") -> None:
+    scale = 1e3 if unit == "ms" else 1
+    change = (1 - partitioned / plain) * 100
+    print(f"{title:<28} {plain * scale:12.2f} {partitioned * scale:14.2f} {unit}"
+          f"  {abs(change):5.0f}% {'less' if change >= 0 else 'more'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", required=True, help="Postgres, в котором можно создать схему для замера")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--menus", type=int, default=10_000)
+    parser.add_argument("--submenus", type=int, default=10, help="подменю в каждом меню")
+    parser.add_argument("--partitions", type=int, default=models.DISH_PARTITIONS)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--deletes", type=int, default=20, help="сколько меню удалить целиком")
+    args = parser.parse_args()
+
+    engine = build_engine(args.url, config_url.pool)
+    if engine.dialect.name != "postgresql":
+        parser.error("секционирование есть только в Postgres")
+    autocommit = engine.execution_options(isolation_level="AUTOCOMMIT")
+    tables = {"plain": 0, "partitioned": args.partitions}
+    with autocommit.connect() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        conn.execute(text(f"SET search_path = {SCHEMA}"))
+        try:
+            print(f"{args.rows} dishes, {args.menus} menus, {args.partitions} partitions")
+            print(f"{'':<28} {'plain':>12} {'partitioned':>14}")
+            results = {}
+            for name, partitions in tables.items():
+                create_table(conn, name, partitions)
+                results.setdefault("load + indexes", []).append(
+                    timed(lambda: load(conn, name, args.rows, args.menus, args.submenus)))
+            report("load + indexes", *results["load + indexes"], unit="s")
+
+            rng = random.Random(0)
+            menus = [rng.randrange(args.menus) for _ in range(args.queries)]
+            cases = {
+                "dishes of submenu": (
+                    "SELECT id, title, description, price FROM {table} "
+                    "WHERE menu_id = md5('menu ' || :menu)::uuid "
+                    "AND submenu_id = md5('submenu ' || :menu || ' 0')::uuid"
+                ),
+                "dish count of menu": "SELECT count(*) FROM {table} WHERE menu_id = md5('menu ' || :menu)::uuid",
+            }
+            for title, sql in cases.items():
+                per_query = []
+                for name in tables:
+                    statement = text(sql.format(table=name))
+                    elapsed = timed(lambda: [conn.execute(statement, {"menu": menu}).all() for menu in menus])
+                    per_query.append(elapsed / len(menus))
+                report(title, *per_query)
+
+            # Удаляются меню, которых не было среди чтений, чтобы не мерить кэш
+            deleted = rng.sample([menu for menu in range(args.menus) if menu not in set(menus)], args.deletes)
+            per_delete, vacuum = [], []
+            for name in tables:
+                statement = text(f"DELETE FROM {name} WHERE menu_id = md5('menu ' || :menu)::uuid")
+                per_delete.append(timed(lambda: [conn.execute(statement, {"menu": menu}) for menu in deleted])
+                                  / len(deleted))
+                vacuum.append(timed(lambda: conn.execute(text(f"VACUUM {name}"))))
+            report("delete whole menu", *per_delete)
+            report("vacuum after deletes", *vacuum, unit="s")
+
+            plan = conn.execute(text(
+                f"EXPLAIN SELECT count(*) FROM partitioned WHERE menu_id = {menu_uuid(menus[0])}"
+            )).scalars().all()
+            scanned = len(set(re.findall(r"partitioned_p(\d+)", "\n".join(plan))))
+            print(f"partitions scanned for one menu: {scanned} of {args.partitions}")
+        finally:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Сравнение пути чтения списков: ORM-объекты в identity map с ручной сборкой схем против
+выборки колонок с .mappings() из crud.py. Печатает CPU на строку и пик выделенной памяти.
+
+Запуск:
+    python benchmarks/bench_read_path.py --rows 500 --rounds 50 [--url postgresql://...]
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import func, select  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+import crud  # noqa: E402
+import models  # noqa: E402
+import schemas  # noqa: E402
+from database import Base, build_engine, config_url  # noqa: E402
+
+
+def orm_menus(db, limit):
+    results = (
+        db.query(
+            models.Menu,
+            func.coalesce(func.count(models.SubMenu.id), 0).label("submenus_count"),
+            func.coalesce(func.count(models.Dish.id), 0).label("dishes_count"))
+        .outerjoin(models.SubMenu, models.Menu.id == models.SubMenu.menu_id)
+        .outerjoin(models.Dish, models.SubMenu.id == models.Dish.submenu_id)
+        .group_by(models.Menu.id)
+        .limit(limit)
+        .all()
+    )
+    return [schemas.Menu(id=menu.id, title=menu.title, description=menu.description,
+                         submenus_count=submenus_count, dishes_count=dishes_count)
+            for menu, submenus_count, dishes_count in results]
+
+
+def orm_dishes(db, menu_id, submenu_id):
+    dishes = db.scalars(
+        select(models.Dish).join(models.SubMenu)
+        .where(models.SubMenu.id == submenu_id, models.SubMenu.menu_id == menu_id)
+    ).all()
+    return [schemas.Dish(id=dish.id, title=dish.title, description=dish.description,
+                         price=f"{float(dish.price):.2f}" if dish.price else dish.price)
+            for dish in dishes]
+
+
+def seed(db: Session, rows: int):
+    menus = [models.Menu(title=f"Bench {i}", description="Bench") for i in range(rows)]
+    db.add_all(menus)
+    db.flush()
+    submenu = models.SubMenu(title="Bench", description="Bench", menu_id=menus[0].id)
+    db.add(submenu)
+    db.flush()
+    db.add_all(models.Dish(title=f"Bench {i}", description="Bench", price=f"{i}.5", submenu_id=submenu.id)
+               for i in range(rows))
+    db.commit()
+    return menus[0].id, submenu.id
+
+
+def measure(name: str, engine, fn, rounds: int):
+    def call():
+        # Новая сессия на вызов, как в обработчике запроса
+        with Session(engine) as db:
+            return fn(db)
+
+    rows = len(call())
+    started = time.process_time()
+    for _ in range(rounds):
+        call()
+    cpu = (time.process_time() - started) / rounds / rows
+    tracemalloc.start()
+    call()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"  {name:<10} {cpu * 1e6:8.2f} us CPU/row  {peak / 1024:8.1f} KiB peak")
+    return cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--url", default="sqlite://", help="БД для замера, по умолчанию SQLite в памяти")
+    args = parser.parse_args()
+
+    engine = build_engine(args.url, config_url.pool)
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        menu_id, submenu_id = seed(db, args.rows)
+
+    cases = {
+        f"get_menus ({args.rows})": (
+            lambda db: orm_menus(db, args.rows),
+            lambda db: crud.get_menus.__wrapped__(db, limit=args.rows),
+        ),
+        f"get_dishes_by_submenu ({args.rows})": (
+            lambda db: orm_dishes(db, menu_id, submenu_id),
+            lambda db: crud.get_dishes_by_submenu.__wrapped__(db, menu_id, submenu_id),
+        ),
+    }
+    try:
+        for title, (orm, mappings) in cases.items():
+            print(f"{title}:")
+            before = measure("orm", engine, orm, args.rounds)
+            after = measure("mappings", engine, mappings, args.rounds)
+            print(f"  CPU per row: {(1 - after / before) * 100:.0f}% less")
+    finally:
+        with Session(engine) as db:
+            for model in (models.Dish, models.SubMenu, models.Menu):
+                db.query(model).filter(model.title.like("Bench%")).delete(synchronize_session=False)
+            db.commit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Сравнение затрат CPU на вызов горячих чтений: цепочка db.query(...), которая строится
+при каждом вызове, против заранее собранных select() из crud.py.
+
+Запуск:
+    python benchmarks/bench_statements.py --calls 2000 [--url postgresql://...]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import distinct, func  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+import crud  # noqa: E402
+import models  # noqa: E402
+from database import Base, build_engine, config_url  # noqa: E402
+
+
+def query_menu_with_counts(db, menu_id):
+    return (
+        db.query(
+            models.Menu,
+            func.count(distinct(models.SubMenu.id)).label("submenus_count"),
+            func.count(models.Dish.id).label("dishes_count"),
+        )
+        .outerjoin(models.SubMenu, models.Menu.id == models.SubMenu.menu_id)
+        .outerjoin(models.Dish, models.SubMenu.id == models.Dish.submenu_id)
+        .filter(models.Menu.id == menu_id)
+        .group_by(models.Menu.id)
+        .first()
+    )
+
+
+def query_specific_submenu(db, menu_id, submenu_id):
+    return (
+        db.query(models.SubMenu, func.count(distinct(models.Dish.id)).label("dishes_count"))
+        .outerjoin(models.Dish, models.SubMenu.dishes)
+        .filter(models.SubMenu.id == submenu_id, models.SubMenu.menu_id == menu_id)
+        .group_by(models.SubMenu.id)
+        .first()
+    )
+
+
+def query_specific_dish(db, menu_id, submenu_id, dish_id):
+    return (
+        db.query(models.Dish)
+        .join(models.SubMenu, models.SubMenu.id == models.Dish.submenu_id)
+        .filter(models.Dish.id == dish_id, models.SubMenu.id == submenu_id, models.SubMenu.menu_id == menu_id)
+        .first()
+    )
+
+
+def prebuilt_menu_with_counts(db, menu_id):
+    return db.execute(crud._MENU_WITH_COUNTS, {"menu_id": menu_id}).first()
+
+
+def prebuilt_specific_submenu(db, menu_id, submenu_id):
+    return db.execute(crud._SUBMENU_WITH_COUNT, {"menu_id": menu_id, "submenu_id": submenu_id}).first()
+
+
+def prebuilt_specific_dish(db, menu_id, submenu_id, dish_id):
+    return db.execute(crud._DISH_IN_SUBMENU, {"menu_id": menu_id, "submenu_id": submenu_id, "dish_id": dish_id}).first()
+
+
+def seed(db: Session):
+    menu = models.Menu(title="Bench", description="Bench")
+    db.add(menu)
+    db.flush()
+    submenu = models.SubMenu(title="Bench", description="Bench", menu_id=menu.id)
+    db.add(submenu)
+    db.flush()
+    dish = models.Dish(title="Bench", description="Bench", price="1.00", submenu_id=submenu.id)
+    db.add(dish)
+    db.commit()
+    return menu.id, submenu.id, dish.id
+
+
+def measure(name: str, fn, calls: int):
+    fn()
+    started_cpu, started_wall = time.process_time(), time.perf_counter()
+    for _ in range(calls):
+        fn()
+    cpu = (time.process_time() - started_cpu) / calls
+    wall = (time.perf_counter() - started_wall) / calls
+    print(f"  {name:<10} {cpu * 1e6:10.1f} us CPU/call  {wall * 1e6:10.1f} us wall/call")
+    return cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--url", default="sqlite://", help="БД для замера, по умолчанию SQLite в памяти")
+    args = parser.parse_args()
+
+    engine = build_engine(args.url, config_url.pool)
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        menu_id, submenu_id, dish_id = seed(db)
+        cases = {
+            "get_menu_with_counts": (
+                lambda: query_menu_with_counts(db, menu_id),
+                lambda: prebuilt_menu_with_counts(db, menu_id),
+            ),
+            "get_specific_submenu": (
+                lambda: query_specific_submenu(db, menu_id, submenu_id),
+                lambda: prebuilt_specific_submenu(db, menu_id, submenu_id),
+            ),
+            "get_specific_dish": (
+                lambda: query_specific_dish(db, menu_id, submenu_id, dish_id),
+                lambda: prebuilt_specific_dish(db, menu_id, submenu_id, dish_id),
+            ),
+        }
+        for title, (query, prebuilt) in cases.items():
+            print(f"{title}:")
+            before = measure("db.query", query, args.calls)
+            after = measure("prebuilt", prebuilt, args.calls)
+            print(f"  CPU per call: {(1 - after / before) * 100:.0f}% less")
+        db.rollback()
+        for model in (models.Dish, models.SubMenu, models.Menu):
+            db.query(model).filter(model.title == "Bench").delete()
+        db.commit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+import functools
+import inspect
+import logging
+import pickle
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from pubsub import MESSAGES_LOST, build_pubsub
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Небольшой LRU-кэш с ограничением времени жизни записей, локальный для воркера.
+
+    Кроме срока жизни у записи есть момент, после которого ее пора обновить заранее:
+    доля refresh_ahead от TTL минус случайная добавка до refresh_jitter, чтобы записи,
+    загруженные одновременно, не обновлялись тоже одновременно. При refresh_ahead >= 1
+    записи заранее не обновляются.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, refresh_ahead: float = 1.0, refresh_jitter: float = 0.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.refresh_jitter = refresh_jitter
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key):
+        """
+        Возвращает пару (найдено, значение). Просроченные записи удаляются при чтении.
+        """
+        found, value, _ = self.lookup(key)
+        return found, value
+
+    def lookup(self, key):
+        """
+        Возвращает тройку (найдено, значение, момент обновления по time.monotonic() или None).
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None, None
+            value, expires_at, refresh_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return False, None, None
+            self._data.move_to_end(key)
+            return True, value, refresh_at
+
+    def set(self, key, value) -> None:
+        now = time.monotonic()
+        refresh_at = None
+        if self.refresh_ahead < 1:
+            share = max(self.refresh_ahead - random.uniform(0, self.refresh_jitter), 0.0)
+            refresh_at = now + self.ttl * share
+        with self._lock:
+            self._data[key] = (value, now + self.ttl, refresh_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def delete_where(self, predicate) -> None:
+        """
+        Удаляет записи, ключи которых удовлетворяют predicate.
+        """
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalSharedCache:
+    """
+    Заменитель Redis для общего уровня кэша: подмножество команд get/set/incr/delete.
+
+    Общий для всех потоков процесса; в нескольких воркерах вместо него используется
+    настоящий Redis с тем же интерфейсом.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def get(self, name):
+        with self._lock:
+            entry = self._data.get(name)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[name]
+                return None
+            return value
+
+    def set(self, name, value, ex=None):
+        with self._lock:
+            expires_at = time.monotonic() + ex if ex else None
+            self._data[name] = (value, expires_at)
+        return True
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            value, expires_at = self._data.get(name, (b"0", None))
+            value = int(value) + amount
+            self._data[name] = (str(value).encode(), expires_at)
+            return value
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(self._data.pop(name, None) is not None for name in names)
+
+
+class TwoTierCache:
+    """
+    Двухуровневый кэш: локальный TTL LRU воркера перед общим уровнем (Redis или его заменитель).
+
+    Записи разбиты на области: чтения одного меню (область - его id) и чтения без меню,
+    например список меню (область ""). Ключ общего уровня включает поколение всего кэша
+    и поколение области. Запись в меню увеличивает поколения этого меню и области "",
+    потому что списки содержат счетчики всех меню; чтения других меню остаются в кэше.
+    Полный сброс увеличивает поколение всего кэша. Каждая инвалидация рассылается
+    по pub/sub, и каждый воркер удаляет из локального уровня записи затронутых областей.
+
+    Запись локального уровня, которую пора обновить заранее, продолжает отдаваться, а ее
+    обновление выполняется в фоновом потоке тем же путем, что и промах: общий уровень,
+    затем БД. Поэтому запрос не ждет агрегирующего запроса к БД ни при истечении локальной
+    записи, ни при истечении записи общего уровня, пока ключ читается чаще, чем раз в TTL.
+    """
+
+    GENERATION_KEY = "catalogue:generation"
+    # Область полного сброса; ее же транспорт доставляет после потери сообщений
+    ALL = MESSAGES_LOST
+
+    def __init__(self, local: TTLCache, shared, pubsub, channel: str = "catalogue_cache",
+                 shared_ttl: int = 60, refresh_workers: int = 2, private_shared: bool = False):
+        self.local = local
+        self.shared = shared
+        # Общий уровень виден только этому кэшу (заменитель внутри процесса): поколения,
+        # увеличенные в других процессах, до него не доходят, и их увеличивает сообщение
+        self.private_shared = private_shared
+        # Отправитель в сообщениях pub/sub: собственное эхо уже применено в invalidate()
+        self._sender = uuid.uuid4().hex
+        self.pubsub = pubsub
+        self.channel = channel
+        self.shared_ttl = shared_ttl
+        # Счетчики инвалидаций по областям, увиденных этим воркером: защищают локальный уровень
+        # от записи значения, загруженного до инвалидации его области
+        self._epochs = {}
+        # Ключи, обновление которых уже запланировано: одно обновление на ключ
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="cache-refresh")
+        self.stats = {
+            "stale_served": 0,
+            "refreshes": 0,
+            "refresh_failures": 0,
+            "refresh_lag_last": 0.0,
+            "refresh_lag_max": 0.0,
+            "refresh_lag_total": 0.0,
+        }
+        pubsub.subscribe(channel, self._on_invalidate)
+
+    def get_or_load(self, key: str, loader, refresh=None, scope: str = ""):
+        """
+        Возвращает значение из локального или общего уровня, иначе загружает его и кэширует.
+
+        Args:
+        key (str): Ключ записи.
+        loader: Функция без аргументов, загружающая значение из БД.
+        refresh: Функция без аргументов для фонового обновления записи. Должна открывать
+        собственную сессию: сессия запроса к этому времени уже закрыта. Без нее запись
+        заранее не обновляется.
+        scope (str): Область записи: id меню или "" для чтений без меню.
+
+        Returns:
+        Закэшированное или только что загруженное значение.
+        """
+        local_key = (scope, key)
+        found, value, refresh_at = self.local.lookup(local_key)
+        if found:
+            if refresh is not None and refresh_at is not None and refresh_at <= time.monotonic():
+                self._schedule_refresh(local_key, refresh, refresh_at)
+            return value
+
+        epoch = self._epoch(scope)
+        value = self._load(local_key, loader)
+        if epoch == self._epoch(scope):
+            self.local.set(local_key, value)
+        return value
+
+    def _load(self, local_key: tuple, loader):
+        scope, key = local_key
+        # Поколения читаются до загрузки: значение, прочитанное из БД до записи, ляжет под ключ
+        # прежнего поколения, который после инвалидации уже никто не читает
+        shared_key = f"catalogue:{self._generation()}:{self._generation(scope)}:{scope}:{key}"
+        raw = self.shared.get(shared_key)
+        if raw is not None:
+            value = pickle.loads(raw)
+        else:
+            value = loader()
+            self.shared.set(shared_key, pickle.dumps(value), ex=self.shared_ttl)
+        return value
+
+    def _schedule_refresh(self, local_key: tuple, refresh, refresh_at: float) -> None:
+        with self._refresh_lock:
+            self.stats["stale_served"] += 1
+            if local_key in self._refreshing:
+                return
+            self._refreshing.add(local_key)
+        self._executor.submit(self._refresh, local_key, refresh, refresh_at, self._epoch(local_key[0]))
+
+    def _refresh(self, local_key: tuple, refresh, refresh_at: float, epoch: tuple) -> None:
+        try:
+            value = self._load(local_key, refresh)
+        except Exception:
+            logger.exception("cache refresh failed: %s", local_key[1])
+            with self._refresh_lock:
+                self.stats["refresh_failures"] += 1
+                self._refreshing.discard(local_key)
+            return
+        if epoch == self._epoch(local_key[0]):
+            self.local.set(local_key, value)
+        # Отставание - сколько запись отдавалась после момента обновления: очередь плюс загрузка
+        lag = time.monotonic() - refresh_at
+        with self._refresh_lock:
+            self._refreshing.discard(local_key)
+            self.stats["refreshes"] += 1
+            self.stats["refresh_lag_last"] = lag
+            self.stats["refresh_lag_max"] = max(self.stats["refresh_lag_max"], lag)
+            self.stats["refresh_lag_total"] += lag
+
+    def metrics(self) -> dict:
+        """
+        Returns:
+        dict: Счетчики фонового обновления, отставание в секундах и число обновлений в работе.
+        """
+        with self._refresh_lock:
+            return {**self.stats, "refreshing": len(self._refreshing), "local_size": len(self.local)}
+
+    def invalidate(self, menu_id=None) -> None:
+        """
+        Сбрасывает кэш во всех воркерах. Вызывается после фиксации записи в БД.
+
+        Args:
+        menu_id: Меню, в которое была запись: сбрасываются его чтения и чтения без меню.
+        Без него сбрасывается весь кэш.
+        """
+        scope = self.ALL if menu_id is None else str(menu_id)
+        self._advance_generations(scope)
+        self._drop(scope)
+        self.pubsub.publish(self.channel, f"{self._sender}:{scope}")
+
+    def _advance_generations(self, scope: str) -> None:
+        if scope == self.ALL:
+            self.shared.incr(self.GENERATION_KEY)
+        else:
+            self.shared.incr(f"{self.GENERATION_KEY}:{scope}")
+            self.shared.incr(f"{self.GENERATION_KEY}:")
+
+    def _generation(self, scope: str = None) -> int:
+        raw = self.shared.get(self.GENERATION_KEY if scope is None else f"{self.GENERATION_KEY}:{scope}")
+        return int(raw) if raw is not None else 0
+
+    def _epoch(self, scope: str) -> tuple:
+        return self._epochs.get(self.ALL, 0), self._epochs.get(scope, 0)
+
+    def _on_invalidate(self, message: str) -> None:
+        # Сообщение - "отправитель:область" или MESSAGES_LOST без отправителя
+        sender, _, scope = message.rpartition(":")
+        if sender == self._sender:
+            return
+        if self.private_shared:
+            self._advance_generations(scope)
+        self._drop(scope)
+
+    def _drop(self, scope: str) -> None:
+        if scope == self.ALL:
+            self._epochs[self.ALL] = self._epochs.get(self.ALL, 0) + 1
+            self.local.clear()
+            return
+        scopes = (scope, "")
+        for scope in scopes:
+            self._epochs[scope] = self._epochs.get(scope, 0) + 1
+        self.local.delete_where(lambda local_key: local_key[0] in scopes)
+
+
+def build_cache(config, engine):
+    """
+    Создает двухуровневый кэш по настройкам приложения.
+
+    Args:
+    config (CacheConfig): Настройки кэша.
+    engine: Движок SQLAlchemy, используется для LISTEN/NOTIFY.
+
+    Returns:
+    TwoTierCache: Настроенный кэш.
+    """
+    if config.shared == "redis":
+        import redis
+        shared = redis.Redis.from_url(config.redis_url)
+    else:
+        shared = LocalSharedCache()
+
+    return TwoTierCache(
+        local=TTLCache(maxsize=config.local_maxsize, ttl=config.local_ttl,
+                       refresh_ahead=config.refresh_ahead, refresh_jitter=config.refresh_jitter),
+        shared=shared,
+        pubsub=build_pubsub(config.pubsub, engine),
+        channel=config.channel,
+        shared_ttl=config.shared_ttl,
+        refresh_workers=config.refresh_workers,
+        private_shared=config.shared != "redis",
+    )
+
+
+catalogue_cache = None
+# Фабрика сессий для фонового обновления записей; без нее записи заранее не обновляются
+session_factory = None
+
+
+def configure(config, engine, sessions=None) -> None:
+    """
+    Включает кэш чтений crud.py, если он разрешен настройками.
+
+    Args:
+    config (CacheConfig): Настройки кэша.
+    engine: Движок SQLAlchemy, используется для LISTEN/NOTIFY.
+    sessions: Фабрика сессий для фонового обновления записей.
+    """
+    global catalogue_cache, session_factory
+    if config.enabled:
+        catalogue_cache = build_cache(config, engine)
+        session_factory = sessions
+        logger.info("Catalogue cache enabled: shared=%s, pubsub=%s", config.shared, config.pubsub)
+
+
+def cached(fn):
+    """
+    Декоратор чтения из crud.py: кэширует результат по имени функции и аргументам,
+    кроме сессии БД. Результат должен быть сериализуемым pickle и не привязанным к сессии.
+    Чтения с аргументом menu_id попадают в область этого меню, остальные - в область "".
+    """
+    signature = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    def wrapper(db, *args, **kwargs):
+        if catalogue_cache is None:
+            return fn(db, *args, **kwargs)
+        bound = signature.bind(db, *args, **kwargs)
+        bound.apply_defaults()
+        params = tuple(bound.arguments.values())[1:]
+        key = f"{fn.__name__}:{params!r}"
+        menu_id = bound.arguments.get("menu_id")
+        scope = "" if menu_id is None else str(menu_id)
+        if session_factory is None:
+            refresh = None
+        else:
+            def refresh():
+                with session_factory() as session:
+                    return fn(session, *args, **kwargs)
+        return catalogue_cache.get_or_load(key, lambda: fn(db, *args, **kwargs), refresh=refresh, scope=scope)
+
+    return wrapper
+
+
+def invalidate(menu_id=None) -> None:
+    """
+    Сбрасывает кэш после записи в меню, подменю или блюда.
+
+    Args:
+    menu_id: Меню, в которое была запись; без него сбрасывается весь кэш.
+    """
+    if catalogue_cache is not None:
+        catalogue_cache.invalidate(menu_id)
+
+
+def metrics():
+    """
+    Возвращает метрики фонового обновления кэша или None, если кэш выключен.
+    """
+    if catalogue_cache is not None:
+        return catalogue_cache.metrics()
@@ -0,0 +1,129 @@
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных вызовов в пределах одного процесса.
+
+    Первый вызов с данным ключом выполняет функцию, остальные вызовы с тем же ключом,
+    пришедшие до его завершения, ждут и получают тот же результат или то же исключение.
+    Результат не кэшируется: следующий вызов после завершения снова выполнит функцию.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """
+        Выполняет fn или присоединяется к уже выполняющемуся вызову с тем же ключом.
+
+        Args:
+        key: Хешируемый ключ запроса, например (имя маршрута, параметры).
+        fn: Функция без аргументов, выполняющая запрос к БД.
+
+        Returns:
+        Результат fn, общий для всех объединенных вызовов.
+        """
+        if not self.enabled:
+            return fn()
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class WriteBatcher:
+    """
+    Групповая фиксация записей из одновременных запросов.
+
+    Вызовы submit из разных потоков складываются в очередь. Фоновый поток ждет window
+    секунд после первого вызова (или пока не наберется max_batch вызовов) и передает всю
+    пачку в flush, которая пишет ее одной транзакцией. Каждый вызов получает свой
+    результат или свое исключение из списка, который вернула flush.
+
+    Args:
+    flush: Функция, принимающая список элементов и возвращающая список результатов того же
+        размера; исключение в списке поднимается у соответствующего вызова.
+    window (float): Время набора пачки в секундах.
+    max_batch (int): Максимальный размер пачки.
+    """
+
+    def __init__(self, flush, window: float = 0.005, max_batch: int = 500):
+        self.flush = flush
+        self.window = window
+        self.max_batch = max_batch
+        self._ready = threading.Condition()
+        self._pending = []
+        self._worker = None
+
+    def submit(self, item):
+        """
+        Ставит элемент в очередь и ждет фиксации пачки, в которую он попал.
+
+        Args:
+        item: Элемент для записи.
+
+        Returns:
+        Результат flush для этого элемента.
+        """
+        call = _Call()
+        with self._ready:
+            self._pending.append((item, call))
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="write-batcher", daemon=True)
+                self._worker.start()
+            self._ready.notify()
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def _run(self) -> None:
+        while True:
+            with self._ready:
+                self._ready.wait_for(lambda: self._pending)
+                self._ready.wait_for(lambda: len(self._pending) >= self.max_batch, timeout=self.window)
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+            self._flush(batch)
+
+    def _flush(self, batch: list) -> None:
+        try:
+            results = self.flush([item for item, _ in batch])
+        except BaseException as error:
+            results = [error] * len(batch)
+        for (_, call), result in zip(batch, results):
+            if isinstance(result, BaseException):
+                call.error = result
+            else:
+                call.result = result
+            call.done.set()
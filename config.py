@@ -1,6 +1,6 @@
 import logging
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from environs import Env
 
@@ -12,17 +12,124 @@ class UrlConfig:
     DATABASE_URL: str
 
 
+@dataclass
+class PoolConfig:
+    size: int = 5
+    max_overflow: int = 10
+    timeout: float = 30.0
+
+
+@dataclass
+class OrmConfig:
+    raiseload: bool = True
+
+
+@dataclass
+class SlowQueryConfig:
+    enabled: bool = True
+    threshold_ms: float = 100.0
+    explain: bool = False
+    explain_interval: float = 300.0
+
+
+@dataclass
+class AdmissionConfig:
+    enabled: bool = True
+    max_queue: int = 100
+    max_wait: float = 2.0
+    retry_after: int = 1
+
+
+@dataclass
+class CoalescingConfig:
+    enabled: bool = True
+    write_batching: bool = False
+    write_window_ms: float = 5.0
+    write_max_batch: int = 500
+
+
+@dataclass
+class CacheConfig:
+    enabled: bool = False
+    local_maxsize: int = 1024
+    local_ttl: float = 5.0
+    shared: str = "local"
+    redis_url: str = ""
+    shared_ttl: int = 60
+    pubsub: str = "local"
+    channel: str = "catalogue_cache"
+    refresh_ahead: float = 0.8
+    refresh_jitter: float = 0.1
+    refresh_workers: int = 2
+
+
+@dataclass
+class EventsConfig:
+    pubsub: str = "local"
+    channel: str = "catalogue_events"
+    buffer_size: int = 100
+    overflow: str = "resync"
+    heartbeat: float = 15.0
+
+
+@dataclass
+class CompressionConfig:
+    enabled: bool = True
+    minimum_size: int = 500
+    gzip_level: int = 6
+    brotli_quality: int = 4
+
+
+@dataclass
+class ProfilingConfig:
+    enabled: bool = False
+    secret: str = ""
+    output_dir: str = "profiles"
+    interval: float = 0.005
+
+
+@dataclass
+class WarmupConfig:
+    enabled: bool = True
+    connections: int = 0
+    retry_interval: float = 1.0
+    max_retry_interval: float = 30.0
+
+
+@dataclass
+class SnapshotConfig:
+    enabled: bool = False
+    path: str = "snapshot/catalogue.json"
+    debounce: float = 1.0
+    max_delay: float = 10.0
+
+
 @dataclass
 class Config:
     db: UrlConfig
+    pool: PoolConfig = field(default_factory=PoolConfig)
+    orm: OrmConfig = field(default_factory=OrmConfig)
+    slow_query: SlowQueryConfig = field(default_factory=SlowQueryConfig)
+    admission: AdmissionConfig = field(default_factory=AdmissionConfig)
+    coalescing: CoalescingConfig = field(default_factory=CoalescingConfig)
+    cache: CacheConfig = field(default_factory=CacheConfig)
+    events: EventsConfig = field(default_factory=EventsConfig)
+    compression: CompressionConfig = field(default_factory=CompressionConfig)
+    profiling: ProfilingConfig = field(default_factory=ProfilingConfig)
+    warmup: WarmupConfig = field(default_factory=WarmupConfig)
+    snapshot: SnapshotConfig = field(default_factory=SnapshotConfig)
 
 
 def load_config(path: str) -> Config:
     env = Env()
     env.read_env(path)
 
+    # Явно заданная БД для тестов, например sqlite:// для быстрого прогона без сервера
+    if os.getenv("TEST_DATABASE_URL"):
+        database_url = os.getenv("TEST_DATABASE_URL")
+        logging.info("Using test database URL: {}".format(database_url))
     # Проверяем, запущены ли тесты в Docker
-    if os.getenv("IN_DOCKER") == '1' and os.getenv("RUNNING_TESTS") == '1':
+    elif os.getenv("IN_DOCKER") == '1' and os.getenv("RUNNING_TESTS") == '1':
         database_url = env('DOCKER_DATABASE_TEST_URL')
         logging.info("Using Docker database URL for tests: {}".format(database_url))
     # Проверяем, запущено ли приложение в Docker
@@ -33,4 +140,88 @@ def load_config(path: str) -> Config:
         database_url = env('LOCAL_DATABASE_URL')
         logging.info("Using local database URL: {}".format(database_url))
 
-    return Config(db=UrlConfig(DATABASE_URL=database_url))
+    pool = PoolConfig(
+        size=env.int('DB_POOL_SIZE', 5),
+        max_overflow=env.int('DB_MAX_OVERFLOW', 10),
+        timeout=env.float('DB_POOL_TIMEOUT', 30.0),
+    )
+    orm = OrmConfig(
+        raiseload=env.bool('ORM_RAISELOAD', True),
+    )
+    slow_query = SlowQueryConfig(
+        enabled=env.bool('SLOW_QUERY_ENABLED', True),
+        threshold_ms=env.float('SLOW_QUERY_THRESHOLD_MS', 100.0),
+        explain=env.bool('SLOW_QUERY_EXPLAIN', False),
+        explain_interval=env.float('SLOW_QUERY_EXPLAIN_INTERVAL', 300.0),
+    )
+    admission = AdmissionConfig(
+        enabled=env.bool('ADMISSION_ENABLED', True),
+        max_queue=env.int('ADMISSION_MAX_QUEUE', 100),
+        max_wait=env.float('ADMISSION_MAX_WAIT', 2.0),
+        retry_after=env.int('ADMISSION_RETRY_AFTER', 1),
+    )
+    coalescing = CoalescingConfig(
+        enabled=env.bool('COALESCING_ENABLED', True),
+        write_batching=env.bool('COALESCING_WRITE_BATCHING', False),
+        write_window_ms=env.float('COALESCING_WRITE_WINDOW_MS', 5.0),
+        write_max_batch=env.int('COALESCING_WRITE_MAX_BATCH', 500),
+    )
+    cache = CacheConfig(
+        enabled=env.bool('CACHE_ENABLED', False),
+        local_maxsize=env.int('CACHE_LOCAL_MAXSIZE', 1024),
+        local_ttl=env.float('CACHE_LOCAL_TTL', 5.0),
+        shared=env('CACHE_SHARED', 'local'),
+        redis_url=env('CACHE_REDIS_URL', ''),
+        shared_ttl=env.int('CACHE_SHARED_TTL', 60),
+        pubsub=env('CACHE_PUBSUB', 'local'),
+        channel=env('CACHE_CHANNEL', 'catalogue_cache'),
+        refresh_ahead=env.float('CACHE_REFRESH_AHEAD', 0.8),
+        refresh_jitter=env.float('CACHE_REFRESH_JITTER', 0.1),
+        refresh_workers=env.int('CACHE_REFRESH_WORKERS', 2),
+    )
+    events = EventsConfig(
+        pubsub=env('EVENTS_PUBSUB', 'local'),
+        channel=env('EVENTS_CHANNEL', 'catalogue_events'),
+        buffer_size=env.int('EVENTS_BUFFER_SIZE', 100),
+        overflow=env('EVENTS_OVERFLOW', 'resync'),
+        heartbeat=env.float('EVENTS_HEARTBEAT', 15.0),
+    )
+    compression = CompressionConfig(
+        enabled=env.bool('COMPRESSION_ENABLED', True),
+        minimum_size=env.int('COMPRESSION_MINIMUM_SIZE', 500),
+        gzip_level=env.int('COMPRESSION_GZIP_LEVEL', 6),
+        brotli_quality=env.int('COMPRESSION_BROTLI_QUALITY', 4),
+    )
+    profiling = ProfilingConfig(
+        enabled=env.bool('PROFILING_ENABLED', False),
+        secret=env('PROFILING_SECRET', ''),
+        output_dir=env('PROFILING_OUTPUT_DIR', 'profiles'),
+        interval=env.float('PROFILING_INTERVAL', 0.005),
+    )
+    warmup = WarmupConfig(
+        enabled=env.bool('WARMUP_ENABLED', True),
+        connections=env.int('WARMUP_CONNECTIONS', 0),
+        retry_interval=env.float('WARMUP_RETRY_INTERVAL', 1.0),
+        max_retry_interval=env.float('WARMUP_MAX_RETRY_INTERVAL', 30.0),
+    )
+    snapshot = SnapshotConfig(
+        enabled=env.bool('SNAPSHOT_ENABLED', False),
+        path=env('SNAPSHOT_PATH', 'snapshot/catalogue.json'),
+        debounce=env.float('SNAPSHOT_DEBOUNCE', 1.0),
+        max_delay=env.float('SNAPSHOT_MAX_DELAY', 10.0),
+    )
+
+    return Config(
+        db=UrlConfig(DATABASE_URL=database_url),
+        pool=pool,
+        orm=orm,
+        slow_query=slow_query,
+        admission=admission,
+        coalescing=coalescing,
+        cache=cache,
+        events=events,
+        compression=compression,
+        profiling=profiling,
+        warmup=warmup,
+        snapshot=snapshot,
+    )
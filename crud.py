@@ -1,13 +1,330 @@
-from uuid import UUID
+import datetime
+import functools
+from uuid import UUID, uuid4
 
-from sqlalchemy import func, distinct
-from sqlalchemy.orm import Session
+from sqlalchemy import Integer, Uuid, any_, bindparam, func, insert, select, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, selectinload
 
+import cache
+import events
 import models
 import schemas
+import snapshot
+
+
+class VersionConflictError(Exception):
+    """
+    Строка изменена другой записью: ее версия не совпала с ожидаемой (If-Match).
+
+    Args:
+    version (int): Текущая версия строки.
+    """
+
+    def __init__(self, version: int):
+        super().__init__(f"row version is {version}")
+        self.version = version
+
+
+def _committed(menu_id: UUID, entity: str, op: str, entity_id: UUID, row=None) -> None:
+    """
+    Оповещает о зафиксированной записи: сбрасывает кэш чтений, планирует пересборку
+    снимка каталога и публикует событие изменения для подписчиков меню.
+
+    Args:
+    menu_id (UUID): Меню, к которому относится изменение.
+    entity (str): Тип сущности: menu, submenu или dish.
+    op (str): Операция: create, update или delete.
+    entity_id (UUID): Идентификатор измененной строки.
+    row: Строка после записи; для удаления не передается.
+    """
+    cache.invalidate(menu_id)
+    snapshot.schedule()
+    _publish(menu_id, entity, op, entity_id, row)
+
+
+def _publish(menu_id: UUID, entity: str, op: str, entity_id: UUID, row=None) -> None:
+    # Данные строки в событие не кладутся: NOTIFY ограничен 8000 байт, брокер каждого воркера
+    # сам читает их через get_change_data, если у меню есть подписчики
+    event = {"entity": entity, "op": op, "id": entity_id}
+    if row is not None:
+        event["seq"] = row.change_seq
+    events.broker.publish(menu_id, event)
+
+
+def _update_row(db: Session, model, criteria: tuple, values: dict, versions=None):
+    """
+    Обновляет строку одним UPDATE ... RETURNING без предварительного чтения и блокировки.
+
+    С versions к условию добавляется version IN (...): одновременная запись, успевшая
+    увеличить версию, делает обновление пустым, и вместо молчаливой перезаписи вызывающий
+    получает конфликт.
+
+    Args:
+    db (Session): Сессия базы данных.
+    model: Модель обновляемой строки.
+    criteria (tuple): Условия, выбирающие строку.
+    values (dict): Новые значения колонок.
+    versions: Допустимые версии строки; None - обновлять любую.
+
+    Returns:
+    Обновленная строка, отсоединенная от сессии, или None, если строка не найдена.
+    Несовпадение версии вызывает VersionConflictError.
+    """
+    statement = update(model).where(*criteria)
+    if versions is not None:
+        statement = statement.where(model.version.in_(versions))
+    row = db.scalars(statement.values(**values).returning(model)).first()
+    if row is None:
+        version = db.scalar(select(model.version).where(*criteria)) if versions is not None else None
+        db.rollback()
+        if version is not None:
+            raise VersionConflictError(version)
+        return None
+    # Отсоединенная строка не истекает при коммите: ответ строится из RETURNING без повторного чтения
+    db.expunge(row)
+    db.commit()
+    return row
+
+
+# Горячие запросы собираются один раз при импорте. Ключ кэша у готового select() запоминается,
+# поэтому при вызове SQLAlchemy не строит цепочку заново и берет скомпилированный SQL из кэша.
+# Чтения выбирают только нужные для ответа колонки и возвращают строки .mappings() без загрузки
+# ORM-объектов в identity map.
+_MENU_COLUMNS = (models.Menu.id, models.Menu.title, models.Menu.description)
+_SUBMENU_COLUMNS = (models.SubMenu.id, models.SubMenu.title, models.SubMenu.description)
+_DISH_COLUMNS = (models.Dish.id, models.Dish.title, models.Dish.description, models.Dish.price)
+
+# Счетчики считаются по каждому родителю отдельно, а не по соединению menus -> submenus -> dishes:
+# соединение размножает строки (подменю x блюда) и без DISTINCT завышает submenus_count.
+# Для одной записи это подзапросы COUNT по параметрам запроса и индексам внешних ключей, для
+# списка - заранее агрегированные по menu_id подзапросы, которые проходят таблицы по одному разу.
+# Запросы к блюдам всегда содержат menu_id - ключ секционирования таблицы блюд. Для одной записи
+# это параметр, а не ссылка на внешний запрос, чтобы секции отсекались еще при планировании.
+_SUBMENUS_OF_MENU_COUNT = (
+    select(func.count())
+    .select_from(models.SubMenu)
+    .where(models.SubMenu.menu_id == bindparam("menu_id"))
+    .scalar_subquery()
+)
+
+_DISHES_OF_MENU_COUNT = (
+    select(func.count())
+    .select_from(models.Dish)
+    .where(models.Dish.menu_id == bindparam("menu_id"))
+    .scalar_subquery()
+)
+
+_DISHES_OF_SUBMENU_COUNT = (
+    select(func.count())
+    .select_from(models.Dish)
+    .where(models.Dish.menu_id == bindparam("menu_id"), models.Dish.submenu_id == bindparam("submenu_id"))
+    .scalar_subquery()
+)
+
+_MENU_WITH_COUNTS = select(
+    *_MENU_COLUMNS,
+    _SUBMENUS_OF_MENU_COUNT.label("submenus_count"),
+    _DISHES_OF_MENU_COUNT.label("dishes_count"),
+    models.Menu.version,
+).where(models.Menu.id == bindparam("menu_id"))
+
+_SUBMENU_COUNTS = (
+    select(models.SubMenu.menu_id, func.count().label("submenus_count"))
+    .group_by(models.SubMenu.menu_id)
+    .subquery("submenu_counts")
+)
+
+_DISH_COUNTS = (
+    select(models.Dish.menu_id, func.count().label("dishes_count"))
+    .group_by(models.Dish.menu_id)
+    .subquery("dish_counts")
+)
+
+_DISHES_PER_SUBMENU = (
+    select(models.Dish.submenu_id, func.count().label("dishes_count"))
+    .group_by(models.Dish.submenu_id)
+    .subquery("dishes_per_submenu")
+)
+
+# Поля ответов, которые можно выбрать параметром fields, в порядке схем
+MENU_FIELDS = ("id", "title", "description", "submenus_count", "dishes_count")
+DISH_FIELDS = ("id", "title", "description", "price")
+
+
+@functools.lru_cache(maxsize=None)
+def _menus_statement(fields: tuple = MENU_FIELDS):
+    """
+    Запрос списка меню только с полями fields. Агрегаты счетчиков присоединяются, только
+    если соответствующий счетчик запрошен. Запрос собирается один раз на набор полей.
+    """
+    columns = {column.key: column for column in _MENU_COLUMNS}
+    counts = {
+        "submenus_count": _SUBMENU_COUNTS,
+        "dishes_count": _DISH_COUNTS,
+    }
+    statement = select(*(
+        func.coalesce(counts[field].c[field], 0).label(field) if field in counts else columns[field]
+        for field in fields
+    )).select_from(models.Menu)
+    for field in fields:
+        if field in counts:
+            statement = statement.outerjoin(counts[field], counts[field].c.menu_id == models.Menu.id)
+    return statement.offset(bindparam("skip", type_=Integer)).limit(bindparam("limit", type_=Integer))
+
+
+_MENUS_WITH_COUNTS = _menus_statement(MENU_FIELDS)
+
+_SUBMENU_IN_MENU = select(models.SubMenu).where(
+    models.SubMenu.id == bindparam("submenu_id"),
+    models.SubMenu.menu_id == bindparam("menu_id"),
+)
+
+# Каскадное удаление проходит по связям: без явной загрузки они подгружаются по запросу на
+# каждое подменю, с selectinload - двумя запросами IN
+_MENU_FOR_DELETE = (
+    select(models.Menu)
+    .where(models.Menu.id == bindparam("menu_id"))
+    .options(selectinload(models.Menu.submenus).selectinload(models.SubMenu.dishes))
+)
+
+_SUBMENU_FOR_DELETE = _SUBMENU_IN_MENU.options(selectinload(models.SubMenu.dishes))
+
+_SUBMENU_WITH_COUNT = select(
+    *_SUBMENU_COLUMNS, _DISHES_OF_SUBMENU_COUNT.label("dishes_count"), models.SubMenu.version,
+).where(
+    models.SubMenu.id == bindparam("submenu_id"),
+    models.SubMenu.menu_id == bindparam("menu_id"),
+)
+
+_SUBMENUS_BY_MENU = select(*_SUBMENU_COLUMNS).where(models.SubMenu.menu_id == bindparam("menu_id"))
+
+_MENU_ID_OF_SUBMENU = select(models.SubMenu.menu_id).where(models.SubMenu.id == bindparam("submenu_id"))
+
+# menu_id блюда совпадает с menu_id его подменю, поэтому принадлежность подменю меню
+# проверяется без соединения с submenus
+@functools.lru_cache(maxsize=None)
+def _dishes_statement(fields: tuple = DISH_FIELDS):
+    """
+    Запрос блюд подменю только с полями fields. Запрос собирается один раз на набор полей.
+    """
+    columns = {column.key: column for column in _DISH_COLUMNS}
+    return select(*(columns[field] for field in fields)).where(
+        models.Dish.menu_id == bindparam("menu_id"),
+        models.Dish.submenu_id == bindparam("submenu_id"),
+    )
+
+
+_DISHES_IN_SUBMENU = _dishes_statement(DISH_FIELDS)
+
+# Одиночные чтения возвращают и версию строки: из нее API строит ETag
+_DISH_IN_SUBMENU = _DISHES_IN_SUBMENU.add_columns(models.Dish.version).where(models.Dish.id == bindparam("dish_id"))
+
+_DISH_BY_ID = select(models.Dish).where(models.Dish.id == bindparam("dish_id"))
+
+_DISH_BY_TITLE = select(models.Dish).where(
+    models.Dish.menu_id == bindparam("menu_id"),
+    models.Dish.title == bindparam("title"),
+    models.Dish.submenu_id == bindparam("submenu_id"),
+)
+
+_DISHES_BY_TITLES = select(models.Dish).where(
+    models.Dish.menu_id.in_(bindparam("menu_ids", expanding=True)),
+    models.Dish.title.in_(bindparam("titles", expanding=True)),
+    models.Dish.submenu_id.in_(bindparam("submenu_ids", expanding=True)),
+)
+
+_INSERT_DISHES = insert(models.Dish).returning(models.Dish)
+
+# Полный каталог для снимка: три запроса по всем таблицам вместо запросов на каждое меню
+_CATALOGUE_MENUS = _MENUS_WITH_COUNTS.offset(None).limit(None).order_by(models.Menu.id)
+
+_CATALOGUE_SUBMENUS = (
+    select(
+        models.SubMenu.menu_id,
+        *_SUBMENU_COLUMNS,
+        func.coalesce(_DISHES_PER_SUBMENU.c.dishes_count, 0).label("dishes_count"),
+    )
+    .outerjoin(_DISHES_PER_SUBMENU, _DISHES_PER_SUBMENU.c.submenu_id == models.SubMenu.id)
+    .order_by(models.SubMenu.menu_id, models.SubMenu.id)
+)
+
+_CATALOGUE_DISHES = select(models.Dish.submenu_id, *_DISH_COLUMNS).order_by(models.Dish.submenu_id, models.Dish.id)
+
+# Выборка по списку идентификаторов одним запросом. В Postgres список передается одним
+# параметром-массивом (= ANY), и текст запроса не зависит от длины списка; в остальных БД -
+# разворачиваемым IN. Счетчики - коррелированные подзапросы по индексам внешних ключей.
+def _by_ids(statement, column) -> dict:
+    return {
+        "postgresql": statement.where(column == any_(bindparam("ids", type_=postgresql.ARRAY(Uuid)))),
+        None: statement.where(column.in_(bindparam("ids", expanding=True))),
+    }
+
+
+def _for_dialect(db: Session, statements: dict):
+    return statements.get(db.get_bind().dialect.name, statements[None])
+
+
+_MENUS_BY_IDS = _by_ids(select(
+    *_MENU_COLUMNS,
+    select(func.count()).where(models.SubMenu.menu_id == models.Menu.id).scalar_subquery().label("submenus_count"),
+    select(func.count()).where(models.Dish.menu_id == models.Menu.id).scalar_subquery().label("dishes_count"),
+), models.Menu.id)
+
+_SUBMENUS_BY_IDS = _by_ids(select(
+    *_SUBMENU_COLUMNS,
+    select(func.count()).where(
+        models.Dish.menu_id == models.SubMenu.menu_id,
+        models.Dish.submenu_id == models.SubMenu.id,
+    ).scalar_subquery().label("dishes_count"),
+), models.SubMenu.id)
+
+_DISHES_BY_IDS = _by_ids(select(*_DISH_COLUMNS), models.Dish.id)
+
+_MAX_SEQ = 2 ** 63 - 1
+
+_ENTITY_MODELS = {entity: model for model, entity in models.ENTITY_NAMES.items()}
+
+_CHANGES_AFTER = {
+    model: (
+        select(model)
+        .where(model.change_seq > bindparam("since"), model.change_seq <= bindparam("upto"))
+        .order_by(model.change_seq)
+        .limit(bindparam("limit", type_=Integer))
+    )
+    for model in (*models.ENTITY_NAMES, models.Tombstone)
+}
+
+# Ключи, которых нет в БД: прогрев выполняет запросы, не находя строк
+_NIL = UUID(int=0)
+_NIL_KEYS = {"menu_id": _NIL, "submenu_id": _NIL, "dish_id": _NIL, "title": ""}
+
+_WARM_UP = (
+    (_MENU_WITH_COUNTS, _NIL_KEYS),
+    (_MENUS_WITH_COUNTS, {"skip": 0, "limit": 1}),
+    (_SUBMENU_IN_MENU, _NIL_KEYS),
+    (_SUBMENU_WITH_COUNT, _NIL_KEYS),
+    (_SUBMENUS_BY_MENU, _NIL_KEYS),
+    (_MENU_ID_OF_SUBMENU, _NIL_KEYS),
+    (_MENU_FOR_DELETE, _NIL_KEYS),
+    (_SUBMENU_FOR_DELETE, _NIL_KEYS),
+    (_DISHES_IN_SUBMENU, _NIL_KEYS),
+    (_DISH_IN_SUBMENU, _NIL_KEYS),
+    (_DISH_BY_ID, _NIL_KEYS),
+    (_DISH_BY_TITLE, _NIL_KEYS),
+    (_DISHES_BY_TITLES, {"menu_ids": [_NIL], "titles": [""], "submenu_ids": [_NIL]}),
+    *((statement, {"since": 0, "upto": 0, "limit": 1}) for statement in _CHANGES_AFTER.values()),
+    *((statements, {"ids": [_NIL]}) for statements in (_MENUS_BY_IDS, _SUBMENUS_BY_IDS, _DISHES_BY_IDS)),
+)
+
+
+def _menu_id_of_submenu(db: Session, submenu_id: UUID):
+    return db.scalar(_MENU_ID_OF_SUBMENU, {"submenu_id": submenu_id})
 
 
 # CRUD FOR MENU
+@cache.cached
 def get_menu(db: Session, menu_id: UUID) -> dict:
     """
     Получение информации о конкретном меню по его ID.
@@ -18,32 +335,13 @@ def get_menu(db: Session, menu_id: UUID) -> dict:
     menu_id (UUID): Уникальный идентификатор меню.
 
     Returns:
-    dict: Словарь с данными меню или None, если меню не найдено.
+    RowMapping: Данные меню с количеством подменю и блюд или None, если меню не найдено.
     """
-    menu_info = (
-        db.query(
-            models.Menu,
-            func.count(distinct(models.SubMenu.id)).label("submenus_count"),
-            func.coalesce(func.count(models.Dish.id), 0).label("dishes_count")
-        )
-        .outerjoin(models.SubMenu, models.Menu.id == models.SubMenu.menu_id)
-        .outerjoin(models.Dish, models.SubMenu.id == models.Dish.submenu_id)
-        .filter(models.Menu.id == menu_id)
-        .group_by(models.Menu.id)
-        .first()
-    )
-    if menu_info:
-        menu_dict = menu_info[0].__dict__
-        menu_dict.pop("_sa_instance_state", None)
-        menu_dict["submenus_count"] = menu_info.submenus_count
-        menu_dict["dishes_count"] = menu_info.dishes_count
-
-        return menu_dict
-    else:
-        return None
+    return db.execute(_MENU_WITH_COUNTS, {"menu_id": menu_id}).mappings().first()
 
 
-def get_menus(db: Session, skip: int = 0, limit: int = 100):
+@cache.cached
+def get_menus(db: Session, skip: int = 0, limit: int = 100, fields: tuple = MENU_FIELDS):
     """
     Получение списка меню с информацией о количестве подменю и блюд для каждого меню.
     Поддерживает пагинацию через параметры skip и limit.
@@ -52,23 +350,12 @@ def get_menus(db: Session, skip: int = 0, limit: int = 100):
     db (Session): Сессия базы данных.
     skip (int): Количество пропускаемых записей.
     limit (int): Максимальное количество записей для возврата.
+    fields (tuple): Поля из MENU_FIELDS, которые нужно выбрать; счетчики считаются, только если запрошены.
 
     Returns:
-    list: Список меню с дополнительной информацией.
-    """
-    results = (
-        db.query(
-            models.Menu,
-            func.coalesce(func.count(models.SubMenu.id), 0).label("submenus_count"),
-            func.coalesce(func.count(models.Dish.id), 0).label("dishes_count"))
-        .outerjoin(models.SubMenu, models.Menu.id == models.SubMenu.menu_id)
-        .outerjoin(models.Dish, models.SubMenu.id == models.Dish.submenu_id)
-        .group_by(models.Menu.id)
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
-    return results
+    List[RowMapping]: Список меню с дополнительной информацией.
+    """
+    return db.execute(_menus_statement(fields), {"skip": skip, "limit": limit}).mappings().all()
 
 
 def create_menu(db: Session, menu: schemas.MenuCreate) -> schemas.Menu:
@@ -88,6 +375,7 @@ def create_menu(db: Session, menu: schemas.MenuCreate) -> schemas.Menu:
     db.add(db_menu)
     db.commit()
     db.refresh(db_menu)
+    _committed(db_menu.id, "menu", "create", db_menu.id, db_menu)
     return schemas.Menu(
         id=db_menu.id,
         title=db_menu.title,
@@ -97,7 +385,7 @@ def create_menu(db: Session, menu: schemas.MenuCreate) -> schemas.Menu:
     )
 
 
-def update_menu(db: Session, menu_id: UUID, menu_data: schemas.MenuUpdate):
+def update_menu(db: Session, menu_id: UUID, menu_data: schemas.MenuUpdate, versions=None):
     """
     Обновление существующего меню.
 
@@ -105,18 +393,17 @@ def update_menu(db: Session, menu_id: UUID, menu_data: schemas.MenuUpdate):
     db (Session): Сессия базы данных.
     menu_id (UUID): Уникальный идентификатор меню для обновления.
     menu_data (schemas.MenuUpdate): Данные для обновления меню.
+    versions: Версии меню из If-Match; None - обновлять любую версию.
 
     Returns:
     Обновленный объект меню или None, если меню не найдено.
+    Несовпадение версии вызывает VersionConflictError.
     """
-    db_menu = db.query(models.Menu).filter(models.Menu.id == menu_id).first()
-    if not db_menu:
+    values = {var: value for var, value in vars(menu_data).items() if value is not None}
+    db_menu = _update_row(db, models.Menu, (models.Menu.id == menu_id,), values, versions)
+    if db_menu is None:
         return None
-    for var, value in vars(menu_data).items():
-        if value is not None:
-            setattr(db_menu, var, value)
-    db.commit()
-    db.refresh(db_menu)
+    _committed(db_menu.id, "menu", "update", db_menu.id, db_menu)
     return db_menu
 
 
@@ -131,14 +418,16 @@ def delete_menu(db: Session, menu_id: UUID):
     Returns:
     bool: True, если меню удалено успешно, иначе False.
     """
-    db_menu = db.query(models.Menu).filter(models.Menu.id == menu_id).first()
+    db_menu = db.scalars(_MENU_FOR_DELETE, {"menu_id": menu_id}).first()
     if db_menu:
         db.delete(db_menu)
         db.commit()
+        _committed(menu_id, "menu", "delete", menu_id)
         return True
     return False
 
 
+@cache.cached
 def get_menu_with_counts(db: Session, menu_id: UUID):
     """
     Получение информации о конкретном меню с подсчетом количества подменю и блюд.
@@ -148,35 +437,13 @@ def get_menu_with_counts(db: Session, menu_id: UUID):
     menu_id (UUID): Уникальный идентификатор меню.
 
     Returns:
-    dict: Словарь с данными меню или None, если меню не найдено.
+    RowMapping: Данные меню или None, если меню не найдено.
     """
-    menu_with_counts = (
-        db.query(
-            models.Menu,
-            func.count(distinct(models.SubMenu.id)).label("submenus_count"),
-            func.count(models.Dish.id).label("dishes_count")
-        )
-        .outerjoin(models.SubMenu, models.Menu.id == models.SubMenu.menu_id)
-        .outerjoin(models.Dish, models.SubMenu.id == models.Dish.submenu_id)
-        .filter(models.Menu.id == menu_id)
-        .group_by(models.Menu.id)
-        .first()
-    )
-
-    if menu_with_counts:
-        menu, submenus_count, dishes_count = menu_with_counts
-        return {
-            "id": menu.id,
-            "title": menu.title,
-            "description": menu.description,
-            "submenus_count": submenus_count,
-            "dishes_count": dishes_count
-        }
-    else:
-        return None
+    return db.execute(_MENU_WITH_COUNTS, {"menu_id": menu_id}).mappings().first()
 
 
 # CRUD FOR SUBMENU
+@cache.cached
 def get_specific_submenu(db: Session, menu_id: UUID, submenu_id: UUID):
     """
     Получение информации о конкретном подменю, включая количество блюд в нем.
@@ -187,30 +454,12 @@ def get_specific_submenu(db: Session, menu_id: UUID, submenu_id: UUID):
     submenu_id (UUID): Идентификатор подменю.
 
     Returns:
-    schemas.SubMenu: Информация о подменю или None, если подменю не найдено.
-    """
-    submenu_info = (
-        db.query(
-            models.SubMenu,
-            func.count(distinct(models.Dish.id)).label("dishes_count"))
-        .outerjoin(models.Dish, models.SubMenu.dishes)
-        .filter(models.SubMenu.id == submenu_id, models.SubMenu.menu_id == menu_id)
-        .group_by(models.SubMenu.id)
-        .first())
-    if submenu_info:
-        submenu_dict = submenu_info[0].__dict__
-        submenu_dict.pop("_sa_instance_state", None)
-        submenu_dict["dishes_count"] = submenu_info.dishes_count
-        submenu_data = schemas.SubMenu(
-            id=submenu_dict["id"],
-            title=submenu_dict["title"],
-            description=submenu_dict["description"],
-            dishes_count=submenu_dict["dishes_count"])
-        return submenu_data
-    else:
-        return None
+    RowMapping: Информация о подменю или None, если подменю не найдено.
+    """
+    return db.execute(_SUBMENU_WITH_COUNT, {"menu_id": menu_id, "submenu_id": submenu_id}).mappings().first()
 
 
+@cache.cached
 def get_submenus_by_menu(db: Session, menu_id: UUID):
     """
     Получение всех подменю для конкретного меню.
@@ -220,9 +469,9 @@ def get_submenus_by_menu(db: Session, menu_id: UUID):
     menu_id (UUID): Идентификатор меню.
 
     Returns:
-    List[models.SubMenu]: Список подменю данного меню.
+    List[RowMapping]: Список подменю данного меню.
     """
-    return db.query(models.SubMenu).filter(models.SubMenu.menu_id == menu_id).all()
+    return db.execute(_SUBMENUS_BY_MENU, {"menu_id": menu_id}).mappings().all()
 
 
 def create_submenu(db: Session, submenu: schemas.SubMenuCreate, menu_id: UUID):
@@ -245,6 +494,7 @@ def create_submenu(db: Session, submenu: schemas.SubMenuCreate, menu_id: UUID):
     db.add(db_submenu)
     db.commit()
     db.refresh(db_submenu)
+    _committed(menu_id, "submenu", "create", db_submenu.id, db_submenu)
     return schemas.SubMenu(
         id=db_submenu.id,
         title=db_submenu.title,
@@ -252,7 +502,8 @@ def create_submenu(db: Session, submenu: schemas.SubMenuCreate, menu_id: UUID):
         dishes_count=0, )
 
 
-def update_submenu(db: Session, menu_id: UUID, submenu_id: UUID, submenu: schemas.SubMenuUpdate):
+def update_submenu(db: Session, menu_id: UUID, submenu_id: UUID, submenu: schemas.SubMenuUpdate,
+                   versions=None):
     """
     Обновление существующего подменю.
 
@@ -261,18 +512,18 @@ def update_submenu(db: Session, menu_id: UUID, submenu_id: UUID, submenu: schema
     menu_id (UUID): Идентификатор родительского меню.
     submenu_id (UUID): Идентификатор подменю для обновления.
     submenu (schemas.SubMenuUpdate): Данные для обновления подменю.
+    versions: Версии подменю из If-Match; None - обновлять любую версию.
 
     Returns:
     Обновленный объект подменю или None, если подменю не найдено.
+    Несовпадение версии вызывает VersionConflictError.
     """
-    db_submenu = db.query(models.SubMenu).filter(models.SubMenu.id == submenu_id,
-                                                 models.SubMenu.menu_id == menu_id).first()
+    values = {var: value for var, value in vars(submenu).items() if value}
+    criteria = (models.SubMenu.id == submenu_id, models.SubMenu.menu_id == menu_id)
+    db_submenu = _update_row(db, models.SubMenu, criteria, values, versions)
     if db_submenu is None:
         return None
-    for var, value in vars(submenu).items():
-        setattr(db_submenu, var, value) if value else None
-    db.commit()
-    db.refresh(db_submenu)
+    _committed(menu_id, "submenu", "update", submenu_id, db_submenu)
     return db_submenu
 
 
@@ -288,17 +539,28 @@ def delete_submenu(db: Session, menu_id: UUID, submenu_id: UUID):
       Returns:
       bool: True, если подменю удалено успешно, иначе False.
       """
-    db_submenu = db.query(models.SubMenu).filter(models.SubMenu.id == submenu_id,
-                                                 models.SubMenu.menu_id == menu_id).first()
+    db_submenu = db.scalars(_SUBMENU_FOR_DELETE, {"menu_id": menu_id, "submenu_id": submenu_id}).first()
     if db_submenu:
         db.delete(db_submenu)
         db.commit()
+        _committed(menu_id, "submenu", "delete", submenu_id)
         return True
     return False
 
 
 # CRUD FOR DISH
-def get_dishes_by_submenu(db: Session, menu_id: UUID, submenu_id: UUID):
+def _dish_row(row) -> dict:
+    """
+    Преобразует строку блюда в словарь ответа, форматируя цену с двумя знаками после запятой.
+    """
+    dish = dict(row)
+    if dish.get("price"):
+        dish["price"] = f"{float(dish['price']):.2f}"
+    return dish
+
+
+@cache.cached
+def get_dishes_by_submenu(db: Session, menu_id: UUID, submenu_id: UUID, fields: tuple = DISH_FIELDS):
     """
     Получение всех блюд в определенном подменю.
 
@@ -306,21 +568,16 @@ def get_dishes_by_submenu(db: Session, menu_id: UUID, submenu_id: UUID):
     db (Session): Сессия базы данных.
     menu_id (UUID): Идентификатор родительского меню.
     submenu_id (UUID): Идентификатор подменю.
+    fields (tuple): Поля из DISH_FIELDS, которые нужно выбрать.
 
     Returns:
-    List[models.Dish]: Список блюд в подменю.
+    List[dict]: Список блюд в подменю.
     """
-    dishes = db.query(models.Dish).join(models.SubMenu).filter(
-        models.SubMenu.id == submenu_id,
-        models.SubMenu.menu_id == menu_id
-    ).all()
-    for dish in dishes:
-        if dish.price:
-            dish.price = f"{float(dish.price):.2f}"
-    return dishes
+    rows = db.execute(_dishes_statement(fields), {"menu_id": menu_id, "submenu_id": submenu_id}).mappings()
+    return [_dish_row(row) for row in rows]
 
 
-def create_dish(db: Session, dish: schemas.DishCreate, submenu_id: UUID):
+def create_dish(db: Session, dish: schemas.DishCreate, submenu_id: UUID, menu_id: UUID = None):
     """
     Создает новое блюдо в подменю. Проверяет наличие уже существующего блюда с тем же названием в этом подменю.
 
@@ -328,27 +585,96 @@ def create_dish(db: Session, dish: schemas.DishCreate, submenu_id: UUID):
     db (Session): Сессия базы данных.
     dish (schemas.DishCreate): Данные для создания блюда.
     submenu_id (UUID): Идентификатор подменю, в котором создается блюдо.
+    menu_id (UUID): Идентификатор меню подменю; если не передан, определяется запросом.
 
     Returns:
     models.Dish: Созданное блюдо.
     """
-    existing_dish = db.query(models.Dish).filter(
-        models.Dish.title == dish.title,
-        models.Dish.submenu_id == submenu_id
-    ).first()
+    menu_id = menu_id or _menu_id_of_submenu(db, submenu_id)
+    existing_dish = db.scalars(_DISH_BY_TITLE, {"menu_id": menu_id, "title": dish.title,
+                                                "submenu_id": submenu_id}).first()
     if existing_dish:
         return existing_dish
     new_dish = models.Dish(
         title=dish.title,
         description=dish.description,
         price=dish.price,
-        submenu_id=submenu_id)
+        submenu_id=submenu_id,
+        menu_id=menu_id)
     db.add(new_dish)
     db.commit()
     db.refresh(new_dish)
+    _committed(menu_id, "dish", "create", new_dish.id, new_dish)
     return new_dish
 
 
+def create_dishes(db: Session, requests: list) -> list:
+    """
+    Создает блюда из нескольких запросов одной транзакцией и одним многострочным INSERT.
+    Каждый запрос получает то же, что вернул бы create_dish: блюдо с тем же названием,
+    уже существующее в подменю или созданное более ранним запросом пачки, иначе новое блюдо.
+    Если INSERT пачки не прошел, строки пишутся по одной в точках сохранения, и ошибка
+    достается только запросам с ошибочной строкой.
+
+    Args:
+    db (Session): Сессия базы данных; должна быть создана с expire_on_commit=False.
+    requests (list): Кортежи (schemas.DishCreate, submenu_id, menu_id) в порядке поступления.
+
+    Returns:
+    list: Для каждого запроса models.Dish или исключение, которое нужно вернуть вызывающему.
+    """
+    requests = [(dish, submenu_id, menu_id or _menu_id_of_submenu(db, submenu_id))
+                for dish, submenu_id, menu_id in requests]
+    existing = {}
+    for dish in db.scalars(_DISHES_BY_TITLES, {
+        "menu_ids": list({menu_id for _, _, menu_id in requests}),
+        "titles": list({dish.title for dish, _, _ in requests}),
+        "submenu_ids": list({submenu_id for _, submenu_id, _ in requests}),
+    }):
+        existing.setdefault((dish.submenu_id, dish.title), dish)
+
+    rows = {}
+    for dish, submenu_id, menu_id in requests:
+        key = (submenu_id, dish.title)
+        if key not in existing and key not in rows:
+            rows[key] = {
+                "id": uuid4(),
+                "menu_id": menu_id,
+                "title": dish.title,
+                "description": dish.description,
+                "price": dish.price,
+                "submenu_id": submenu_id,
+            }
+
+    created = {}
+    if rows:
+        try:
+            with db.begin_nested():
+                created.update((new_dish.id, new_dish) for new_dish in db.scalars(_INSERT_DISHES, list(rows.values())))
+        except DBAPIError:
+            for row in rows.values():
+                try:
+                    with db.begin_nested():
+                        created[row["id"]] = db.scalars(_INSERT_DISHES, [row]).one()
+                except DBAPIError as error:
+                    created[row["id"]] = error
+        db.commit()
+
+    inserted = [created[row["id"]] for row in rows.values() if isinstance(created[row["id"]], models.Dish)]
+    for menu_id in {new_dish.menu_id for new_dish in inserted}:
+        cache.invalidate(menu_id)
+    if inserted:
+        snapshot.schedule()
+    for new_dish in inserted:
+        _publish(new_dish.menu_id, "dish", "create", new_dish.id, new_dish)
+
+    return [
+        existing.get((submenu_id, dish.title)) or created[rows[(submenu_id, dish.title)]["id"]]
+        for dish, submenu_id, _ in requests
+    ]
+
+
+@cache.cached
 def get_specific_dish(db: Session, menu_id: UUID, submenu_id: UUID, dish_id: UUID):
     """
     Получает информацию о конкретном блюде, учитывая идентификаторы меню, подменю и блюда.
@@ -360,22 +686,24 @@ def get_specific_dish(db: Session, menu_id: UUID, submenu_id: UUID, dish_id: UUI
     dish_id (UUID): Идентификатор блюда.
 
     Returns:
-    models.Dish: Информация о блюде.
-    """
-    dish = db.query(models.Dish).join(
-        models.SubMenu, models.SubMenu.id == models.Dish.submenu_id
-    ).filter(
-        models.Dish.id == dish_id,
-        models.SubMenu.id == submenu_id,
-        models.SubMenu.menu_id == menu_id
-    ).first()
-    if dish and dish.price:
-        dish.price = f"{float(dish.price):.2f}"
+    dict: Информация о блюде или None, если блюдо не найдено.
+    """
+    row = db.execute(_DISH_IN_SUBMENU, {"menu_id": menu_id, "submenu_id": submenu_id,
+                                        "dish_id": dish_id}).mappings().first()
+    if row is None:
+        return None
+    return _dish_row(row)
 
-    return dish
 
+def _dish_for_write(db: Session, dish_id: UUID, menu_id: UUID = None):
+    # Без menu_id блюдо ищется во всех секциях
+    if menu_id is None:
+        return db.scalars(_DISH_BY_ID, {"dish_id": dish_id}).first()
+    return db.get(models.Dish, (dish_id, menu_id))
 
-def update_dish(db: Session, dish_id: UUID, dish_update: schemas.DishUpdate):
+
+def update_dish(db: Session, dish_id: UUID, dish_update: schemas.DishUpdate, menu_id: UUID = None,
+                versions=None):
     """
     Обновляет информацию о блюде по его идентификатору.
 
@@ -383,34 +711,275 @@ def update_dish(db: Session, dish_id: UUID, dish_update: schemas.DishUpdate):
     db (Session): Сессия базы данных.
     dish_id (UUID): Идентификатор блюда для обновления.
     dish_update (schemas.DishUpdate): Обновленные данные блюда.
+    menu_id (UUID): Идентификатор меню блюда; без него блюдо ищется во всех секциях.
+    versions: Версии блюда из If-Match; None - обновлять любую версию.
 
     Returns:
     models.Dish: Обновленная информация о блюде.
+    Несовпадение версии вызывает VersionConflictError.
     """
-    db_dish = db.query(models.Dish).filter(models.Dish.id == dish_id).first()
+    values = {var: value for var, value in vars(dish_update).items() if value is not None}
+    criteria = (models.Dish.id == dish_id,) if menu_id is None else (
+        models.Dish.id == dish_id, models.Dish.menu_id == menu_id)
+    db_dish = _update_row(db, models.Dish, criteria, values, versions)
     if db_dish is None:
         return None
-    for var, value in vars(dish_update).items():
-        setattr(db_dish, var, value) if value is not None else None
-    db.commit()
-    db.refresh(db_dish)
+    _committed(db_dish.menu_id, "dish", "update", dish_id, db_dish)
     return db_dish
 
 
-def delete_dish(db: Session, dish_id: UUID) -> bool:
+def delete_dish(db: Session, dish_id: UUID, menu_id: UUID = None) -> bool:
     """
     Удаляет блюдо по его идентификатору.
 
     Args:
     db (Session): Сессия базы данных.
     dish_id (UUID): Идентификатор блюда для удаления.
+    menu_id (UUID): Идентификатор меню блюда; если не передан, определяется запросом.
 
     Returns:
     bool: True, если удаление успешно, иначе False.
     """
-    dish = db.query(models.Dish).filter(models.Dish.id == dish_id).first()
+    dish = _dish_for_write(db, dish_id, menu_id)
     if dish:
+        menu_id = dish.menu_id
         db.delete(dish)
         db.commit()
+        _committed(menu_id, "dish", "delete", dish_id)
         return True
     return False
+
+
+# CHANGES
+def change_data(row) -> dict:
+    """
+    Возвращает содержимое строки для ленты изменений.
+    """
+    if isinstance(row, models.Menu):
+        return {"title": row.title, "description": row.description}
+    if isinstance(row, models.SubMenu):
+        return {"menu_id": row.menu_id, "title": row.title, "description": row.description}
+    return {
+        "submenu_id": row.submenu_id,
+        "title": row.title,
+        "description": row.description,
+        "price": f"{float(row.price):.2f}" if row.price else row.price,
+    }
+
+
+def get_changes(db: Session, since: int, limit: int = 500) -> schemas.ChangesPage:
+    """
+    Получение изменений меню, подменю и блюд после указанной отметки.
+    Каждая таблица читается по индексу change_seq не более чем на limit + 1 строк,
+    затем результаты сливаются в общую ленту по возрастанию change_seq.
+    Лента ограничена сверху models.committed_change_seq: изменение с меньшей отметкой,
+    которое зафиксируется позже, не окажется ниже выданного клиенту next_since.
+
+    Args:
+    db (Session): Сессия базы данных.
+    since (int): Отметка последнего полученного клиентом изменения.
+    limit (int): Максимальное количество изменений на странице.
+
+    Returns:
+    schemas.ChangesPage: Страница изменений и отметка для следующего запроса.
+    """
+    changes = []
+    upto = models.committed_change_seq(db.connection())
+    params = {"since": since, "upto": _MAX_SEQ if upto is None else upto, "limit": limit + 1}
+    for model, entity in models.ENTITY_NAMES.items():
+        rows = db.scalars(_CHANGES_AFTER[model], params).all()
+        changes.extend(
+            schemas.Change(seq=row.change_seq, entity=entity, op="upsert", id=row.id, data=change_data(row))
+            for row in rows
+        )
+
+    tombstones = db.scalars(_CHANGES_AFTER[models.Tombstone], params).all()
+    changes.extend(
+        schemas.Change(seq=tombstone.change_seq, entity=tombstone.entity, op="delete", id=tombstone.entity_id)
+        for tombstone in tombstones
+    )
+
+    changes.sort(key=lambda change: change.seq)
+    page = changes[:limit]
+    return schemas.ChangesPage(
+        changes=page,
+        next_since=page[-1].seq if page else since,
+        has_more=len(changes) > limit,
+    )
+
+
+def get_change_data(db: Session, entity: str, entity_id: UUID, menu_id: UUID):
+    """
+    Получение текущего содержимого строки для события изменения.
+
+    Args:
+    db (Session): Сессия базы данных.
+    entity (str): Тип сущности: menu, submenu или dish.
+    entity_id (UUID): Идентификатор строки.
+    menu_id (UUID): Меню строки; у блюд входит в первичный ключ.
+
+    Returns:
+    dict | None: Содержимое строки, как в ленте изменений, или None, если строки уже нет.
+    """
+    if entity == "dish":
+        row = db.get(models.Dish, (entity_id, menu_id))
+    else:
+        row = db.get(_ENTITY_MODELS[entity], entity_id)
+    return None if row is None else change_data(row)
+
+
+def warm_up(db: Session) -> int:
+    """
+    Выполняет каждый горячий запрос чтения с несуществующими ключами, чтобы SQLAlchemy
+    настроил мапперы и положил скомпилированный SQL в кэш до первых запросов клиентов.
+    Запросы ничего не находят и не меняют данные.
+
+    Args:
+    db (Session): Сессия базы данных.
+
+    Returns:
+    int: Количество выполненных запросов.
+    """
+    for statement, params in _WARM_UP:
+        if isinstance(statement, dict):
+            statement = _for_dialect(db, statement)
+        db.execute(statement, params).all()
+    db.get(models.Menu, _NIL)
+    db.get(models.Dish, (_NIL, _NIL))
+    db.rollback()
+    return len(_WARM_UP) + 2
+
+
+# BATCH
+def _get_by_ids(db: Session, statements: dict, ids: list, row=dict) -> list:
+    rows = db.execute(_for_dialect(db, statements), {"ids": list(dict.fromkeys(ids))}).mappings()
+    found = {item["id"]: row(item) for item in rows}
+    return [{"id": id, "found": id in found, "data": found.get(id)} for id in ids]
+
+
+_CHANGE_SEQS_BY_IDS = {
+    entity: _by_ids(select(model.id, model.change_seq), model.id) for model, entity in models.ENTITY_NAMES.items()
+}
+
+
+def get_change_seqs(db: Session, entity: str, ids: list) -> dict:
+    """
+    Получение отметок изменений строк одного типа одним запросом.
+
+    Args:
+    db (Session): Сессия базы данных.
+    entity (str): Тип сущности: menu, submenu или dish.
+    ids (list): Идентификаторы строк.
+
+    Returns:
+    dict: Отметка change_seq по идентификатору для найденных строк.
+    """
+    return dict(db.execute(_for_dialect(db, _CHANGE_SEQS_BY_IDS[entity]), {"ids": list(dict.fromkeys(ids))}).all())
+
+
+def get_menus_by_ids(db: Session, ids: list) -> list:
+    """
+    Получение меню со счетчиками по списку идентификаторов одним запросом.
+
+    Args:
+    db (Session): Сессия базы данных.
+    ids (list): Идентификаторы меню; повторы допускаются.
+
+    Returns:
+    List[dict]: По элементу на каждый идентификатор в порядке запроса: id, found и data
+    (данные меню или None, если меню не найдено).
+    """
+    return _get_by_ids(db, _MENUS_BY_IDS, ids)
+
+
+def get_submenus_by_ids(db: Session, ids: list) -> list:
+    """
+    Получение подменю с количеством блюд по списку идентификаторов одним запросом.
+
+    Args:
+    db (Session): Сессия базы данных.
+    ids (list): Идентификаторы подменю; повторы допускаются.
+
+    Returns:
+    List[dict]: По элементу на каждый идентификатор в порядке запроса: id, found и data.
+    """
+    return _get_by_ids(db, _SUBMENUS_BY_IDS, ids)
+
+
+def get_dishes_by_ids(db: Session, ids: list) -> list:
+    """
+    Получение блюд по списку идентификаторов одним запросом, без пути через меню и подменю.
+
+    Args:
+    db (Session): Сессия базы данных.
+    ids (list): Идентификаторы блюд; повторы допускаются.
+
+    Returns:
+    List[dict]: По элементу на каждый идентификатор в порядке запроса: id, found и data.
+    """
+    return _get_by_ids(db, _DISHES_BY_IDS, ids, row=_dish_row)
+
+
+# SNAPSHOT
+def get_catalogue(db: Session) -> list:
+    """
+    Получение всего каталога деревом: меню со счетчиками, в них подменю с количеством
+    блюд, в них блюда. Выполняет три запроса независимо от размера каталога.
+
+    Args:
+    db (Session): Сессия базы данных.
+
+    Returns:
+    List[dict]: Меню с ключом submenus, подменю с ключом dishes, по возрастанию id.
+    """
+    submenus = {}
+    for row in db.execute(_CATALOGUE_SUBMENUS).mappings():
+        submenu = dict(row)
+        submenu["dishes"] = []
+        submenus.setdefault(submenu.pop("menu_id"), []).append(submenu)
+    dishes = {}
+    for row in db.execute(_CATALOGUE_DISHES).mappings():
+        dish = _dish_row(row)
+        dishes.setdefault(dish.pop("submenu_id"), []).append(dish)
+    menus = []
+    for row in db.execute(_CATALOGUE_MENUS).mappings():
+        menu = dict(row)
+        menu["submenus"] = submenus.get(menu["id"], [])
+        for submenu in menu["submenus"]:
+            submenu["dishes"] = dishes.get(submenu["id"], [])
+        menus.append(menu)
+    return menus
+
+
+def render_catalogue(db: Session) -> bytes:
+    """
+    Сериализует весь каталог для снимка.
+
+    Args:
+    db (Session): Сессия базы данных.
+
+    Returns:
+    bytes: JSON по схеме schemas.Catalogue.
+    """
+    catalogue = schemas.Catalogue(generated_at=datetime.datetime.utcnow(), menus=get_catalogue(db))
+    return catalogue.model_dump_json().encode()
+
+
+def get_change_watermark(db: Session) -> int:
+    """
+    Отметка последнего изменения каталога: меняется при каждой записи, включая удаления.
+    В Postgres это граница ленты изменений из models.committed_change_seq, поэтому все записи
+    до нее уже зафиксированы и видны следующему чтению.
+
+    Args:
+    db (Session): Сессия базы данных.
+
+    Returns:
+    int: Отметка изменений.
+    """
+    upto = models.committed_change_seq(db.connection())
+    if upto is not None:
+        return upto
+    return max(
+        db.scalar(select(func.max(model.change_seq))) or 0 for model in (*models.ENTITY_NAMES, models.Tombstone)
+    )
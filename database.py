@@ -1,19 +1,198 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import logging
+import sys
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import declarative_base, raiseload, sessionmaker
+from sqlalchemy.pool import StaticPool
 
 from config import load_config
 
+logger = logging.getLogger(__name__)
+
 config_url = load_config('.env')
 SQLALCHEMY_DATABASE_URL = config_url.db.DATABASE_URL
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+def build_engine(url: str, pool=None):
+    """
+    Создает движок с настройками пула под диалект.
+
+    SQLite (быстрые тесты и локальная разработка) работает без сервера; БД в памяти
+    существует, пока открыто соединение, поэтому все потоки делят одно соединение.
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        in_memory = parsed.database in (None, "", ":memory:")
+        sqlite_engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool if in_memory else None,
+        )
+        _configure_sqlite(sqlite_engine)
+        return sqlite_engine
+    return create_engine(
+        url,
+        pool_size=pool.size,
+        max_overflow=pool.max_overflow,
+        pool_timeout=pool.timeout,
+    )
+
+
+def _configure_sqlite(sqlite_engine) -> None:
+    # pysqlite сам управляет транзакциями и ломает SAVEPOINT, поэтому BEGIN выдается явно
+    @event.listens_for(sqlite_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+    @event.listens_for(sqlite_engine, "begin")
+    def _on_begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+
+def _origin() -> str:
+    """
+    Находит функцию приложения, из которой пришел запрос: ближайший кадр crud.py,
+    а если его нет - ближайший кадр вне SQLAlchemy и этого модуля.
+    """
+    fallback = None
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if Path(filename).name == "crud.py":
+            return f"crud.{frame.f_code.co_name}:{frame.f_lineno}"
+        if fallback is None and "sqlalchemy" not in filename and filename != __file__:
+            fallback = f"{Path(filename).stem}.{frame.f_code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return fallback or "unknown"
+
+
+def _shorten(value, limit: int = 500) -> str:
+    text = repr(value)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+class SlowQueryLog:
+    """
+    Журнал медленных запросов на событиях движка.
+
+    Время каждого запроса измеряется по событиям курсора. Запросы дольше порога пишутся
+    в лог с параметрами и функцией crud.py, из которой они вызваны. При explain=True
+    для медленных SELECT в Postgres в фоновом потоке снимается EXPLAIN (ANALYZE, BUFFERS)
+    на отдельном соединении, не чаще раза в explain_interval секунд на текст запроса.
+
+    Args:
+    engine: Движок SQLAlchemy.
+    threshold_ms (float): Порог медленного запроса в миллисекундах.
+    explain (bool): Снимать план медленных запросов.
+    explain_interval (float): Минимальный интервал между планами одного запроса.
+    """
+
+    def __init__(self, engine, threshold_ms: float = 100.0, explain: bool = False,
+                 explain_interval: float = 300.0):
+        self.engine = engine
+        self.threshold = threshold_ms / 1000
+        self.explain = explain and engine.dialect.name == "postgresql"
+        self.explain_interval = explain_interval
+        self._key = f"slow_query_started_{id(self)}"
+        self._explained = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def install(self) -> None:
+        event.listen(self.engine, "before_cursor_execute", self._before)
+        event.listen(self.engine, "after_cursor_execute", self._after)
+
+    def remove(self) -> None:
+        event.remove(self.engine, "before_cursor_execute", self._before)
+        event.remove(self.engine, "after_cursor_execute", self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault(self._key, []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get(self._key)
+        if not started:
+            # Журнал подключен во время выполнения запроса
+            return
+        elapsed = time.perf_counter() - started.pop()
+        if elapsed < self.threshold or conn.get_execution_options().get("slow_query_log") is False:
+            return
+        origin = _origin()
+        logger.warning("slow query %.1f ms in %s: %s; parameters: %s",
+                       elapsed * 1000, origin, statement, _shorten(parameters))
+        if self.explain and not executemany and statement.lstrip().upper().startswith("SELECT"):
+            self._schedule_explain(statement, parameters, origin)
+
+    def _schedule_explain(self, statement: str, parameters, origin: str) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._explained.get(statement, -self.explain_interval) < self.explain_interval:
+                return
+            self._explained[statement] = now
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+        self._executor.submit(self._explain, statement, parameters, origin)
+
+    def _explain(self, statement: str, parameters, origin: str) -> None:
+        try:
+            with self.engine.connect().execution_options(slow_query_log=False) as connection:
+                # ANALYZE выполняет запрос, поэтому план снимается только для SELECT и откатывается
+                rows = connection.exec_driver_sql(
+                    "EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters).scalars().all()
+                connection.rollback()
+            logger.warning("plan of slow query in %s: %s\n%s", origin, statement, "\n".join(rows))
+        except Exception:
+            logger.exception("failed to explain slow query in %s", origin)
+
+
+engine = build_engine(SQLALCHEMY_DATABASE_URL, config_url.pool)
+slow_query_log = SlowQueryLog(
+    engine,
+    threshold_ms=config_url.slow_query.threshold_ms,
+    explain=config_url.slow_query.explain,
+    explain_interval=config_url.slow_query.explain_interval,
+)
+if config_url.slow_query.enabled:
+    slow_query_log.install()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+# Запросы с raiseload для заранее собранных запросов crud.py запоминаются, чтобы не терять
+# закэшированный ключ запроса
+_raiseload_statements = weakref.WeakKeyDictionary()
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _raise_on_lazy_load(orm_execute_state):
+    """
+    В сессиях запросов запрещает ленивую загрузку связей: обращение к незагруженной связи
+    вызывает ошибку вместо скрытого запроса на каждую строку. Нужные связи crud.py загружает
+    явно через selectinload, явные опции важнее общего raiseload("*").
+    """
+    if (
+        not orm_execute_state.session.info.get("raiseload")
+        or not orm_execute_state.is_select
+        or orm_execute_state.is_relationship_load
+    ):
+        return
+    statement = orm_execute_state.statement
+    guarded = _raiseload_statements.get(statement)
+    if guarded is None:
+        guarded = _raiseload_statements[statement] = statement.options(raiseload("*"))
+    orm_execute_state.statement = guarded
+
 
 def get_db():
     db = SessionLocal()
+    db.info["raiseload"] = config_url.orm.raiseload
     try:
         yield db
     finally:
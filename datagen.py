@@ -0,0 +1,231 @@
+"""
+Генератор синтетического каталога для бенчмарков и нагрузочных тестов.
+
+Размеры меню и подменю распределены с тяжелым хвостом (несколько огромных меню и много
+маленьких), названия собираются из слов на нескольких языках, цены распределены
+логарифмически в заданном диапазоне. Одинаковый seed дает одинаковые данные, включая UUID.
+Строки пишутся пачками многострочных INSERT в обход событий и кэша, поэтому генератор
+предназначен только для тестовых БД.
+
+Запуск:
+    python datagen.py --dishes 100000 [--seed 0] [--url postgresql://...] [--clear]
+"""
+import argparse
+import math
+import random
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from sqlalchemy import delete, insert
+
+import cache
+import models
+from database import Base, build_engine, config_url
+
+ADJECTIVES = (
+    "Домашний", "Пряный", "Копченый", "Хрустящий", "Нежный", "Острый", "Сливочный",
+    "Crème", "Brûlée", "Flambé", "Jalapeño", "Über", "Ñoño",
+    "特製", "辛口", "Ευωδιαστό", "Çıtır", "Żurek", "ใบกะเพรา",
+)
+NOUNS = (
+    "борщ", "пельмени", "шашлык", "салат", "суп", "пирог", "плов", "блины", "хачапури",
+    "ramen", "crêpe", "smørrebrød", "paella", "café", "soufflé", "phở", "bánh mì",
+    "拉面", "寿司", "σουβλάκι", "köfte", "pierogi", "ผัดไทย", "🍜", "🥟",
+)
+SECTIONS = (
+    "Закуски", "Супы", "Горячее", "Гарниры", "Десерты", "Напитки", "Завтраки", "Детское меню",
+    "Entrées", "Plats du jour", "Dolci", "麺類", "Ποτά", "Tatlılar",
+)
+RESTAURANTS = (
+    "Трактир", "Бистро", "Кафе", "Пекарня", "Brasserie", "Trattoria", "Izakaya", "Taverna",
+    "居酒屋", "Lokanta", "Bar à vins",
+)
+
+
+@dataclass
+class DatasetSpec:
+    """
+    Параметры набора данных.
+
+    Args:
+    dishes (int): Точное число блюд.
+    seed (int): Зерно генератора; одинаковое зерно дает одинаковые данные.
+    submenus_per_menu (float): Среднее число подменю в меню.
+    dishes_per_submenu (float): Среднее число блюд в подменю.
+    skew (float): Показатель распределения Парето для размеров: чем ближе к 1, тем тяжелее хвост.
+    price_min (float): Нижняя граница цены.
+    price_max (float): Верхняя граница цены.
+    batch (int): Число строк в одном INSERT.
+    """
+    dishes: int = 10_000
+    seed: int = 0
+    submenus_per_menu: float = 6.0
+    dishes_per_submenu: float = 12.0
+    skew: float = 1.5
+    price_min: float = 50.0
+    price_max: float = 5000.0
+    batch: int = 5000
+
+
+@dataclass
+class Dataset:
+    """
+    Сводка созданного набора и ключи для выборочных запросов.
+
+    largest_menu и largest_submenu - идентификаторы самых больших меню и подменю,
+    samples - кортежи (menu_id, submenu_id, dish_id) случайных блюд.
+    """
+    menus: int = 0
+    submenus: int = 0
+    dishes: int = 0
+    seconds: float = 0.0
+    largest_menu: uuid.UUID = None
+    largest_submenu: tuple = None
+    samples: list = field(default_factory=list)
+
+    def summary(self) -> str:
+        return (f"{self.menus} menus, {self.submenus} submenus, {self.dishes} dishes "
+                f"in {self.seconds:.1f} s")
+
+
+def _size(rng: random.Random, mean: float, skew: float) -> int:
+    # Парето со средним mean; хвост ограничен, чтобы одно меню не забрало весь набор
+    scale = mean * (skew - 1) / skew
+    return max(1, min(int(scale * rng.paretovariate(skew)), int(mean * 50)))
+
+
+def _uuid(rng: random.Random) -> uuid.UUID:
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def _title(rng: random.Random, words: tuple, used: set, extra: tuple = ()) -> str:
+    title = " ".join(rng.choice(part) for part in (words, *extra))
+    if title in used:
+        title = f"{title} №{len(used) + 1}"
+    used.add(title)
+    return title
+
+
+def _price(rng: random.Random, spec: DatasetSpec) -> str:
+    return f"{math.exp(rng.uniform(math.log(spec.price_min), math.log(spec.price_max))):.2f}"
+
+
+def generate(connection, spec: DatasetSpec, samples: int = 100) -> Dataset:
+    """
+    Заполняет БД каталогом по параметрам spec.
+
+    Args:
+    connection: Соединение SQLAlchemy; транзакцией управляет вызывающий.
+    spec (DatasetSpec): Параметры набора.
+    samples (int): Сколько случайных блюд вернуть для выборочных запросов.
+
+    Returns:
+    Dataset: Сводка созданного набора.
+    """
+    rng = random.Random(spec.seed)
+    dataset = Dataset()
+    buffers = {models.Menu: [], models.SubMenu: [], models.Dish: []}
+    largest_menu = largest_submenu = 0
+    sample_every = max(1, spec.dishes // samples)
+    started = time.perf_counter()
+
+    def flush():
+        # Родители пишутся раньше детей, чтобы выполнялись внешние ключи
+        for model, rows in buffers.items():
+            if rows:
+                connection.execute(insert(model.__table__), rows)
+                rows.clear()
+
+    while dataset.dishes < spec.dishes:
+        menu_id = _uuid(rng)
+        buffers[models.Menu].append({
+            "id": menu_id,
+            "title": f"{rng.choice(RESTAURANTS)} {dataset.menus + 1}",
+            "description": rng.choice(RESTAURANTS),
+        })
+        dataset.menus += 1
+        menu_dishes = 0
+        used_sections = set()
+        for _ in range(_size(rng, spec.submenus_per_menu, spec.skew)):
+            if dataset.dishes >= spec.dishes:
+                break
+            submenu_id = _uuid(rng)
+            buffers[models.SubMenu].append({
+                "id": submenu_id,
+                "menu_id": menu_id,
+                "title": _title(rng, SECTIONS, used_sections),
+                "description": rng.choice(SECTIONS),
+            })
+            dataset.submenus += 1
+            count = min(_size(rng, spec.dishes_per_submenu, spec.skew), spec.dishes - dataset.dishes)
+            used_titles = set()
+            for _ in range(count):
+                dish_id = _uuid(rng)
+                buffers[models.Dish].append({
+                    "id": dish_id,
+                    "menu_id": menu_id,
+                    "submenu_id": submenu_id,
+                    "title": _title(rng, ADJECTIVES, used_titles, (NOUNS,)),
+                    "description": " ".join(rng.choices(NOUNS, k=rng.randint(2, 8))),
+                    "price": _price(rng, spec),
+                })
+                dataset.dishes += 1
+                if dataset.dishes % sample_every == 0 and len(dataset.samples) < samples:
+                    dataset.samples.append((menu_id, submenu_id, dish_id))
+            menu_dishes += count
+            if count > largest_submenu:
+                largest_submenu, dataset.largest_submenu = count, (menu_id, submenu_id)
+            if len(buffers[models.Dish]) >= spec.batch:
+                flush()
+        if menu_dishes > largest_menu:
+            largest_menu, dataset.largest_menu = menu_dishes, menu_id
+    flush()
+    cache.invalidate()
+    dataset.seconds = time.perf_counter() - started
+    return dataset
+
+
+def clear(connection) -> None:
+    """
+    Удаляет весь каталог, включая надгробия. Только для тестовых БД.
+    """
+    for model in (models.Dish, models.SubMenu, models.Menu, models.Tombstone):
+        connection.execute(delete(model.__table__))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dishes", type=int, default=DatasetSpec.dishes, help="число блюд")
+    parser.add_argument("--seed", type=int, default=DatasetSpec.seed)
+    parser.add_argument("--submenus-per-menu", type=float, default=DatasetSpec.submenus_per_menu)
+    parser.add_argument("--dishes-per-submenu", type=float, default=DatasetSpec.dishes_per_submenu)
+    parser.add_argument("--skew", type=float, default=DatasetSpec.skew, help="показатель Парето (> 1)")
+    parser.add_argument("--price-min", type=float, default=DatasetSpec.price_min)
+    parser.add_argument("--price-max", type=float, default=DatasetSpec.price_max)
+    parser.add_argument("--url", default=config_url.db.DATABASE_URL, help="БД, по умолчанию из настроек")
+    parser.add_argument("--clear", action="store_true", help="удалить существующий каталог перед генерацией")
+    args = parser.parse_args()
+    if args.skew <= 1:
+        parser.error("--skew must be greater than 1")
+
+    spec = DatasetSpec(
+        dishes=args.dishes,
+        seed=args.seed,
+        submenus_per_menu=args.submenus_per_menu,
+        dishes_per_submenu=args.dishes_per_submenu,
+        skew=args.skew,
+        price_min=args.price_min,
+        price_max=args.price_max,
+    )
+    engine = build_engine(args.url, config_url.pool)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        if args.clear:
+            clear(connection)
+        dataset = generate(connection, spec)
+    print(dataset.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from uuid import UUID
+
+from fastapi.encoders import jsonable_encoder
+
+from pubsub import MESSAGES_LOST, LocalPubSub, build_pubsub
+
+logger = logging.getLogger(__name__)
+
+# Политики для медленных клиентов при переполнении буфера
+RESYNC = "resync"
+DISCONNECT = "disconnect"
+
+_CLOSE = object()
+
+
+class Subscription:
+    """
+    Подписка одного клиента на события меню.
+
+    События складываются в ограниченный буфер в цикле событий клиента. Если клиент
+    не успевает их забирать, буфер сбрасывается и вместо него отправляется одно событие
+    resync (клиент догоняет через /changes) или соединение закрывается.
+    """
+
+    def __init__(self, menu_id: UUID, loop, buffer_size: int, overflow: str):
+        self.menu_id = menu_id
+        self.loop = loop
+        self.overflow = overflow
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+
+    def offer(self, event) -> None:
+        """
+        Кладет событие в буфер. Вызывается только в цикле событий подписки.
+        """
+        if not self.queue.full():
+            self.queue.put_nowait(event)
+            return
+        self.dropped += self.queue.qsize()
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        if self.overflow == DISCONNECT:
+            self.queue.put_nowait(_CLOSE)
+        else:
+            self.queue.put_nowait({"type": RESYNC, "menu_id": str(self.menu_id)})
+
+    async def get(self, timeout: float):
+        """
+        Ждет следующее событие не дольше timeout секунд.
+
+        Returns:
+        dict: Событие, None при истечении таймаута или _CLOSE, если подписку нужно закрыть.
+        """
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBroker:
+    """
+    Брокер событий изменений меню.
+
+    Записи публикуют события в канал pub/sub (в процессе или через Postgres LISTEN/NOTIFY),
+    брокер каждого воркера принимает их и раздает подписчикам соответствующего меню.
+    В канале идут только идентификаторы и отметки: данные строки брокер читает функцией load
+    один раз на событие и только если у меню есть подписчики. Если транспорт сообщил о потере
+    сообщений, каждый подписчик получает событие resync.
+
+    Args:
+    load: Функция (entity, id, menu_id), возвращающая данные строки или None; без нее события
+        отдаются без data.
+    """
+
+    def __init__(self, pubsub, channel: str = "catalogue_events", buffer_size: int = 100,
+                 overflow: str = RESYNC, load=None):
+        self.channel = channel
+        self.buffer_size = buffer_size
+        self.overflow = overflow
+        self.load = load
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+        self.pubsub = None
+        self.use(pubsub)
+
+    def use(self, pubsub, channel: str = None) -> None:
+        """
+        Переключает брокер на другой транспорт pub/sub и, при необходимости, канал.
+        """
+        if self.pubsub is not None:
+            self.pubsub.unsubscribe(self.channel, self._dispatch)
+        self.pubsub = pubsub
+        self.channel = channel or self.channel
+        pubsub.subscribe(self.channel, self._dispatch)
+
+    def publish(self, menu_id: UUID, event: dict) -> None:
+        """
+        Публикует событие изменения для подписчиков меню во всех воркерах.
+
+        Args:
+        menu_id (UUID): Меню, к которому относится изменение.
+        event (dict): Событие: entity, op, id и при наличии seq.
+        """
+        message = dict(event, menu_id=menu_id)
+        try:
+            self.pubsub.publish(self.channel, json.dumps(jsonable_encoder(message)))
+        except Exception:
+            # Лента событий не должна ломать уже зафиксированную запись
+            logger.exception("failed to publish change event for menu %s", menu_id)
+
+    def subscribe(self, menu_id: UUID) -> Subscription:
+        subscription = Subscription(menu_id, asyncio.get_running_loop(), self.buffer_size, self.overflow)
+        with self._lock:
+            self._subscriptions[str(menu_id)].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscriptions.get(str(subscription.menu_id))
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[str(subscription.menu_id)]
+
+    def subscriber_count(self, menu_id: UUID) -> int:
+        with self._lock:
+            return len(self._subscriptions.get(str(menu_id), ()))
+
+    def _dispatch(self, message: str) -> None:
+        if message == MESSAGES_LOST:
+            with self._lock:
+                subscribers = [subscription for menu in self._subscriptions.values() for subscription in menu]
+            for subscription in subscribers:
+                self._offer(subscription, {"type": RESYNC, "menu_id": str(subscription.menu_id)})
+            return
+        event = json.loads(message)
+        with self._lock:
+            subscribers = list(self._subscriptions.get(event["menu_id"], ()))
+        if not subscribers:
+            return
+        if self.load is not None and event["op"] != "delete":
+            try:
+                data = self.load(event["entity"], UUID(event["id"]), UUID(event["menu_id"]))
+            except Exception:
+                logger.exception("failed to load %s %s for change event", event["entity"], event["id"])
+                data = None
+            if data is not None:
+                event["data"] = jsonable_encoder(data)
+        for subscription in subscribers:
+            self._offer(subscription, event)
+
+    def _offer(self, subscription: Subscription, event: dict) -> None:
+        try:
+            subscription.loop.call_soon_threadsafe(subscription.offer, event)
+        except RuntimeError:
+            # Цикл событий клиента уже закрыт
+            self.unsubscribe(subscription)
+
+
+def format_sse(event: dict) -> str:
+    """
+    Форматирует событие в кадр Server-Sent Events.
+    """
+    lines = []
+    if event.get("seq") is not None:
+        lines.append(f"id: {event['seq']}")
+    lines.append(f"event: {event.get('type', 'change')}")
+    lines.append(f"data: {json.dumps(event)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream(menu_id: UUID, request, heartbeat: float = 15.0):
+    """
+    Асинхронный генератор кадров SSE для одного клиента.
+
+    Args:
+    menu_id (UUID): Меню, на изменения которого подписан клиент.
+    request: Запрос Starlette, по нему отслеживается отключение клиента.
+    heartbeat (float): Интервал комментариев keep-alive при отсутствии событий.
+    """
+    subscription = broker.subscribe(menu_id)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            event = await subscription.get(heartbeat)
+            if event is _CLOSE:
+                return
+            if event is None:
+                if await request.is_disconnected():
+                    return
+                yield ": keep-alive\n\n"
+                continue
+            yield format_sse(event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+broker = EventBroker(LocalPubSub())
+
+
+def configure(config, engine, load=None) -> None:
+    """
+    Настраивает транспорт, политику переполнения и чтение данных строк брокера по настройкам приложения.
+    """
+    broker.buffer_size = config.buffer_size
+    broker.overflow = config.overflow
+    broker.load = load
+    broker.use(build_pubsub(config.pubsub, engine), channel=config.channel)
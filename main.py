@@ -1,86 +1,338 @@
 import logging
-from typing import List
+from contextlib import asynccontextmanager
+from typing import List, Optional
 from uuid import UUID
 
 from fastapi import FastAPI, status
-from fastapi import HTTPException, Depends, APIRouter
+from fastapi import HTTPException, Depends, APIRouter, Header, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
 
+import cache
 import crud
-import database
+import events
 import models
 import schemas
-from database import SessionLocal
+import snapshot
+from admission import AdmissionController, BULK, READ, WRITE
+from coalescing import SingleFlight, WriteBatcher
+from config import load_config
+from database import SessionLocal, get_db
 from database import engine
+from middleware import CompressionMiddleware, parse_accept_encoding
+from negotiation import MsgpackRoute, NegotiatedResponse
+from profiling import ProfilingMiddleware
+from warmup import Warmup
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+app_config = load_config('.env')
+
 models.Base.metadata.create_all(bind=engine)
-app = FastAPI()
-api_router = APIRouter(prefix="/api/v1")
+cache.configure(app_config.cache, engine, sessions=SessionLocal)
+
+
+def load_change_data(entity: str, entity_id: UUID, menu_id: UUID):
+    with SessionLocal() as db:
+        return crud.get_change_data(db, entity, entity_id, menu_id)
+
+
+events.configure(app_config.events, engine, load=load_change_data)
+
+
+def render_catalogue() -> bytes:
+    with SessionLocal() as db:
+        return crud.render_catalogue(db)
+
+
+def catalogue_watermark() -> int:
+    with SessionLocal() as db:
+        return crud.get_change_watermark(db)
+
+
+snapshot.configure(app_config.snapshot, render_catalogue, catalogue_watermark)
+warmup = Warmup(
+    engine,
+    SessionLocal,
+    connections=app_config.warmup.connections,
+    raiseload=app_config.orm.raiseload,
+    retry_interval=app_config.warmup.retry_interval,
+    max_retry_interval=app_config.warmup.max_retry_interval,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Прогрев идет в фоне: процесс сразу жив, а готов после прогрева пула и запросов
+    if app_config.warmup.enabled:
+        warmup.start()
+    else:
+        warmup.ready.set()
+    # Снимок проверяется при запуске: БД могла измениться, пока процесс не работал.
+    # Пересоберет его только первый процесс, остальные увидят актуальную отметку
+    if snapshot.writer is not None:
+        snapshot.writer.schedule()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+if app_config.compression.enabled:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=app_config.compression.minimum_size,
+        gzip_level=app_config.compression.gzip_level,
+        brotli_quality=app_config.compression.brotli_quality,
+    )
+if app_config.profiling.enabled and app_config.profiling.secret:
+    app.add_middleware(
+        ProfilingMiddleware,
+        engine=engine,
+        secret=app_config.profiling.secret,
+        output_dir=app_config.profiling.output_dir,
+        interval=app_config.profiling.interval,
+    )
+admission = AdmissionController(
+    capacity=app_config.pool.size + app_config.pool.max_overflow,
+    max_queue=app_config.admission.max_queue,
+    max_wait=app_config.admission.max_wait,
+    retry_after=app_config.admission.retry_after,
+    enabled=app_config.admission.enabled,
+)
+read_slot = Depends(admission.slot(READ))
+write_slot = Depends(admission.slot(WRITE))
+# Тяжелые чтения (поиск по списку, лента изменений) пропускают вперед точечные чтения и записи
+# и при перегрузке отбрасываются первыми
+bulk_slot = Depends(admission.slot(BULK))
+
+# Одинаковые одновременные чтения выполняют один запрос к БД на процесс
+coalescer = SingleFlight(enabled=app_config.coalescing.enabled)
+
+
+def create_dishes(requests):
+    with SessionLocal(expire_on_commit=False) as db:
+        return crud.create_dishes(db, requests)
+
+
+def parse_fields(fields: Optional[str], allowed: tuple) -> tuple:
+    """
+    Разбирает параметр fields=id,title в кортеж полей в порядке схемы.
+
+    Args:
+    fields (Optional[str]): Значение параметра; без него выбираются все поля.
+    allowed (tuple): Допустимые поля ответа.
+
+    Returns:
+    tuple: Запрошенные поля в порядке allowed. Пустой список или неизвестное поле дают 400.
+    """
+    if fields is None:
+        return allowed
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    if not requested:
+        raise HTTPException(status_code=400, detail="fields must not be empty")
+    unknown = requested - set(allowed)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown fields: {', '.join(sorted(unknown))}; "
+                                                    f"allowed: {', '.join(allowed)}")
+    return tuple(field for field in allowed if field in requested)
+
+
+def sparse_response(rows, fields: tuple, allowed: tuple):
+    # Полный набор полей проверяется response_model, выборочный отдается как есть
+    if fields == allowed:
+        return rows
+    return NegotiatedResponse(jsonable_encoder([dict(row) for row in rows]))
+
+
+FIELDS_QUERY = Query(None, description="Поля ответа через запятую, например id,title")
+
+
+# Одновременные создания блюд фиксируются пачками: один INSERT и один коммит на пачку
+dish_batcher = None
+if app_config.coalescing.write_batching:
+    dish_batcher = WriteBatcher(
+        create_dishes,
+        window=app_config.coalescing.write_window_ms / 1000,
+        max_batch=app_config.coalescing.write_max_batch,
+    )
+
+# Ответы в JSON или MessagePack по Accept, тела запросов - по Content-Type
+api_router = APIRouter(prefix="/api/v1", route_class=MsgpackRoute, default_response_class=NegotiatedResponse)
 app.include_router(api_router)
 
 
-def get_db():
-    db = SessionLocal()
+def parse_ids(values: List[str]) -> List[UUID]:
+    """
+    Разбирает ids=a,b&ids=c в список UUID в порядке запроса.
+
+    Args:
+    values (List[str]): Значения параметра ids, каждое - один или несколько UUID через запятую.
+
+    Returns:
+    List[UUID]: Идентификаторы. Не UUID или пустой либо слишком длинный список дают 422.
+    """
     try:
-        yield db
-    finally:
-        db.close()
+        ids = [UUID(value) for item in values for value in item.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids must be UUIDs")
+    if not 0 < len(ids) <= schemas.BATCH_MAX_IDS:
+        raise HTTPException(status_code=422, detail=f"ids must contain from 1 to {schemas.BATCH_MAX_IDS} values")
+    return ids
+
+
+IDS_QUERY = Query(..., description="UUID через запятую; для длинных списков есть POST с телом {\"ids\": [...]}")
+
+
+def version_etag(version: int) -> str:
+    """
+    ETag строки меню, подменю или блюда - ее версия. Передается обратно в If-Match при записи.
+    """
+    return f'"{version}"'
+
+
+def parse_if_match(if_match: Optional[str]) -> Optional[tuple]:
+    """
+    Разбирает If-Match в версии, при которых запись допустима.
+
+    Args:
+    if_match (Optional[str]): Значение заголовка.
+
+    Returns:
+    Optional[tuple]: None без заголовка и для "*", иначе версии из сильных ETag. Если ни один
+    ETag не может совпасть (слабый или не выданный этим API), возникает 412.
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    versions = tuple(
+        int(tag[1:-1]) for tag in (tag.strip() for tag in if_match.split(","))
+        if len(tag) > 2 and tag[0] == tag[-1] == '"' and tag[1:-1].isdigit()
+    )
+    if not versions:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="version mismatch")
+    return versions
+
+
+def version_conflict(error: crud.VersionConflictError) -> HTTPException:
+    # Клиент получает текущую версию, чтобы перечитать строку и повторить запись
+    return HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="version mismatch",
+                         headers={"ETag": version_etag(error.version)})
+
+
+IF_MATCH_HEADER = Header(None, description="ETag из ответа GET; запись с другой версией строки дает 412")
+
+
+# BATCH
+# Маршруты /batch объявлены раньше /menus/{menu_id}, иначе "batch" попал бы в menu_id
+@api_router.get("/menus/batch", response_model=List[schemas.MenuBatchItem], dependencies=[bulk_slot])
+def read_menus_batch(ids: List[str] = IDS_QUERY, db: Session = Depends(get_db)):
+    """
+    Получает меню по списку UUID одним запросом к БД.
+
+    Returns:
+    List[schemas.MenuBatchItem]: По элементу на каждый UUID в порядке запроса; found=false
+    и data=null для отсутствующих.
+    """
+    return crud.get_menus_by_ids(db, parse_ids(ids))
+
+
+@api_router.post("/menus/batch", response_model=List[schemas.MenuBatchItem], dependencies=[bulk_slot])
+def lookup_menus_batch(body: schemas.BatchIds, db: Session = Depends(get_db)):
+    """
+    То же, что GET /menus/batch, для списков, не помещающихся в URL.
+    """
+    return crud.get_menus_by_ids(db, body.ids)
+
+
+@api_router.get("/submenus/batch", response_model=List[schemas.SubMenuBatchItem], dependencies=[bulk_slot])
+def read_submenus_batch(ids: List[str] = IDS_QUERY, db: Session = Depends(get_db)):
+    """
+    Получает подменю по списку UUID одним запросом к БД, без указания меню.
+
+    Returns:
+    List[schemas.SubMenuBatchItem]: По элементу на каждый UUID в порядке запроса.
+    """
+    return crud.get_submenus_by_ids(db, parse_ids(ids))
+
+
+@api_router.post("/submenus/batch", response_model=List[schemas.SubMenuBatchItem], dependencies=[bulk_slot])
+def lookup_submenus_batch(body: schemas.BatchIds, db: Session = Depends(get_db)):
+    """
+    То же, что GET /submenus/batch, для длинных списков.
+    """
+    return crud.get_submenus_by_ids(db, body.ids)
+
+
+@api_router.get("/dishes/batch", response_model=List[schemas.DishBatchItem], dependencies=[bulk_slot])
+def read_dishes_batch(ids: List[str] = IDS_QUERY, db: Session = Depends(get_db)):
+    """
+    Получает блюда по списку UUID одним запросом к БД, без указания меню и подменю.
+
+    Returns:
+    List[schemas.DishBatchItem]: По элементу на каждый UUID в порядке запроса.
+    """
+    return crud.get_dishes_by_ids(db, parse_ids(ids))
+
+
+@api_router.post("/dishes/batch", response_model=List[schemas.DishBatchItem], dependencies=[bulk_slot])
+def lookup_dishes_batch(body: schemas.BatchIds, db: Session = Depends(get_db)):
+    """
+    То же, что GET /dishes/batch, для длинных списков, например всей корзины заказа.
+    """
+    return crud.get_dishes_by_ids(db, body.ids)
 
 
 # MENU
-@api_router.get("/menus/{menu_id}/details", response_model=schemas.MenuDetails)
+@api_router.get("/menus/{menu_id}/details", response_model=schemas.MenuDetails, dependencies=[read_slot])
 def read_menu_details(menu_id: UUID, db: Session = Depends(get_db)):
-    menu_details = crud.get_menu_with_counts(db, menu_id)
+    menu_details = coalescer.do(("read_menu_details", menu_id), lambda: crud.get_menu_with_counts(db, menu_id))
     if menu_details is None:
         raise HTTPException(status_code=404, detail="Menu not found")
     return menu_details
 
 
-@api_router.get("/menus/{menu_id}", response_model=schemas.Menu)
-def read_menu(menu_id: UUID, db: Session = Depends(get_db)):
+@api_router.get("/menus/{menu_id}", response_model=schemas.Menu, dependencies=[read_slot])
+def read_menu(menu_id: UUID, response: Response, db: Session = Depends(get_db)):
     """
     Получает информацию о конкретном меню по его UUID.
 
     Args:
     menu_id (UUID): UUID меню.
+    response (Response): Ответ, в который добавляется ETag с версией меню.
     db (Session): Сессия базы данных.
 
     Returns:
     schemas.Menu: Данные о меню, если оно найдено. Иначе возникает исключение HTTPException.
     """
-    db_menu = crud.get_menu(db, menu_id=menu_id)
+    db_menu = coalescer.do(("read_menu", menu_id), lambda: crud.get_menu(db, menu_id=menu_id))
     if db_menu is None:
         raise HTTPException(status_code=404, detail="menu not found")
+    response.headers["ETag"] = version_etag(db_menu["version"])
     return db_menu
 
 
-@api_router.get("/menus", response_model=List[schemas.Menu])
-def read_menus(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+@api_router.get("/menus", response_model=List[schemas.Menu], dependencies=[read_slot])
+def read_menus(skip: int = 0, limit: int = 100, fields: Optional[str] = FIELDS_QUERY,
+               db: Session = Depends(get_db)):
     """
     Получает список меню, с опциональной пагинацией.
 
     Args:
     skip (int): Количество пропускаемых записей для пагинации.
     limit (int): Максимальное количество записей, возвращаемых запросом.
+    fields (Optional[str]): Поля ответа через запятую; счетчики считаются, только если запрошены.
     db (Session): Сессия базы данных.
 
     Returns:
-    List[schemas.Menu]: Список объектов меню.
+    List[schemas.Menu]: Список объектов меню, при fields - только с запрошенными полями.
     """
-    menus = crud.get_menus(db, skip=skip, limit=limit)
-    return [schemas.Menu(
-        id=menu.id,
-        title=menu.title,
-        description=menu.description,
-        submenus_count=submenus_count,
-        dishes_count=dishes_count
-    ) for menu, submenus_count, dishes_count in menus]
+    selected = parse_fields(fields, crud.MENU_FIELDS)
+    menus = coalescer.do(("read_menus", skip, limit, selected),
+                         lambda: crud.get_menus(db, skip=skip, limit=limit, fields=selected))
+    return sparse_response(menus, selected, crud.MENU_FIELDS)
 
 
-@api_router.post("/menus", response_model=schemas.Menu, status_code=status.HTTP_201_CREATED)
+@api_router.post("/menus", response_model=schemas.Menu, status_code=status.HTTP_201_CREATED, dependencies=[write_slot])
 def create_menu(menu: schemas.MenuCreate, db: Session = Depends(get_db)):
     """
     Создает новое меню.
@@ -96,26 +348,34 @@ def create_menu(menu: schemas.MenuCreate, db: Session = Depends(get_db)):
     return new_menu
 
 
-@api_router.patch("/menus/{menu_id}", response_model=schemas.Menu)
-def update_menu(menu_id: UUID, menu_data: schemas.MenuUpdate, db: Session = Depends(get_db)):
+@api_router.patch("/menus/{menu_id}", response_model=schemas.Menu, dependencies=[write_slot])
+def update_menu(menu_id: UUID, menu_data: schemas.MenuUpdate, response: Response,
+                if_match: Optional[str] = IF_MATCH_HEADER, db: Session = Depends(get_db)):
     """
     Обновляет информацию о меню по его UUID.
 
     Args:
     menu_id (UUID): UUID меню, которое необходимо обновить.
     menu_data (schemas.MenuUpdate): Обновленные данные для меню.
+    response (Response): Ответ, в который добавляется ETag с новой версией меню.
+    if_match (Optional[str]): ETag версии, которую клиент изменяет.
     db (Session): Сессия базы данных.
 
     Returns:
-    schemas.Menu: Обновленные данные о меню, если оно найдено. Иначе возникает исключение HTTPException.
+    schemas.Menu: Обновленные данные о меню, если оно найдено. Иначе возникает исключение HTTPException:
+    404, если меню нет, и 412, если меню изменено после чтения клиентом.
     """
-    db_menu = crud.update_menu(db, menu_id=menu_id, menu_data=menu_data)
+    try:
+        db_menu = crud.update_menu(db, menu_id=menu_id, menu_data=menu_data, versions=parse_if_match(if_match))
+    except crud.VersionConflictError as error:
+        raise version_conflict(error)
     if db_menu is None:
         raise HTTPException(status_code=404, detail="menu not found")
+    response.headers["ETag"] = version_etag(db_menu.version)
     return db_menu
 
 
-@api_router.delete("/menus/{menu_id}")
+@api_router.delete("/menus/{menu_id}", dependencies=[write_slot])
 def delete_menu(menu_id: UUID, db: Session = Depends(get_db)):
     """
     Удаляет меню по его UUID.
@@ -132,28 +392,30 @@ def delete_menu(menu_id: UUID, db: Session = Depends(get_db)):
     return {"message": "Menu deleted"}
 
 
-
 # SUBMENU
-@api_router.get("/menus/{menu_id}/submenus/{submenu_id}", response_model=schemas.SubMenu)
-def read_specific_submenu(menu_id: UUID, submenu_id: UUID, db: Session = Depends(get_db)):
+@api_router.get("/menus/{menu_id}/submenus/{submenu_id}", response_model=schemas.SubMenu, dependencies=[read_slot])
+def read_specific_submenu(menu_id: UUID, submenu_id: UUID, response: Response, db: Session = Depends(get_db)):
     """
     Получает информацию о конкретном подменю в рамках указанного меню.
 
     Args:
     menu_id (UUID): UUID родительского меню.
     submenu_id (UUID): UUID подменю.
+    response (Response): Ответ, в который добавляется ETag с версией подменю.
     db (Session): Сессия базы данных.
 
     Returns:
     schemas.SubMenu: Данные о подменю, если оно найдено. Иначе возникает исключение HTTPException.
     """
-    submenu = crud.get_specific_submenu(db, menu_id=menu_id, submenu_id=submenu_id)
+    submenu = coalescer.do(("read_specific_submenu", menu_id, submenu_id),
+                           lambda: crud.get_specific_submenu(db, menu_id=menu_id, submenu_id=submenu_id))
     if submenu is None:
         raise HTTPException(status_code=404, detail="submenu not found")
+    response.headers["ETag"] = version_etag(submenu["version"])
     return submenu
 
 
-@api_router.get("/menus/{menu_id}/submenus", response_model=List[schemas.SubMenu])
+@api_router.get("/menus/{menu_id}/submenus", response_model=List[schemas.SubMenu], dependencies=[read_slot])
 def read_submenus(menu_id: UUID, db: Session = Depends(get_db)):
     """
     Получает список подменю в рамках указанного меню.
@@ -165,14 +427,15 @@ def read_submenus(menu_id: UUID, db: Session = Depends(get_db)):
     Returns:
     List[schemas.SubMenu]: Список подменю.
     """
-    submenus = crud.get_submenus_by_menu(db, menu_id=menu_id)
+    submenus = coalescer.do(("read_submenus", menu_id), lambda: crud.get_submenus_by_menu(db, menu_id=menu_id))
     if submenus is None:
         raise HTTPException(status_code=404, detail="menu not found")
     return submenus
 
 
-@api_router.post("/menus/{menu_id}/submenus", response_model=schemas.SubMenu, status_code=status.HTTP_201_CREATED)
-def create_submenu_for_menu(menu_id: UUID, submenu: schemas.SubMenuCreate, db: Session = Depends(database.get_db)):
+@api_router.post("/menus/{menu_id}/submenus", response_model=schemas.SubMenu, status_code=status.HTTP_201_CREATED,
+                 dependencies=[write_slot])
+def create_submenu_for_menu(menu_id: UUID, submenu: schemas.SubMenuCreate, db: Session = Depends(get_db)):
     """
     Создает новое подменю в рамках указанного меню.
 
@@ -189,8 +452,9 @@ def create_submenu_for_menu(menu_id: UUID, submenu: schemas.SubMenuCreate, db: S
     return crud.create_submenu(db=db, submenu=submenu, menu_id=menu_id)
 
 
-@api_router.patch("/menus/{menu_id}/submenus/{submenu_id}", response_model=schemas.SubMenu)
-def update_submenu(menu_id: UUID, submenu_id: UUID, submenu_data: schemas.SubMenuUpdate, db: Session = Depends(get_db)):
+@api_router.patch("/menus/{menu_id}/submenus/{submenu_id}", response_model=schemas.SubMenu, dependencies=[write_slot])
+def update_submenu(menu_id: UUID, submenu_id: UUID, submenu_data: schemas.SubMenuUpdate, response: Response,
+                   if_match: Optional[str] = IF_MATCH_HEADER, db: Session = Depends(get_db)):
     """
     Обновляет подменю в рамках указанного меню.
 
@@ -198,18 +462,26 @@ def update_submenu(menu_id: UUID, submenu_id: UUID, submenu_data: schemas.SubMen
     menu_id (UUID): UUID родительского меню.
     submenu_id (UUID): UUID подменю для обновления.
     submenu_data (schemas.SubMenuUpdate): Обновленные данные для подменю.
+    response (Response): Ответ, в который добавляется ETag с новой версией подменю.
+    if_match (Optional[str]): ETag версии, которую клиент изменяет.
     db (Session): Сессия базы данных.
 
     Returns:
-    schemas.SubMenu: Обновленные данные о подменю, если оно найдено. Иначе возникает исключение HTTPException.
+    schemas.SubMenu: Обновленные данные о подменю, если оно найдено. Иначе возникает исключение HTTPException:
+    404, если подменю нет, и 412, если подменю изменено после чтения клиентом.
     """
-    updated_submenu = crud.update_submenu(db, menu_id=menu_id, submenu_id=submenu_id, submenu=submenu_data)
+    try:
+        updated_submenu = crud.update_submenu(db, menu_id=menu_id, submenu_id=submenu_id, submenu=submenu_data,
+                                              versions=parse_if_match(if_match))
+    except crud.VersionConflictError as error:
+        raise version_conflict(error)
     if updated_submenu is None:
         raise HTTPException(status_code=404, detail="submenu not found")
+    response.headers["ETag"] = version_etag(updated_submenu.version)
     return updated_submenu
 
 
-@api_router.delete("/menus/{menu_id}/submenus/{submenu_id}")
+@api_router.delete("/menus/{menu_id}/submenus/{submenu_id}", dependencies=[write_slot])
 def delete_submenu(menu_id: UUID, submenu_id: UUID, db: Session = Depends(get_db)):
     """
     Удаляет подменю по его UUID в рамках указанного меню.
@@ -227,26 +499,60 @@ def delete_submenu(menu_id: UUID, submenu_id: UUID, db: Session = Depends(get_db
     return {"message": "SubMenu deleted"}
 
 
+# EVENTS
+@api_router.get("/menus/{menu_id}/events")
+def menu_events(menu_id: UUID, request: Request):
+    """
+    Поток Server-Sent Events с изменениями подменю и блюд указанного меню.
+
+    Каждое событие содержит entity, op (create, update, delete), id и для записей seq и data.
+    Событие resync означает, что клиент не успевал читать поток и часть событий пропущена:
+    их нужно догнать через /changes с последней полученной отметкой.
+
+    Args:
+    menu_id (UUID): UUID меню.
+    request (Request): Запрос, по нему отслеживается отключение клиента.
+
+    Returns:
+    StreamingResponse: Бесконечный поток text/event-stream.
+    """
+    # Сессия закрывается до начала потока, чтобы долгие подписки не держали соединения пула
+    with SessionLocal() as db:
+        if crud.get_menu(db, menu_id=menu_id) is None:
+            raise HTTPException(status_code=404, detail="menu not found")
+    return StreamingResponse(
+        events.stream(menu_id, request, heartbeat=app_config.events.heartbeat),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # DISH
-@api_router.get("/menus/{menu_id}/submenus/{submenu_id}/dishes", response_model=List[schemas.Dish])
-def read_dishes(menu_id: UUID, submenu_id: UUID, db: Session = Depends(get_db)):
+@api_router.get("/menus/{menu_id}/submenus/{submenu_id}/dishes", response_model=List[schemas.Dish],
+                dependencies=[read_slot])
+def read_dishes(menu_id: UUID, submenu_id: UUID, fields: Optional[str] = FIELDS_QUERY,
+                db: Session = Depends(get_db)):
     """
     Получает список блюд в рамках указанного подменю и меню.
 
     Args:
     menu_id (UUID): UUID родительского меню.
     submenu_id (UUID): UUID подменю.
+    fields (Optional[str]): Поля ответа через запятую.
     db (Session): Сессия базы данных.
 
     Returns:
-    List[schemas.Dish]: Список блюд в подменю.
+    List[schemas.Dish]: Список блюд в подменю, при fields - только с запрошенными полями.
     """
-    dishes = crud.get_dishes_by_submenu(db, menu_id=menu_id, submenu_id=submenu_id)
-    return dishes
+    selected = parse_fields(fields, crud.DISH_FIELDS)
+    dishes = coalescer.do(("read_dishes", menu_id, submenu_id, selected),
+                          lambda: crud.get_dishes_by_submenu(db, menu_id=menu_id, submenu_id=submenu_id,
+                                                             fields=selected))
+    return sparse_response(dishes, selected, crud.DISH_FIELDS)
 
 
 @api_router.post("/menus/{menu_id}/submenus/{submenu_id}/dishes", response_model=schemas.Dish,
-                 status_code=status.HTTP_201_CREATED)
+                 status_code=status.HTTP_201_CREATED, dependencies=[write_slot])
 def create_dish_for_submenu(menu_id: UUID, submenu_id: UUID, dish: schemas.DishCreate, db: Session = Depends(get_db)):
     """
     Создает новое блюдо в рамках указанного подменю и меню.
@@ -262,11 +568,17 @@ def create_dish_for_submenu(menu_id: UUID, submenu_id: UUID, dish: schemas.DishC
     """
     if not crud.get_specific_submenu(db, menu_id=menu_id, submenu_id=submenu_id):
         raise HTTPException(status_code=404, detail="submenu not found")
-    return crud.create_dish(db=db, dish=dish, submenu_id=submenu_id)
+    if dish_batcher is not None:
+        # Соединение запроса возвращается в пул до ожидания пачки, иначе ожидающие запросы
+        # займут весь пул и запись пачки не получит соединения
+        db.rollback()
+        return dish_batcher.submit((dish, submenu_id, menu_id))
+    return crud.create_dish(db=db, dish=dish, submenu_id=submenu_id, menu_id=menu_id)
 
 
-@api_router.get("/menus/{menu_id}/submenus/{submenu_id}/dishes/{dish_id}", response_model=schemas.Dish)
-def read_dish(menu_id: UUID, submenu_id: UUID, dish_id: UUID, db: Session = Depends(get_db)):
+@api_router.get("/menus/{menu_id}/submenus/{submenu_id}/dishes/{dish_id}", response_model=schemas.Dish,
+                dependencies=[read_slot])
+def read_dish(menu_id: UUID, submenu_id: UUID, dish_id: UUID, response: Response, db: Session = Depends(get_db)):
     """
     Получает информацию о конкретном блюде в рамках указанного подменю и меню.
 
@@ -274,20 +586,24 @@ def read_dish(menu_id: UUID, submenu_id: UUID, dish_id: UUID, db: Session = Depe
     menu_id (UUID): UUID родительского меню.
     submenu_id (UUID): UUID подменю.
     dish_id (UUID): UUID блюда.
+    response (Response): Ответ, в который добавляется ETag с версией блюда.
     db (Session): Сессия базы данных.
 
     Returns:
     schemas.Dish: Информация о блюде, если оно найдено. Иначе возникает исключение HTTPException.
     """
-    db_dish = crud.get_specific_dish(db, menu_id=menu_id, submenu_id=submenu_id, dish_id=dish_id)
+    db_dish = coalescer.do(("read_dish", menu_id, submenu_id, dish_id),
+                           lambda: crud.get_specific_dish(db, menu_id=menu_id, submenu_id=submenu_id, dish_id=dish_id))
     if db_dish is None:
         raise HTTPException(status_code=404, detail="dish not found")
+    response.headers["ETag"] = version_etag(db_dish["version"])
     return db_dish
 
 
-@api_router.patch("/menus/{menu_id}/submenus/{submenu_id}/dishes/{dish_id}", response_model=schemas.Dish)
+@api_router.patch("/menus/{menu_id}/submenus/{submenu_id}/dishes/{dish_id}", response_model=schemas.Dish,
+                  dependencies=[write_slot])
 def update_dish(menu_id: UUID, submenu_id: UUID, dish_id: UUID, dish_update: schemas.DishUpdate,
-                db: Session = Depends(get_db)):
+                response: Response, if_match: Optional[str] = IF_MATCH_HEADER, db: Session = Depends(get_db)):
     """
     Обновляет информацию о блюде в рамках указанного подменю и меню.
 
@@ -296,20 +612,29 @@ def update_dish(menu_id: UUID, submenu_id: UUID, dish_id: UUID, dish_update: sch
     submenu_id (UUID): UUID подменю.
     dish_id (UUID): UUID блюда, которое нужно обновить.
     dish_update (schemas.DishUpdate): Обновленные данные для блюда.
+    response (Response): Ответ, в который добавляется ETag с новой версией блюда.
+    if_match (Optional[str]): ETag версии, которую клиент изменяет.
     db (Session): Сессия базы данных.
 
     Returns:
-    schemas.Dish: Обновленные данные о блюде, если оно найдено. Иначе возникает исключение HTTPException.
+    schemas.Dish: Обновленные данные о блюде, если оно найдено. Иначе возникает исключение HTTPException:
+    404, если блюда нет, и 412, если блюдо изменено после чтения клиентом.
     """
     db_dish = crud.get_specific_dish(db, menu_id=menu_id, submenu_id=submenu_id, dish_id=dish_id)
     if db_dish is None:
         raise HTTPException(status_code=404, detail="dish not found")
 
-    updated_dish = crud.update_dish(db, dish_id, dish_update)
+    try:
+        updated_dish = crud.update_dish(db, dish_id, dish_update, menu_id=menu_id, versions=parse_if_match(if_match))
+    except crud.VersionConflictError as error:
+        raise version_conflict(error)
+    if updated_dish is None:
+        raise HTTPException(status_code=404, detail="dish not found")
+    response.headers["ETag"] = version_etag(updated_dish.version)
     return updated_dish
 
 
-@api_router.delete("/menus/{menu_id}/submenus/{submenu_id}/dishes/{dish_id}")
+@api_router.delete("/menus/{menu_id}/submenus/{submenu_id}/dishes/{dish_id}", dependencies=[write_slot])
 def delete_dish(menu_id: UUID, submenu_id: UUID, dish_id: UUID, db: Session = Depends(get_db)):
     """
     Удаляет блюдо по его UUID в рамках указанного подменю и меню.
@@ -323,9 +648,98 @@ def delete_dish(menu_id: UUID, submenu_id: UUID, dish_id: UUID, db: Session = De
     Returns:
     dict: Сообщение об успешном удалении, если блюдо найдено. Иначе возникает исключение HTTPException.
     """
-    if not crud.delete_dish(db, dish_id=dish_id):
+    if not crud.delete_dish(db, dish_id=dish_id, menu_id=menu_id):
         raise HTTPException(status_code=404, detail="dish not found")
     return {"message": "Dish deleted successfully"}
 
 
+# SNAPSHOT
+# Обычная функция, а не корутина: stat и mmap файла снимка выполняются в пуле потоков, а не в цикле событий
+@api_router.get("/snapshot", response_model=schemas.Catalogue)
+def read_snapshot(request: Request):
+    """
+    Отдает весь каталог из снимка на диске без обращения к БД и без сериализации.
+    Клиентам с Accept-Encoding: gzip отдается заранее сжатый вариант.
+
+    Args:
+    request (Request): Запрос; учитываются Accept-Encoding и If-None-Match.
+
+    Returns:
+    schemas.Catalogue: Байты снимка; 304, если ETag совпал, 404 без режима снимка
+    и 503, пока первый снимок не собран.
+    """
+    if snapshot.writer is None:
+        raise HTTPException(status_code=404, detail="snapshot mode is disabled")
+    encoding = "gzip" if "gzip" in parse_accept_encoding(request.headers.get("accept-encoding", "")) else None
+    loaded = snapshot.files[encoding].load()
+    if loaded is None:
+        raise HTTPException(status_code=503, detail="snapshot is not built yet", headers={"Retry-After": "1"})
+    mapped, etag = loaded
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    if etag in (tag.strip() for tag in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return snapshot.MappedResponse(mapped, headers=headers)
+
+
+# CHANGES
+@api_router.get("/changes", response_model=schemas.ChangesPage, dependencies=[bulk_slot])
+def read_changes(since: int = Query(0, ge=0), limit: int = Query(500, ge=1, le=5000), db: Session = Depends(get_db)):
+    """
+    Получает изменения меню, подменю и блюд, сделанные после отметки since.
+
+    Args:
+    since (int): Отметка change_seq, полученная клиентом в прошлый раз (next_since).
+    limit (int): Максимальное количество изменений на странице.
+    db (Session): Сессия базы данных.
+
+    Returns:
+    schemas.ChangesPage: Созданные и обновленные строки (op="upsert") и удаления (op="delete")
+    по возрастанию change_seq. Если has_more, следующую страницу нужно запросить с since=next_since.
+    """
+    return coalescer.do(("read_changes", since, limit), lambda: crud.get_changes(db, since=since, limit=limit))
+
+
+# HEALTH
+@app.get("/health/live")
+def health_live():
+    """
+    Проверка живости: процесс запущен и обрабатывает запросы. БД не проверяется.
+    """
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+def health_ready():
+    """
+    Проверка готовности принимать трафик: 503, пока прогрев пула и запросов не прошел,
+    в том числе пока он повторяется после ошибки (status="failed").
+
+    Returns:
+    dict: Статус прогрева, длительность последней попытки, число попыток и ошибка последней
+    неудачной попытки.
+    """
+    if not warmup.ready.is_set():
+        return JSONResponse(warmup.status(), status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return warmup.status()
+
+
+# METRICS
+@app.get("/metrics/cache")
+def cache_metrics():
+    """
+    Метрики кэша чтений этого воркера: сколько раз отдавались записи, которые пора обновить,
+    сколько фоновых обновлений прошло и сколько завершилось ошибкой, отставание обновлений
+    от назначенного момента в секундах (последнее, наибольшее и сумма).
+
+    Returns:
+    dict: Метрики кэша или 404, если кэш выключен.
+    """
+    metrics = cache.metrics()
+    if metrics is None:
+        raise HTTPException(status_code=404, detail="cache disabled")
+    return metrics
+
+
 app.include_router(api_router)
@@ -1,34 +1,237 @@
+import sqlite3
+import threading
 import uuid
 
-from sqlalchemy import Column, String
+from sqlalchemy import BigInteger, Column, DateTime, Integer, Sequence, String, Uuid
 from sqlalchemy import ForeignKey
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import event, insert, literal_column, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import relationship
+from sqlalchemy.pool import Pool
+from sqlalchemy.sql.functions import FunctionElement
 
 from database import Base
 
+# Общая для всех сущностей монотонная последовательность изменений.
+# Каждая вставка и обновление получает новое значение, удаление оставляет надгробие с ним же.
+change_sequence = Sequence('catalogue_change_seq', metadata=Base.metadata)
+
+
+class next_change_seq(FunctionElement):
+    """
+    Следующее значение последовательности изменений.
+
+    В Postgres это nextval последовательности, в SQLite, где последовательностей нет,
+    - функция nextval, которую регистрирует _register_sqlite_sequence.
+    """
+    type = BigInteger()
+    name = "next_change_seq"
+    inherit_cache = True
+
+
+@compiles(next_change_seq)
+def _compile_next_change_seq(element, compiler, **kw):
+    return compiler.process(change_sequence.next_value(), **kw)
+
+
+@compiles(next_change_seq, "sqlite")
+def _compile_next_change_seq_sqlite(element, compiler, **kw):
+    return f"nextval('{change_sequence.name}')"
+
+
+# Ключ advisory-блокировки, которая упорядочивает отметки изменений по фиксации.
+# nextval выдает отметку при выполнении запроса, а не при COMMIT: транзакция с меньшей
+# отметкой может зафиксироваться позже транзакции с большей, и читатель ленты, увидевший
+# только вторую, пропустил бы первую. Поэтому каждая пишущая транзакция в Postgres берет
+# блокировку в разделяемом режиме перед первой записью и держит ее до конца транзакции
+# (писатели друг другу не мешают), а читатель ленты на мгновение берет ее монопольно
+# и получает границу, ниже которой незафиксированных отметок уже не будет.
+CHANGE_FENCE_KEY = 0x63_68_61_6E
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _enter_change_fence(conn, cursor, statement, parameters, context, executemany):
+    if conn.dialect.name != "postgresql" or context is None or conn.info.get("change_fence"):
+        return
+    if context.isinsert or context.isupdate or context.isdelete:
+        cursor.execute("SELECT pg_advisory_xact_lock_shared(%s)", (CHANGE_FENCE_KEY,))
+        conn.info["change_fence"] = True
+
+
+@event.listens_for(Engine, "commit")
+@event.listens_for(Engine, "rollback")
+def _leave_change_fence(conn):
+    conn.info.pop("change_fence", None)
+
+
+@event.listens_for(Pool, "reset")
+def _reset_change_fence(dbapi_connection, connection_record, reset_state):
+    connection_record.info.pop("change_fence", None)
+
+
+def committed_change_seq(connection) -> int | None:
+    """
+    Граница ленты изменений: все отметки не больше нее принадлежат завершенным транзакциям,
+    и новых отметок не больше нее уже не появится.
+
+    В Postgres функция дожидается окончания транзакций, которые уже пишут, и читает последнее
+    выданное значение последовательности. В SQLite запись и так выполняется одной транзакцией
+    за раз, и отметки фиксируются в порядке выдачи, поэтому граница не нужна.
+
+    Args:
+    connection (Connection): Соединение с базой данных.
+
+    Returns:
+    int | None: Наибольшая безопасная отметка или None, если граница не нужна.
+    """
+    if connection.dialect.name != "postgresql":
+        return None
+    connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": CHANGE_FENCE_KEY})
+    try:
+        return connection.scalar(text(f"SELECT last_value FROM {change_sequence.name}"))
+    finally:
+        connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": CHANGE_FENCE_KEY})
+
+
+# Версия строки для оптимистичной блокировки: любое обновление, через ORM или Core, увеличивает
+# ее на 1. Запись с If-Match добавляет к UPDATE условие на версию вместо блокировки строки.
+next_version = literal_column("version", Integer) + 1
+
 
 class Menu(Base):
     __tablename__ = 'menus'
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
     title = Column(String)
     description = Column(String)
+    change_seq = Column(BigInteger, default=next_change_seq(), onupdate=next_change_seq(), index=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1", onupdate=next_version)
     submenus = relationship("SubMenu", cascade="all, delete-orphan")
 
 
 class SubMenu(Base):
     __tablename__ = 'submenus'
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4, unique=True, nullable=False)
     title = Column(String, index=True)
     description = Column(String)
-    menu_id = Column(UUID, ForeignKey('menus.id'))
-    dishes = relationship("Dish", cascade="all, delete-orphan")
+    menu_id = Column(Uuid, ForeignKey('menus.id'), index=True)
+    change_seq = Column(BigInteger, default=next_change_seq(), onupdate=next_change_seq(), index=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1", onupdate=next_version)
+    # Связь идет и по menu_id, чтобы загрузка и каскадное удаление блюд несли ключ секционирования
+    dishes = relationship(
+        "Dish",
+        primaryjoin="and_(SubMenu.id == foreign(Dish.submenu_id), SubMenu.menu_id == foreign(Dish.menu_id))",
+        cascade="all, delete-orphan",
+    )
+
+
+# Число секций таблицы блюд в Postgres. Менять только вместе с миграцией, которая
+# пересоздает секции.
+DISH_PARTITIONS = 16
 
 
 class Dish(Base):
+    """
+    Блюдо. В Postgres таблица секционирована хешем по menu_id (ключ копируется из подменю),
+    поэтому menu_id входит в первичный ключ и передается во все запросы к блюдам: планировщик
+    отсекает лишние секции, а удаление меню и обслуживание затрагивают одну секцию.
+    """
     __tablename__ = 'dishes'
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    __table_args__ = {'postgresql_partition_by': 'HASH (menu_id)'}
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    menu_id = Column(Uuid, ForeignKey('menus.id'), primary_key=True, index=True)
     title = Column(String, index=True)
     description = Column(String)
     price = Column(String)
-    submenu_id = Column(UUID, ForeignKey('submenus.id'))
+    submenu_id = Column(Uuid, ForeignKey('submenus.id'), index=True)
+    change_seq = Column(BigInteger, default=next_change_seq(), onupdate=next_change_seq(), index=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1", onupdate=next_version)
+
+
+@event.listens_for(Dish.__table__, "after_create")
+def _create_dish_partitions(target, connection, **kw):
+    """
+    Создает секции таблицы блюд; в остальных БД таблица остается обычной.
+    """
+    if connection.dialect.name != "postgresql":
+        return
+    for remainder in range(DISH_PARTITIONS):
+        connection.execute(text(
+            f"CREATE TABLE {target.name}_p{remainder} PARTITION OF {target.name} "
+            f"FOR VALUES WITH (MODULUS {DISH_PARTITIONS}, REMAINDER {remainder})"
+        ))
+
+
+@event.listens_for(Dish, "before_insert")
+def _fill_dish_menu_id(mapper, connection, target):
+    """
+    Берет ключ секционирования из подменю, если блюдо создано без menu_id.
+    """
+    if target.menu_id is None:
+        target.menu_id = connection.scalar(select(SubMenu.menu_id).where(SubMenu.id == target.submenu_id))
+
+
+class Tombstone(Base):
+    __tablename__ = 'tombstones'
+    change_seq = Column(BigInteger, default=next_change_seq(), primary_key=True, autoincrement=False)
+    entity = Column(String, nullable=False)
+    entity_id = Column(Uuid, nullable=False)
+
+
+class SyncState(Base):
+    __tablename__ = 'sync_state'
+    source = Column(String, primary_key=True)
+    sha256 = Column(String, nullable=False)
+    synced_at = Column(DateTime, nullable=False)
+
+
+ENTITY_NAMES = {Menu: "menu", SubMenu: "submenu", Dish: "dish"}
+
+
+def _record_tombstone(mapper, connection, target):
+    """
+    Оставляет надгробие для удаленной строки, чтобы клиенты синхронизации узнали об удалении.
+    """
+    connection.execute(insert(Tombstone).values(entity=ENTITY_NAMES[mapper.class_], entity_id=target.id))
+
+
+for _model in ENTITY_NAMES:
+    event.listen(_model, "after_delete", _record_tombstone)
+
+
+class _ProcessSequence:
+    """
+    Заменитель последовательности для SQLite: счетчик в памяти процесса.
+
+    Начальное значение берется из наибольшей отметки в БД при подключении, поэтому
+    отметки остаются монотонными и для файловой БД, пока в нее пишет один процесс.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0
+
+    def seed(self, dbapi_connection) -> None:
+        for table in ("menus", "submenus", "dishes", "tombstones"):
+            try:
+                value = dbapi_connection.execute(f"SELECT MAX(change_seq) FROM {table}").fetchone()[0]
+            except sqlite3.OperationalError:
+                # Таблицы еще не созданы
+                continue
+            with self._lock:
+                self._value = max(self._value, value or 0)
+
+    def nextval(self, name: str) -> int:
+        with self._lock:
+            self._value += 1
+            return self._value
+
+
+_sqlite_sequence = _ProcessSequence()
+
+
+@event.listens_for(Engine, "connect")
+def _register_sqlite_sequence(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        _sqlite_sequence.seed(dbapi_connection)
+        dbapi_connection.create_function("nextval", 1, _sqlite_sequence.nextval)
@@ -0,0 +1,134 @@
+"""
+Выбор формата тела по заголовкам: JSON по умолчанию, MessagePack для клиентов, которые
+запрашивают его в Accept или присылают тело с Content-Type: application/msgpack.
+Схема данных одна и та же - ответ сериализуется по response_model и только затем кодируется.
+"""
+from contextvars import ContextVar
+
+from fastapi import HTTPException, Request, status
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+
+try:
+    import msgpack
+except ImportError:  # msgpack - необязательная зависимость, без нее остается только JSON
+    msgpack = None
+
+MSGPACK = "application/msgpack"
+MSGPACK_TYPES = (MSGPACK, "application/x-msgpack")
+JSON_TYPES = ("application/json",)
+WILDCARDS = ("application/*", "*/*")
+
+# Выбранный для текущего запроса формат ответа; выставляется маршрутом до вызова обработчика
+_wants_msgpack: ContextVar[bool] = ContextVar("wants_msgpack", default=False)
+
+
+def parse_accept(header: str) -> dict:
+    """
+    Разбирает заголовок Accept в словарь {тип: q}.
+
+    Args:
+    header (str): Значение заголовка Accept.
+
+    Returns:
+    dict: Типы с их весами. Типы с q=0 включаются, чтобы явный отказ можно было отличить
+    от отсутствия типа.
+    """
+    types = {}
+    for item in header.split(","):
+        media_type, *params = item.split(";")
+        media_type = media_type.strip().lower()
+        if not media_type:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        types[media_type] = max(quality, types.get(media_type, 0.0))
+    return types
+
+
+def prefers_msgpack(header: str) -> bool:
+    """
+    Решает, отвечать ли MessagePack. MessagePack выбирается, если его вес больше веса
+    application/json и не меньше веса шаблонов */*, application/*: явно названный тип
+    точнее шаблона, а при равенстве с application/json остается JSON.
+    """
+    if msgpack is None or not header:
+        return False
+    types = parse_accept(header)
+    weight = max((types.get(media_type, 0.0) for media_type in MSGPACK_TYPES), default=0.0)
+    if weight <= 0:
+        return False
+    json_weight = max((types.get(media_type, 0.0) for media_type in JSON_TYPES), default=0.0)
+    wildcard_weight = max((types.get(media_type, 0.0) for media_type in WILDCARDS), default=0.0)
+    return weight > json_weight and weight >= wildcard_weight
+
+
+def _is_msgpack_body(request: Request) -> bool:
+    content_type = request.headers.get("content-type", "")
+    return content_type.partition(";")[0].strip().lower() in MSGPACK_TYPES
+
+
+class NegotiatedResponse(JSONResponse):
+    """
+    Ответ в JSON или MessagePack в зависимости от Accept текущего запроса.
+    """
+
+    def __init__(self, content, *args, **kwargs):
+        self.msgpack = _wants_msgpack.get()
+        if self.msgpack:
+            self.media_type = MSGPACK
+        super().__init__(content, *args, **kwargs)
+        self.headers.append("Vary", "Accept")
+
+    def render(self, content) -> bytes:
+        if self.msgpack:
+            return msgpack.packb(content, use_bin_type=True)
+        return super().render(content)
+
+
+class MsgpackRequest(Request):
+    """
+    Запрос с телом MessagePack. FastAPI разбирает тело как JSON только при JSON-типе
+    в Content-Type, поэтому тип в scope подменяется, а json() декодирует MessagePack.
+    """
+
+    def __init__(self, scope, receive):
+        headers = [
+            (name, b"application/json" if name == b"content-type" else value)
+            for name, value in scope["headers"]
+        ]
+        super().__init__({**scope, "headers": headers}, receive)
+
+    async def json(self):
+        if not hasattr(self, "_json"):
+            self._json = msgpack.unpackb(await self.body(), raw=False)
+        return self._json
+
+
+class MsgpackRoute(APIRoute):
+    """
+    Маршрут, понимающий MessagePack в теле запроса и выбирающий формат ответа по Accept.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def negotiated_handler(request: Request):
+            if _is_msgpack_body(request):
+                if msgpack is None:
+                    raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                                        detail="msgpack is not supported")
+                request = MsgpackRequest(request.scope, request.receive)
+            token = _wants_msgpack.set(prefers_msgpack(request.headers.get("accept", "")))
+            try:
+                return await handler(request)
+            finally:
+                _wants_msgpack.reset(token)
+
+        return negotiated_handler
@@ -0,0 +1,257 @@
+"""
+Профилирование отдельных запросов по заголовку X-Profile.
+
+Заголовок содержит подписанный токен "<expires>.<hmac>", выпустить его может только владелец
+секрета (PROFILING_SECRET):
+    python profiling.py --ttl 300
+
+Запрос с действительным токеном выполняется под сэмплирующим профилировщиком. В каталог
+PROFILING_OUTPUT_DIR пишутся стеки в формате folded (flamegraph.pl, speedscope) и JSON
+с SQL-запросами этого запроса и их длительностью. Имя файлов возвращается в заголовке
+X-Profile-Id. Остальные запросы проходят без профилировщика и без обработчиков SQL-событий.
+"""
+import argparse
+import asyncio
+import contextvars
+import hashlib
+import hmac
+import json
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from sqlalchemy import event
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import load_config
+
+HEADER = "x-profile"
+
+_current = contextvars.ContextVar("current_profile", default=None)
+
+try:
+    # Синхронные обработчики выполняются рабочими потоками anyio: кадр WorkerThread.run
+    # хранит в локальной переменной context копию контекста запроса
+    from anyio._backends._asyncio import WorkerThread
+    _WORKER_RUN = WorkerThread.run.__code__
+except (ImportError, AttributeError):
+    _WORKER_RUN = None
+
+
+def sign_token(secret: str, ttl: int = 300, now: float = None) -> str:
+    """
+    Выпускает токен для заголовка X-Profile.
+
+    Args:
+    secret (str): Секрет профилирования.
+    ttl (int): Срок действия токена в секундах.
+
+    Returns:
+    str: Токен "<expires>.<hmac>".
+    """
+    expires = int((now or time.time()) + ttl)
+    signature = hmac.new(secret.encode(), str(expires).encode(), hashlib.sha256).hexdigest()
+    return f"{expires}.{signature}"
+
+
+def verify_token(secret: str, token: str, now: float = None) -> bool:
+    """
+    Проверяет подпись и срок действия токена X-Profile.
+    """
+    expires, _, signature = token.partition(".")
+    if not secret or not expires.isdigit():
+        return False
+    expected = hmac.new(secret.encode(), expires.encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature) and int(expires) >= (now or time.time())
+
+
+class RequestProfile:
+    """
+    Профиль одного запроса: сэмплы стеков и выполненные SQL-запросы.
+    """
+
+    def __init__(self, method: str, path: str, interval: float):
+        self.id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.interval = interval
+        self.samples = Counter()
+        self.statements = []
+        self.started = time.perf_counter()
+        self.duration = None
+        self._loop = None
+        self._loop_thread = None
+        self._task = None
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name=f"profile-{self.id}", daemon=True)
+
+    def start(self) -> None:
+        # Асинхронная часть запроса выполняется задачей, которая вызвала start(), в потоке цикла событий
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._task = asyncio.current_task()
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self.duration = time.perf_counter() - self.started
+        self._stop.set()
+        self._sampler.join()
+
+    def _owns(self, thread_id: int, frame) -> bool:
+        if thread_id == self._loop_thread:
+            # Поток цикла событий обслуживает и другие запросы: кадры наши, только пока
+            # выполняется задача этого запроса
+            return asyncio.current_task(self._loop) is self._task
+        # Рабочий поток: сравниваются только объекты кода, локальные переменные читаются
+        # у одного кадра WorkerThread.run
+        while frame is not None:
+            if frame.f_code is _WORKER_RUN:
+                context = frame.f_locals.get("context")
+                return isinstance(context, contextvars.Context) and context.get(_current) is self
+            frame = frame.f_back
+        return False
+
+    def _sample(self) -> None:
+        own_thread = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread or not self._owns(thread_id, frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def report(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "duration_ms": round(self.duration * 1000, 3),
+            "interval_ms": self.interval * 1000,
+            "samples": sum(self.samples.values()),
+            "sql_ms": round(sum(item["duration_ms"] for item in self.statements), 3),
+            "statements": self.statements,
+        }
+
+
+class _SqlRecorder:
+    """
+    Подключает обработчики SQL-событий к движку только на время профилируемых запросов.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self._active = 0
+
+    def attach(self) -> None:
+        with self._lock:
+            if self._active == 0:
+                event.listen(self.engine, "before_cursor_execute", self._before)
+                event.listen(self.engine, "after_cursor_execute", self._after)
+            self._active += 1
+
+    def detach(self) -> None:
+        with self._lock:
+            self._active -= 1
+            if self._active == 0:
+                event.remove(self.engine, "before_cursor_execute", self._before)
+                event.remove(self.engine, "after_cursor_execute", self._after)
+
+    @staticmethod
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if _current.get() is not None:
+            conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+    @staticmethod
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        profile = _current.get()
+        if profile is None:
+            return
+        started = conn.info["profile_started"].pop()
+        profile.statements.append({
+            "statement": statement,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            "offset_ms": round((started - profile.started) * 1000, 3),
+            "rows": cursor.rowcount,
+        })
+
+
+class ProfilingMiddleware:
+    """
+    ASGI-middleware, профилирующее запросы с подписанным заголовком X-Profile.
+
+    Args:
+    app (ASGIApp): Оборачиваемое приложение.
+    engine: Движок SQLAlchemy, запросы которого попадают в профиль.
+    secret (str): Секрет для проверки токенов.
+    output_dir (str): Каталог для файлов профилей.
+    interval (float): Интервал сэмплирования в секундах.
+    """
+
+    def __init__(self, app: ASGIApp, engine, secret: str, output_dir: str = "profiles",
+                 interval: float = 0.005) -> None:
+        self.app = app
+        self.secret = secret
+        self.output_dir = Path(output_dir)
+        self.interval = interval
+        self.recorder = _SqlRecorder(engine)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = Headers(scope=scope).get(HEADER)
+        if token is None or not verify_token(self.secret, token):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"], self.interval)
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile-Id", profile.id)
+            await send(message)
+
+        self.recorder.attach()
+        reset = _current.set(profile)
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile.stop()
+            _current.reset(reset)
+            self.recorder.detach()
+            # Запись файлов - блокирующий ввод-вывод, он не должен занимать цикл событий
+            await run_in_threadpool(self.write, profile)
+
+    def write(self, profile: RequestProfile) -> None:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        (self.output_dir / f"{profile.id}.folded").write_text(profile.folded(), encoding="utf-8")
+        (self.output_dir / f"{profile.id}.sql.json").write_text(
+            json.dumps(profile.report(), indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Выпускает токен для заголовка X-Profile")
+    parser.add_argument("--ttl", type=int, default=300, help="срок действия токена в секундах")
+    args = parser.parse_args()
+    secret = load_config('.env').profiling.secret
+    if not secret:
+        parser.error("PROFILING_SECRET is not set")
+    print(sign_token(secret, args.ttl))
+
+
+if __name__ == "__main__":
+    main()
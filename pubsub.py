@@ -0,0 +1,198 @@
+import logging
+import select
+import threading
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Сообщение, которое транспорт доставляет подписчикам всех каналов, когда сообщения могли
+# потеряться (например, за время разрыва соединения LISTEN): подписчик должен пересинхронизироваться
+MESSAGES_LOST = "*"
+
+
+class LocalPubSub:
+    """
+    Pub/sub внутри одного процесса с интерфейсом publish/subscribe как у Redis.
+
+    Подходит для одного воркера и для тестов; сообщения доставляются синхронно
+    в потоке издателя.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(list)
+
+    def publish(self, channel: str, message: str) -> int:
+        with self._lock:
+            callbacks = list(self._subscribers[channel])
+        for callback in callbacks:
+            try:
+                callback(message)
+            except Exception:
+                logger.exception("pub/sub subscriber failed on channel %s", channel)
+        return len(callbacks)
+
+    def subscribe(self, channel: str, callback) -> None:
+        with self._lock:
+            self._subscribers[channel].append(callback)
+
+    def unsubscribe(self, channel: str, callback) -> None:
+        with self._lock:
+            if callback in self._subscribers[channel]:
+                self._subscribers[channel].remove(callback)
+
+    def close(self) -> None:
+        with self._lock:
+            self._subscribers.clear()
+
+
+class PostgresPubSub(LocalPubSub):
+    """
+    Pub/sub между процессами через Postgres LISTEN/NOTIFY.
+
+    Публикация выполняет pg_notify, поэтому сообщение получат все воркеры, подписанные
+    на канал, включая текущий. Публикация и прослушивание идут на двух выделенных соединениях
+    вне пула приложения, прослушивание - в отдельном потоке. Полезная нагрузка NOTIFY
+    ограничена 8000 байт, поэтому сообщения должны быть короткими: идентификаторы, а не данные.
+
+    При разрыве соединения прослушивания поток переподключается с растущей задержкой,
+    заново подписывается на каналы и доставляет всем подписчикам MESSAGES_LOST.
+    """
+
+    def __init__(self, engine, poll_interval: float = 1.0, max_reconnect_interval: float = 30.0):
+        super().__init__()
+        self.engine = engine
+        self.poll_interval = poll_interval
+        self.max_reconnect_interval = max_reconnect_interval
+        self._listen_connection = None
+        self._listening = set()
+        self._thread = None
+        self._stopped = threading.Event()
+        self._publish_lock = threading.Lock()
+        self._publish_connection = None
+
+    def publish(self, channel: str, message: str) -> int:
+        with self._publish_lock:
+            try:
+                self._notify(channel, message)
+            except Exception:
+                # Соединение могло быть разорвано: одна повторная попытка на новом
+                self._close_publisher()
+                self._notify(channel, message)
+        return 1
+
+    def _notify(self, channel: str, message: str) -> None:
+        if self._publish_connection is None:
+            self._publish_connection = self._connect()
+        with self._publish_connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", (channel, message))
+
+    def _close_publisher(self) -> None:
+        if self._publish_connection is not None:
+            try:
+                self._publish_connection.close()
+            except Exception:
+                pass
+            self._publish_connection = None
+
+    def subscribe(self, channel: str, callback) -> None:
+        super().subscribe(channel, callback)
+        with self._lock:
+            self._ensure_listener()
+            if channel not in self._listening:
+                with self._listen_connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{channel}"')
+                self._listening.add(channel)
+
+    def close(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._listen_connection is not None:
+            self._listen_connection.close()
+        with self._publish_lock:
+            self._close_publisher()
+        super().close()
+
+    def _connect(self):
+        import psycopg2
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+        dsn = self.engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        connection = psycopg2.connect(dsn)
+        connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        return connection
+
+    def _ensure_listener(self) -> None:
+        if self._thread is not None:
+            return
+        self._listen_connection = self._connect()
+        self._thread = threading.Thread(target=self._listen, name="pg-listen", daemon=True)
+        self._thread.start()
+
+    def _listen(self) -> None:
+        delay = self.poll_interval
+        while not self._stopped.is_set():
+            try:
+                self._receive()
+                delay = self.poll_interval
+            except Exception:
+                logger.exception("LISTEN connection failed, reconnecting in %.1f s", delay)
+                if self._stopped.wait(delay):
+                    return
+                delay = min(delay * 2, self.max_reconnect_interval)
+                try:
+                    channels = self._reconnect()
+                except Exception:
+                    logger.exception("LISTEN reconnect failed")
+                    continue
+                # Сообщения за время разрыва потеряны: подписчики пересинхронизируются
+                for channel in channels:
+                    LocalPubSub.publish(self, channel, MESSAGES_LOST)
+
+    def _receive(self) -> None:
+        connection = self._listen_connection
+        readable, _, _ = select.select([connection], [], [], self.poll_interval)
+        if not readable:
+            return
+        with self._lock:
+            connection.poll()
+            notifies = list(connection.notifies)
+            connection.notifies.clear()
+        for notify in notifies:
+            LocalPubSub.publish(self, notify.channel, notify.payload)
+
+    def _reconnect(self) -> list:
+        connection = self._connect()
+        with self._lock:
+            with connection.cursor() as cursor:
+                for channel in self._listening:
+                    cursor.execute(f'LISTEN "{channel}"')
+            previous, self._listen_connection = self._listen_connection, connection
+            channels = list(self._listening)
+        try:
+            previous.close()
+        except Exception:
+            pass
+        return channels
+
+
+def build_pubsub(kind: str, engine):
+    """
+    Создает транспорт pub/sub по настройке.
+
+    LISTEN/NOTIFY есть только в Postgres; на других диалектах используется канал
+    внутри процесса.
+
+    Args:
+    kind (str): "postgres" или "local".
+    engine: Движок SQLAlchemy приложения.
+
+    Returns:
+    LocalPubSub: Транспорт pub/sub.
+    """
+    if kind == "postgres":
+        if engine.dialect.name == "postgresql":
+            return PostgresPubSub(engine)
+        logger.warning("LISTEN/NOTIFY requires Postgres, %s uses in-process pub/sub", engine.dialect.name)
+    return LocalPubSub()
@@ -1,6 +1,8 @@
+import datetime
+from typing import List, Optional
 from uuid import UUID
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 # MENU
@@ -66,3 +68,58 @@ class DishUpdate(BaseModel):
     title: str
     description: str
     price: str
+
+
+# CHANGES
+class Change(BaseModel):
+    seq: int
+    entity: str
+    op: str
+    id: UUID
+    data: Optional[dict] = None
+
+
+class ChangesPage(BaseModel):
+    changes: List[Change]
+    next_since: int
+    has_more: bool
+
+
+# BATCH
+BATCH_MAX_IDS = 1000
+
+
+class BatchIds(BaseModel):
+    ids: List[UUID] = Field(min_length=1, max_length=BATCH_MAX_IDS)
+
+
+class MenuBatchItem(BaseModel):
+    id: UUID
+    found: bool
+    data: Optional[Menu] = None
+
+
+class SubMenuBatchItem(BaseModel):
+    id: UUID
+    found: bool
+    data: Optional[SubMenu] = None
+
+
+class DishBatchItem(BaseModel):
+    id: UUID
+    found: bool
+    data: Optional[Dish] = None
+
+
+# SNAPSHOT
+class SubMenuTree(SubMenu):
+    dishes: List[Dish]
+
+
+class MenuTree(Menu):
+    submenus: List[SubMenuTree]
+
+
+class Catalogue(BaseModel):
+    generated_at: datetime.datetime
+    menus: List[MenuTree]
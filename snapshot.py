@@ -0,0 +1,224 @@
+"""
+Снимок всего каталога на диске для отдачи без обращения к БД и без сериализации.
+
+После зафиксированных записей снимок пересобирается в фоне с задержкой (debounce): серия
+записей дает одну пересборку. Снимок пишется атомарно (временный файл и os.replace) в двух
+вариантах - JSON и gzip. Процессы отображают файлы в память (mmap) и отдают их байты как
+есть; замену файла другим процессом замечают по stat при следующем запросе.
+
+Снимок собирается в процессе, который выполнил запись, поэтому все процессы должны видеть
+один и тот же путь: один хост или общий том. Процессы собирают снимок по очереди под блокировкой
+файла рядом с ним, где хранится отметка изменений последней сборки: если БД с тех пор не
+менялась, сборка пропускается, и одновременный запуск N процессов дает одну сборку.
+"""
+import gzip
+import logging
+import mmap
+import os
+import threading
+import time
+from pathlib import Path
+
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+try:
+    import fcntl
+except ImportError:  # fcntl есть только в POSIX; без него процессы собирают снимок независимо
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """
+    Записывает файл целиком или не записывает вовсе: читатели видят либо старый, либо новый файл.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(temporary, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, path)
+    finally:
+        temporary.unlink(missing_ok=True)
+
+
+class SnapshotWriter:
+    """
+    Пересборка снимка в фоновом потоке с задержкой после последней записи.
+
+    Сборка начинается через debounce секунд после последнего schedule(), но не позже чем
+    через max_delay секунд после первого, чтобы непрерывный поток записей не откладывал ее
+    бесконечно. Записи во время сборки планируют следующую.
+
+    Args:
+    render: Функция без аргументов, возвращающая JSON каталога в байтах.
+    path (Path): Путь к файлу снимка; рядом пишется path.gz.
+    debounce (float): Задержка после последней записи в секундах.
+    max_delay (float): Наибольшая задержка после первой записи в секундах.
+    gzip_level (int): Уровень сжатия варианта gzip.
+    watermark: Функция без аргументов, возвращающая отметку изменений БД; без нее снимок
+        собирается при каждом вызове build().
+    """
+
+    def __init__(self, render, path: Path, debounce: float = 1.0, max_delay: float = 10.0, gzip_level: int = 6,
+                 watermark=None):
+        self.render = render
+        self.watermark = watermark
+        self.path = Path(path)
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.gzip_level = gzip_level
+        self.builds = 0
+        self.skipped = 0
+        self._condition = threading.Condition()
+        self._first = None
+        self._last = None
+        self._thread = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="snapshot", daemon=True)
+        self._thread.start()
+
+    def schedule(self) -> None:
+        with self._condition:
+            now = time.monotonic()
+            if self._first is None:
+                self._first = now
+            self._last = now
+            self._condition.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while self._first is None:
+                    self._condition.wait()
+                while True:
+                    remaining = min(self._last + self.debounce, self._first + self.max_delay) - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                self._first = self._last = None
+            self.build()
+
+    def build(self) -> None:
+        """
+        Собирает снимок сразу, если отметка изменений БД отличается от отметки последней сборки.
+        Ошибка пишется в лог, прежний снимок остается на месте.
+        """
+        started = time.perf_counter()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            with open(self.path.with_name(self.path.name + ".lock"), "a+") as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                lock.seek(0)
+                built = lock.read()
+                # Отметка читается до сборки: запись между ними попадет в снимок или в следующую сборку
+                watermark = "" if self.watermark is None else str(self.watermark())
+                if watermark and watermark == built and self.path.exists():
+                    self.skipped += 1
+                    logger.info("catalogue snapshot is up to date at change %s", watermark)
+                    return
+                data = self.render()
+                # Сжатый вариант пишется первым: к моменту замены JSON он уже соответствует ему
+                write_atomic(self.path.with_name(self.path.name + ".gz"), gzip.compress(data, self.gzip_level))
+                write_atomic(self.path, data)
+                lock.truncate(0)
+                lock.write(watermark)
+        except Exception:
+            logger.exception("catalogue snapshot build failed")
+            return
+        self.builds += 1
+        logger.info("catalogue snapshot: %d bytes in %.0f ms", len(data), (time.perf_counter() - started) * 1000)
+
+
+class MappedFile:
+    """
+    Файл, отображенный в память. Отображение заменяется, когда файл на диске заменен.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._key = None
+        self._mapped = None
+        self._etag = None
+
+    def load(self):
+        """
+        Returns:
+        tuple: (mmap, etag) текущего файла или None, если файла нет.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if key != self._key:
+            with self._lock:
+                if key != self._key:
+                    with open(self.path, "rb") as file:
+                        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                    # Прежнее отображение не закрывается явно: его еще могут дочитывать ответы,
+                    # оно освободится вместе с последней ссылкой
+                    self._mapped, self._etag, self._key = mapped, '"{:x}-{:x}-{:x}"'.format(*key), key
+        return self._mapped, self._etag
+
+
+class MappedResponse(Response):
+    """
+    Ответ с телом из отображенного в память файла, отправляемым частями как есть.
+    """
+
+    media_type = "application/json"
+    chunk_size = 256 * 1024
+
+    def __init__(self, mapped: mmap.mmap, status_code: int = 200, headers: dict = None):
+        super().__init__(status_code=status_code, headers=headers)
+        self.mapped = mapped
+        self.headers["content-length"] = str(len(mapped))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        size = len(self.mapped)
+        for start in range(0, size, self.chunk_size):
+            end = min(start + self.chunk_size, size)
+            await send({"type": "http.response.body", "body": self.mapped[start:end], "more_body": end < size})
+
+
+writer = None
+files = {}
+
+
+def configure(config, render, watermark=None, start: bool = True) -> None:
+    """
+    Включает режим снимка, если он разрешен настройками.
+
+    Args:
+    config (SnapshotConfig): Настройки снимка.
+    render: Функция без аргументов, возвращающая JSON каталога в байтах.
+    watermark: Функция без аргументов, возвращающая отметку изменений БД.
+    start (bool): Запустить фоновую пересборку. Короткоживущие процессы (например, sync.py)
+        не запускают ее и вызывают writer.build() сами перед выходом.
+    """
+    global writer, files
+    if not config.enabled:
+        return
+    path = Path(config.path)
+    writer = SnapshotWriter(render, path, debounce=config.debounce, max_delay=config.max_delay, watermark=watermark)
+    if start:
+        writer.start()
+    files = {None: MappedFile(path), "gzip": MappedFile(path.with_name(path.name + ".gz"))}
+    logger.info("Catalogue snapshot enabled: %s", path)
+
+
+def schedule() -> None:
+    """
+    Планирует пересборку снимка после записи в меню, подменю или блюда.
+    """
+    if writer is not None:
+        writer.schedule()
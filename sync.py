@@ -0,0 +1,320 @@
+"""
+Инкрементальная синхронизация каталога из CSV-файла.
+
+Файл содержит по строке на блюдо (или на подменю/меню без блюд) с колонками:
+menu_title, menu_description, submenu_title, submenu_description,
+dish_title, dish_description, dish_price.
+
+Меню сопоставляются по названию, подменю - по названию внутри меню, блюда - по названию
+внутри подменю. Файл считается эталоном: строки, которых в нем нет, удаляются.
+
+Запуск:
+    python sync.py menu.csv [--source NAME] [--force] [--dry-run]
+"""
+import argparse
+import csv
+import datetime
+import hashlib
+import uuid
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from sqlalchemy.orm import Session
+
+import cache
+import crud
+import events
+import models
+import snapshot
+from config import load_config
+from database import SessionLocal, engine
+
+COLUMNS = (
+    "menu_title", "menu_description",
+    "submenu_title", "submenu_description",
+    "dish_title", "dish_description", "dish_price",
+)
+
+
+@dataclass
+class SyncReport:
+    source: str
+    sha256: str
+    skipped: bool = False
+    dry_run: bool = False
+    changes: list = field(default_factory=list)
+
+    def count(self, entity: str, op: str) -> int:
+        return sum(1 for change in self.changes if change["entity"] == entity and change["op"] == op)
+
+    def summary(self) -> str:
+        if self.skipped:
+            return f"{self.source}: unchanged (sha256 {self.sha256[:12]}), nothing to do"
+        parts = []
+        for entity in ("menu", "submenu", "dish"):
+            counts = [f"{op} {self.count(entity, op)}" for op in ("create", "update", "delete")]
+            parts.append(f"{entity}: " + ", ".join(counts))
+        prefix = "would apply" if self.dry_run else "applied"
+        return f"{self.source}: {prefix} {len(self.changes)} changes ({'; '.join(parts)})"
+
+
+def parse_catalogue(lines) -> dict:
+    """
+    Читает CSV в дерево {меню: {description, submenus: {подменю: {description, dishes: {...}}}}}.
+
+    Args:
+    lines: Итерируемые строки CSV с заголовком.
+
+    Returns:
+    dict: Желаемое состояние каталога.
+    """
+    reader = csv.DictReader(lines)
+    missing = set(COLUMNS) - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f"missing columns: {', '.join(sorted(missing))}")
+
+    catalogue = {}
+    for line_number, row in enumerate(reader, start=2):
+        row = {key: (row.get(key) or "").strip() for key in COLUMNS}
+        if not row["menu_title"]:
+            raise ValueError(f"line {line_number}: menu_title is required")
+        menu = catalogue.setdefault(row["menu_title"], {"description": "", "submenus": {}})
+        menu["description"] = row["menu_description"] or menu["description"]
+        if not row["submenu_title"]:
+            continue
+        submenu = menu["submenus"].setdefault(row["submenu_title"], {"description": "", "dishes": {}})
+        submenu["description"] = row["submenu_description"] or submenu["description"]
+        if not row["dish_title"]:
+            continue
+        submenu["dishes"][row["dish_title"]] = {
+            "description": row["dish_description"],
+            "price": row["dish_price"],
+        }
+    return catalogue
+
+
+def _same_price(current, desired: str) -> bool:
+    try:
+        return Decimal(current) == Decimal(desired)
+    except (InvalidOperation, TypeError):
+        return (current or "") == desired
+
+
+class _Diff:
+    """
+    Применяет к сессии минимальные изменения и записывает их в отчет.
+    """
+
+    def __init__(self, db: Session, report: SyncReport):
+        self.db = db
+        self.report = report
+        self.rows = []
+
+    def record(self, entity: str, op: str, menu_id, row=None, entity_id=None, title=None):
+        self.report.changes.append({"entity": entity, "op": op, "title": title or row.title})
+        self.rows.append((menu_id, entity, op, entity_id or row.id, None if op == "delete" else row))
+
+    def delete(self, entity: str, menu_id, row):
+        self.record(entity, "delete", menu_id, entity_id=row.id, title=row.title)
+        self.db.delete(row)
+
+    def update(self, entity: str, menu_id, row, values: dict):
+        changed = False
+        for name, value in values.items():
+            current = getattr(row, name)
+            same = _same_price(current, value) if name == "price" else (current or "") == value
+            if not same:
+                setattr(row, name, value)
+                changed = True
+        if changed:
+            self.record(entity, "update", menu_id, row)
+
+    def create(self, entity: str, menu_id, row):
+        self.db.add(row)
+        self.record(entity, "create", menu_id, row)
+
+
+def apply_catalogue(db: Session, catalogue: dict, report: SyncReport) -> list:
+    """
+    Сравнивает желаемый каталог с БД и добавляет в сессию только отличающиеся строки.
+
+    Args:
+    db (Session): Сессия базы данных, фиксация остается за вызывающим.
+    catalogue (dict): Результат parse_catalogue.
+    report (SyncReport): Отчет, в который записываются изменения.
+
+    Returns:
+    list: Измененные строки в виде (menu_id, entity, op, id, row) для публикации событий.
+    """
+    diff = _Diff(db, report)
+    submenus_by_menu, dishes_by_submenu = {}, {}
+    for submenu in db.query(models.SubMenu).all():
+        submenus_by_menu.setdefault(submenu.menu_id, []).append(submenu)
+    for dish in db.query(models.Dish).all():
+        dishes_by_submenu.setdefault(dish.submenu_id, []).append(dish)
+
+    seen_menus = set()
+    for menu in db.query(models.Menu).order_by(models.Menu.change_seq).all():
+        wanted = catalogue.get(menu.title)
+        if wanted is None or menu.title in seen_menus:
+            # Дубликаты по названию сводятся к первой строке
+            for submenu in submenus_by_menu.get(menu.id, []):
+                for dish in dishes_by_submenu.get(submenu.id, []):
+                    diff.record("dish", "delete", menu.id, entity_id=dish.id, title=dish.title)
+                diff.record("submenu", "delete", menu.id, entity_id=submenu.id, title=submenu.title)
+            diff.delete("menu", menu.id, menu)
+            continue
+        seen_menus.add(menu.title)
+        diff.update("menu", menu.id, menu, {"description": wanted["description"]})
+        _apply_submenus(diff, menu.id, wanted["submenus"], submenus_by_menu.get(menu.id, []), dishes_by_submenu)
+
+    for title, wanted in catalogue.items():
+        if title in seen_menus:
+            continue
+        # Идентификаторы назначаются заранее, чтобы вставки ушли одним пакетом при фиксации
+        menu = models.Menu(id=uuid.uuid4(), title=title, description=wanted["description"])
+        diff.create("menu", menu.id, menu)
+        _apply_submenus(diff, menu.id, wanted["submenus"], [], dishes_by_submenu)
+    return diff.rows
+
+
+def _apply_submenus(diff: _Diff, menu_id, wanted: dict, current: list, dishes_by_submenu: dict):
+    seen = set()
+    for submenu in current:
+        target = wanted.get(submenu.title)
+        if target is None or submenu.title in seen:
+            for dish in dishes_by_submenu.get(submenu.id, []):
+                diff.record("dish", "delete", menu_id, entity_id=dish.id, title=dish.title)
+            diff.delete("submenu", menu_id, submenu)
+            continue
+        seen.add(submenu.title)
+        diff.update("submenu", menu_id, submenu, {"description": target["description"]})
+        _apply_dishes(diff, menu_id, submenu.id, target["dishes"], dishes_by_submenu.get(submenu.id, []))
+
+    for title, target in wanted.items():
+        if title in seen:
+            continue
+        submenu = models.SubMenu(id=uuid.uuid4(), title=title, description=target["description"], menu_id=menu_id)
+        diff.create("submenu", menu_id, submenu)
+        _apply_dishes(diff, menu_id, submenu.id, target["dishes"], [])
+
+
+def _apply_dishes(diff: _Diff, menu_id, submenu_id, wanted: dict, current: list):
+    seen = set()
+    for dish in current:
+        target = wanted.get(dish.title)
+        if target is None or dish.title in seen:
+            diff.delete("dish", menu_id, dish)
+            continue
+        seen.add(dish.title)
+        diff.update("dish", menu_id, dish, target)
+
+    for title, target in wanted.items():
+        if title not in seen:
+            diff.create("dish", menu_id, models.Dish(id=uuid.uuid4(), title=title, menu_id=menu_id,
+                                                     submenu_id=submenu_id, **target))
+
+
+def sync_file(db: Session, path, source: str = None, force: bool = False, dry_run: bool = False) -> SyncReport:
+    """
+    Синхронизирует каталог с CSV-файлом одной транзакцией.
+
+    Если хэш файла совпадает с хэшем последней успешной синхронизации этого источника,
+    БД не читается и не изменяется.
+
+    Args:
+    db (Session): Сессия базы данных.
+    path: Путь к CSV-файлу.
+    source (str): Имя источника для хранения хэша; по умолчанию имя файла.
+    force (bool): Синхронизировать даже при совпадении хэша.
+    dry_run (bool): Только посчитать изменения и откатить транзакцию.
+
+    Returns:
+    SyncReport: Отчет о примененных изменениях.
+    """
+    path = Path(path)
+    content = path.read_bytes()
+    report = SyncReport(source=source or path.name, sha256=hashlib.sha256(content).hexdigest(), dry_run=dry_run)
+
+    state = db.get(models.SyncState, report.source)
+    if state is not None and state.sha256 == report.sha256 and not force:
+        report.skipped = True
+        return report
+
+    catalogue = parse_catalogue(content.decode("utf-8-sig").splitlines())
+    try:
+        rows = apply_catalogue(db, catalogue, report)
+        if dry_run:
+            db.rollback()
+            return report
+        if state is None:
+            state = models.SyncState(source=report.source)
+            db.add(state)
+        state.sha256 = report.sha256
+        state.synced_at = datetime.datetime.utcnow()
+        db.flush()
+        # Отметки читаются до фиксации, по запросу на тип сущности: после commit обращение
+        # к истекшим строкам стоило бы SELECT на каждую
+        seqs = _change_seqs(db, rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    if rows:
+        cache.invalidate()
+        snapshot.schedule()
+        for menu_id, entity, op, entity_id, row in rows:
+            event = {"entity": entity, "op": op, "id": entity_id}
+            if row is not None:
+                event["seq"] = seqs[entity_id]
+            events.broker.publish(menu_id, event)
+    return report
+
+
+def _change_seqs(db: Session, rows: list) -> dict:
+    ids = {}
+    for _, entity, _, entity_id, row in rows:
+        if row is not None:
+            ids.setdefault(entity, []).append(entity_id)
+    seqs = {}
+    for entity, entity_ids in ids.items():
+        seqs.update(crud.get_change_seqs(db, entity, entity_ids))
+    return seqs
+
+
+def _in_session(fn):
+    def call():
+        with SessionLocal() as db:
+            return fn(db)
+    return call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="CSV-файл с каталогом")
+    parser.add_argument("--source", help="имя источника для хранения хэша (по умолчанию имя файла)")
+    parser.add_argument("--force", action="store_true", help="синхронизировать даже неизмененный файл")
+    parser.add_argument("--dry-run", action="store_true", help="только показать изменения")
+    args = parser.parse_args()
+
+    # Синхронизация идет в отдельном процессе: кэш, события и снимок настраиваются как в приложении,
+    # чтобы сброс кэша и события дошли до его воркеров через общий уровень и pub/sub
+    config = load_config('.env')
+    cache.configure(config.cache, engine)
+    events.configure(config.events, engine)
+    snapshot.configure(config.snapshot, _in_session(crud.render_catalogue), _in_session(crud.get_change_watermark),
+                       start=False)
+
+    with SessionLocal() as db:
+        report = sync_file(db, args.path, source=args.source, force=args.force, dry_run=args.dry_run)
+    if report.changes and not report.dry_run and snapshot.writer is not None:
+        snapshot.writer.build()
+    print(report.summary())
+    for change in report.changes:
+        print(f"  {change['op']:<6} {change['entity']:<7} {change['title']}")
+
+
+if __name__ == "__main__":
+    main()
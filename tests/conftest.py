@@ -1,49 +1,88 @@
+import os
 import sys
 from pathlib import Path
 
 ROOT_DIRECTORY = Path(__file__).resolve().parents[1]
 sys.path.append(str(ROOT_DIRECTORY))
 
+# Фоновый прогрев шел бы параллельно с транзакцией теста; тесты прогрева запускают его сами
+os.environ.setdefault("WARMUP_ENABLED", "false")
+
 import pytest
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy import event, text
 from starlette.testclient import TestClient
-from database import Base, get_db
-from main import app
+
+import database
+from database import Base, SessionLocal
 from models import Menu
 
-from config import load_config
-config_url = load_config('.env')
-TEST_DATABASE_URL = config_url.db.DATABASE_URL
+# Интеграционный уровень идет на Postgres из настроек, быстрый - на SQLite в памяти:
+# TEST_DATABASE_URL=sqlite:// pytest
+POSTGRES = database.engine.dialect.name == "postgresql"
+
+# Каждый воркер pytest-xdist работает в своей схеме, поэтому тесты можно запускать параллельно.
+# SQLite в памяти и так своя у каждого процесса.
+WORKER_ID = os.getenv("PYTEST_XDIST_WORKER", "main")
+TEST_SCHEMA = f"test_{WORKER_ID}"
+
+if POSTGRES:
+    @event.listens_for(database.engine, "do_connect")
+    def _use_test_schema(dialect, connection_record, cargs, cparams):
+        cparams["options"] = f"-csearch_path={TEST_SCHEMA}"
+
+    # Схема должна существовать до импорта приложения: main создает таблицы при импорте
+    with database.engine.begin() as _connection:
+        _connection.execute(text(f'DROP SCHEMA IF EXISTS "{TEST_SCHEMA}" CASCADE'))
+        _connection.execute(text(f'CREATE SCHEMA "{TEST_SCHEMA}"'))
+
+from main import app  # noqa: E402
 
 
 @pytest.fixture(scope="session")
 def engine():
     """
-    Создает и возвращает движок базы данных для сессии тестирования.
+    Возвращает движок приложения, подключенный к схеме текущего воркера.
     """
-    return create_engine(TEST_DATABASE_URL)
+    return database.engine
 
 
 @pytest.fixture(scope="session")
 def tables(engine):
     """
-    Создает таблицы перед началом тестирования и удаляет их после окончания.
+    Создает таблицы перед началом тестирования и удаляет схему воркера Postgres после окончания.
     """
     Base.metadata.create_all(bind=engine)
     yield
-    Base.metadata.drop_all(bind=engine)
+    if POSTGRES:
+        engine.dispose()
+        with engine.begin() as connection:
+            connection.execute(text(f'DROP SCHEMA IF EXISTS "{TEST_SCHEMA}" CASCADE'))
 
 
 @pytest.fixture
-def db_session(engine, tables):
+def connection(engine, tables):
     """
-    Создает и возвращает сессию базы данных для каждого теста.
-    Добавляет тестовые данные и удаляет их после завершения теста.
+    Открывает соединение с внешней транзакцией, которая откатывается после теста.
     """
     connection = engine.connect()
     transaction = connection.begin()
-    session = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+    yield connection
+    transaction.rollback()
+    connection.close()
+
+
+@pytest.fixture
+def db_session(connection, monkeypatch):
+    """
+    Создает и возвращает сессию базы данных для каждого теста.
+
+    Все сессии приложения (SessionLocal) на время теста привязываются к соединению теста,
+    а их commit фиксирует только SAVEPOINT. Внешняя транзакция откатывается после теста,
+    поэтому данные не переходят между тестами и таблицы не пересоздаются.
+    """
+    monkeypatch.setitem(SessionLocal.kw, "bind", connection)
+    monkeypatch.setitem(SessionLocal.kw, "join_transaction_mode", "create_savepoint")
+    session = SessionLocal()
 
     test_menus = [
         Menu(title="Test Menu 1", description="Description for test menu 1"),
@@ -55,24 +94,14 @@ def db_session(engine, tables):
     yield session
 
     session.close()
-    transaction.rollback()
-    connection.close()
 
 
 @pytest.fixture
 def client(db_session):
     """
     Создает и возвращает тестовый клиент FastAPI.
-    Подменяет зависимость базы данных на тестовую сессию базы данных.
+    Запросы работают в транзакции теста через SessionLocal.
     """
-
-    def _get_test_db():
-        try:
-            yield db_session
-        finally:
-            db_session.close()
-
-    app.dependency_overrides[get_db] = _get_test_db
     with TestClient(app) as client:
         yield client
 
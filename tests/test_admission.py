@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+import main
+from admission import AdmissionController, BULK, Overloaded, PriorityLimiter, READ, WRITE
+
+
+def test_reads_are_admitted_before_writes():
+    '''
+    Проверяет, что освободившийся слот достается чтению раньше ожидающей записи.
+    '''
+
+    async def scenario():
+        limiter = PriorityLimiter(capacity=1, max_queue=10, max_wait=1)
+        order = []
+        await limiter.acquire(READ)
+
+        async def worker(name, priority):
+            await limiter.acquire(priority)
+            order.append(name)
+            limiter.release()
+
+        write = asyncio.create_task(worker("write", WRITE))
+        await asyncio.sleep(0)
+        read = asyncio.create_task(worker("read", READ))
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.gather(write, read)
+        return order, limiter.in_use
+
+    order, in_use = asyncio.run(scenario())
+    assert order == ["read", "write"]
+    assert in_use == 0
+
+
+def test_full_queue_fails_fast():
+    '''
+    Проверяет, что при заполненной очереди запрос сразу получает отказ.
+    '''
+
+    async def scenario():
+        limiter = PriorityLimiter(capacity=1, max_queue=1, max_wait=1)
+        await limiter.acquire(READ)
+        waiting = asyncio.create_task(limiter.acquire(READ))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            await limiter.acquire(READ)
+        limiter.release()
+        await waiting
+        limiter.release()
+        return limiter.in_use, limiter.queued
+
+    assert asyncio.run(scenario()) == (0, 0)
+
+
+def test_wait_timeout_fails():
+    '''
+    Проверяет, что запрос, не дождавшийся слота за max_wait, получает отказ и покидает очередь.
+    '''
+
+    async def scenario():
+        limiter = PriorityLimiter(capacity=1, max_queue=10, max_wait=0.01)
+        await limiter.acquire(READ)
+        with pytest.raises(Overloaded):
+            await limiter.acquire(WRITE)
+        limiter.release()
+        return limiter.in_use, limiter.queued
+
+    assert asyncio.run(scenario()) == (0, 0)
+
+
+def test_overloaded_route_returns_503_with_retry_after():
+    '''
+    Проверяет, что перегруженный маршрут отвечает 503 с заголовком Retry-After.
+    '''
+    admission = AdmissionController(capacity=0, max_queue=0, max_wait=0.01, retry_after=3)
+    app = FastAPI()
+
+    @app.get("/menus", dependencies=[Depends(admission.slot(READ))])
+    def read_menus():
+        return []
+
+    response = TestClient(app).get("/menus")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "3"
+
+
+def test_slot_is_released_after_request():
+    '''
+    Проверяет, что слот освобождается после завершения запроса.
+    '''
+    admission = AdmissionController(capacity=1, max_queue=0, max_wait=0.01, retry_after=1)
+    app = FastAPI()
+
+    @app.get("/menus", dependencies=[Depends(admission.slot(READ))])
+    def read_menus():
+        return []
+
+    client = TestClient(app)
+    assert client.get("/menus").status_code == 200
+    assert client.get("/menus").status_code == 200
+    assert admission.limiter.in_use == 0
+
+
+def test_bulk_is_shed_before_read():
+    '''
+    Проверяет, что при заполненной очереди чтение вытесняет ожидающий тяжелый запрос, а не получает отказ.
+    '''
+
+    async def scenario():
+        limiter = PriorityLimiter(capacity=1, max_queue=1, max_wait=1)
+        await limiter.acquire(READ)
+        bulk = asyncio.create_task(limiter.acquire(BULK))
+        await asyncio.sleep(0)
+        read = asyncio.create_task(limiter.acquire(READ))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            await bulk
+        # Тяжелый запрос не может вытеснить чтение
+        with pytest.raises(Overloaded):
+            await limiter.acquire(BULK)
+        limiter.release()
+        await read
+        limiter.release()
+        return limiter.in_use, limiter.queued
+
+    assert asyncio.run(scenario()) == (0, 0)
+
+
+
+def test_batch_routes_use_bulk_priority():
+    '''
+    Проверяет, что поиск по списку и лента изменений допускаются с приоритетом BULK, а точечное чтение - с READ.
+    '''
+    def slots(path, method):
+        route = next(route for route in main.app.routes if route.path == path and method in route.methods)
+        return [dependency.dependency for dependency in route.dependencies]
+
+    for path in ("/api/v1/menus/batch", "/api/v1/submenus/batch", "/api/v1/dishes/batch"):
+        assert main.bulk_slot.dependency in slots(path, "GET")
+        assert main.bulk_slot.dependency in slots(path, "POST")
+    assert main.bulk_slot.dependency in slots("/api/v1/changes", "GET")
+    assert slots("/api/v1/menus/{menu_id}", "GET") == [main.read_slot.dependency]
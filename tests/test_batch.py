@@ -0,0 +1,84 @@
+import uuid
+
+import pytest
+from sqlalchemy import event
+
+from database import engine
+from models import Dish, SubMenu
+
+
+@pytest.fixture
+def catalogue(db_session, create_test_menu):
+    submenu = SubMenu(title="Batch", description="Batch", menu_id=create_test_menu.id)
+    db_session.add(submenu)
+    db_session.commit()
+    dishes = [Dish(title=f"Batch {i}", description="Batch", price="3", submenu_id=submenu.id) for i in range(3)]
+    db_session.add_all(dishes)
+    db_session.commit()
+    return create_test_menu, submenu, dishes
+
+
+def test_dishes_batch_keeps_request_order(client, catalogue):
+    '''
+    Проверяет, что блюда возвращаются в порядке запроса, с повторами и отметкой отсутствующих.
+    '''
+    _, _, dishes = catalogue
+    missing = uuid.uuid4()
+    ids = [dishes[2].id, missing, dishes[0].id, dishes[2].id]
+
+    response = client.get("/api/v1/dishes/batch", params={"ids": ",".join(map(str, ids))})
+
+    assert response.status_code == 200
+    items = response.json()
+    assert [item["id"] for item in items] == [str(id) for id in ids]
+    assert [item["found"] for item in items] == [True, False, True, True]
+    assert items[1]["data"] is None
+    assert items[0]["data"] == {"id": str(dishes[2].id), "title": "Batch 2", "description": "Batch", "price": "3.00"}
+
+
+def test_batch_is_one_query(client, catalogue):
+    '''
+    Проверяет, что поиск по списку идентификаторов выполняет один запрос к БД.
+    '''
+    _, _, dishes = catalogue
+    ids = [str(dish.id) for dish in dishes]
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "from dishes" in statement.lower():
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.post("/api/v1/dishes/batch", json={"ids": ids})
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert all(item["found"] for item in response.json())
+    assert len(statements) == 1
+
+
+def test_menus_and_submenus_batch(client, catalogue):
+    '''
+    Проверяет поиск меню и подменю по списку: данные совпадают с обычными эндпоинтами, включая счетчики.
+    '''
+    menu, submenu, _ = catalogue
+    missing = str(uuid.uuid4())
+
+    menus = client.get("/api/v1/menus/batch", params=[("ids", str(menu.id)), ("ids", missing)]).json()
+    submenus = client.post("/api/v1/submenus/batch", json={"ids": [missing, str(submenu.id)]}).json()
+
+    assert menus[0]["data"] == client.get(f"/api/v1/menus/{menu.id}").json()
+    assert menus[1] == {"id": missing, "found": False, "data": None}
+    assert submenus[1]["data"] == client.get(f"/api/v1/menus/{menu.id}/submenus/{submenu.id}").json()
+    assert submenus[1]["data"]["dishes_count"] == 3
+
+
+@pytest.mark.parametrize("ids", ["", "not-a-uuid", ",".join(str(uuid.UUID(int=i)) for i in range(1001))],
+                         ids=["empty", "not-uuid", "too-many"])
+def test_invalid_ids(client, ids):
+    '''
+    Проверяет, что пустой список, не UUID и слишком длинный список дают 422.
+    '''
+    assert client.get("/api/v1/dishes/batch", params={"ids": ids}).status_code == 422
+    assert client.post("/api/v1/dishes/batch", json={"ids": [id for id in ids.split(",") if id]}).status_code == 422
@@ -0,0 +1,338 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy import text
+
+import cache
+import crud
+import schemas
+from cache import LocalSharedCache, TTLCache, TwoTierCache
+from database import SessionLocal, engine
+from pubsub import MESSAGES_LOST, LocalPubSub, PostgresPubSub
+
+
+def make_worker(shared, pubsub):
+    return TwoTierCache(local=TTLCache(maxsize=100, ttl=60), shared=shared, pubsub=pubsub)
+
+
+def make_refreshing_worker(ttl=5, refresh_ahead=0.05):
+    # Общий уровень живет меньше момента обновления, чтобы обновление доходило до загрузчика
+    local = TTLCache(maxsize=100, ttl=ttl, refresh_ahead=refresh_ahead)
+    return TwoTierCache(local=local, shared=LocalSharedCache(), pubsub=LocalPubSub(), shared_ttl=0.01)
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    '''
+    Проверяет, что при переполнении вытесняется давно не использованная запись.
+    '''
+    local = TTLCache(maxsize=2, ttl=60)
+    local.set("a", 1)
+    local.set("b", 2)
+    local.get("a")
+    local.set("c", 3)
+    assert local.get("a") == (True, 1)
+    assert local.get("b") == (False, None)
+
+
+def test_ttl_cache_expires_entries():
+    '''
+    Проверяет, что запись перестает возвращаться после истечения TTL.
+    '''
+    local = TTLCache(maxsize=2, ttl=0.01)
+    local.set("a", 1)
+    time.sleep(0.02)
+    assert local.get("a") == (False, None)
+
+
+def test_ttl_cache_spreads_refresh_moments():
+    '''
+    Проверяет, что момент обновления лежит в доле TTL [refresh_ahead - refresh_jitter, refresh_ahead].
+    '''
+    local = TTLCache(maxsize=100, ttl=10, refresh_ahead=0.8, refresh_jitter=0.2)
+    started = time.monotonic()
+    for key in range(50):
+        local.set(key, key)
+
+    moments = [local.lookup(key)[2] - started for key in range(50)]
+
+    assert all(5.9 <= moment <= 8.1 for moment in moments)
+    assert len({round(moment, 3) for moment in moments}) > 1
+    plain = TTLCache(maxsize=1, ttl=10)
+    plain.set("a", 1)
+    assert plain.lookup("a") == (True, 1, None)
+
+
+def test_due_entry_is_served_stale_and_refreshed_once():
+    '''
+    Проверяет, что запись, которую пора обновить, отдается сразу, а обновление выполняется один раз в фоне.
+    '''
+    worker = make_refreshing_worker()
+    worker.get_or_load("menu", lambda: "old")
+    time.sleep(0.3)
+    release, calls = threading.Event(), []
+
+    def refresh():
+        calls.append(1)
+        release.wait(2)
+        return "new"
+
+    for _ in range(5):
+        assert worker.get_or_load("menu", lambda: "loaded", refresh=refresh) == "old"
+    release.set()
+
+    wait_for(lambda: worker.local.get(("", "menu")) == (True, "new"))
+    wait_for(lambda: worker.metrics()["refreshing"] == 0)
+    metrics = worker.metrics()
+    assert len(calls) == 1
+    assert metrics["stale_served"] == 5 and metrics["refreshes"] == 1
+    assert metrics["refresh_lag_last"] >= 0.05
+
+
+def test_write_during_refresh_keeps_stale_value_out_of_both_tiers():
+    '''
+    Проверяет, что значение, которое фоновое обновление прочитало до записи, а вернуло после нее,
+    не попадает ни в локальный уровень, ни в общий, откуда его взяли бы другие воркеры.
+    '''
+    shared, pubsub = LocalSharedCache(), LocalPubSub()
+    worker = TwoTierCache(local=TTLCache(maxsize=100, ttl=5, refresh_ahead=0.05), shared=shared, pubsub=pubsub)
+    # Значение есть только в локальном уровне, чтобы обновление дошло до загрузчика
+    worker.local.set(("a", "menu"), "old")
+    time.sleep(0.3)
+    started, release = threading.Event(), threading.Event()
+
+    def refresh():
+        started.set()
+        release.wait(2)
+        return "stale"
+
+    assert worker.get_or_load("menu", lambda: "loaded", refresh=refresh, scope="a") == "old"
+    assert started.wait(2)
+    worker.invalidate("a")
+    release.set()
+    wait_for(lambda: worker.metrics()["refreshes"] == 1)
+
+    assert make_worker(shared, pubsub).get_or_load("menu", lambda: "fresh", scope="a") == "fresh"
+    assert worker.get_or_load("menu", lambda: "loaded", scope="a") == "fresh"
+
+
+def test_failed_refresh_keeps_stale_value():
+    '''
+    Проверяет, что ошибка фонового обновления учитывается, а запрос получает прежнее значение.
+    '''
+    worker = make_refreshing_worker()
+    worker.get_or_load("menu", lambda: "old")
+    time.sleep(0.3)
+
+    assert worker.get_or_load("menu", lambda: "loaded", refresh=lambda: 1 / 0) == "old"
+
+    wait_for(lambda: worker.metrics()["refresh_failures"] == 1)
+    assert worker.get_or_load("menu", lambda: "loaded") == "old"
+    assert worker.metrics()["refreshing"] == 0
+
+
+def test_second_worker_reads_shared_tier():
+    '''
+    Проверяет, что второй воркер получает значение из общего уровня без загрузки из БД.
+    '''
+    shared, pubsub = LocalSharedCache(), LocalPubSub()
+    first, second = make_worker(shared, pubsub), make_worker(shared, pubsub)
+    loads = []
+
+    assert first.get_or_load("menu", lambda: loads.append(1) or "value") == "value"
+    assert second.get_or_load("menu", lambda: loads.append(1) or "other") == "value"
+    assert len(loads) == 1
+
+
+def test_write_in_one_worker_invalidates_all_workers():
+    '''
+    Проверяет, что инвалидация в одном воркере сбрасывает локальный уровень всех воркеров.
+    '''
+    shared, pubsub = LocalSharedCache(), LocalPubSub()
+    first, second = make_worker(shared, pubsub), make_worker(shared, pubsub)
+    first.get_or_load("menu", lambda: "old")
+    second.get_or_load("menu", lambda: "old")
+
+    first.invalidate()
+
+    assert len(second.local) == 0
+    assert second.get_or_load("menu", lambda: "new") == "new"
+    assert first.get_or_load("menu", lambda: "newer") == "new"
+
+
+def test_write_to_menu_keeps_other_menus_cached():
+    '''
+    Проверяет, что запись в меню сбрасывает во всех воркерах его чтения и списки,
+    а чтения других меню остаются в обоих уровнях.
+    '''
+    shared, pubsub = LocalSharedCache(), LocalPubSub()
+    first, second = make_worker(shared, pubsub), make_worker(shared, pubsub)
+    for worker in (first, second):
+        worker.get_or_load("menu", lambda: "old a", scope="a")
+        worker.get_or_load("menu", lambda: "old b", scope="b")
+        worker.get_or_load("menus", lambda: "old list")
+
+    first.invalidate("a")
+
+    assert len(second.local) == 1
+    assert second.get_or_load("menu", lambda: "new a", scope="a") == "new a"
+    assert second.get_or_load("menus", lambda: "new list") == "new list"
+    assert second.get_or_load("menu", lambda: "new b", scope="b") == "old b"
+    # Общий уровень: третий воркер без локальных записей получает прежнее значение меню b
+    assert make_worker(shared, pubsub).get_or_load("menu", lambda: "new b", scope="b") == "old b"
+
+    first.invalidate()
+    assert first.get_or_load("menu", lambda: "newer b", scope="b") == "newer b"
+
+
+def test_invalidation_from_another_process_reaches_local_shared_tier():
+    '''
+    Проверяет, что сообщение об инвалидации из другого процесса (у каждого свой заменитель
+    общего уровня) делает недостижимыми и записи общего уровня этого процесса.
+    '''
+    pubsub = LocalPubSub()
+    app_worker, sync_process = (
+        TwoTierCache(local=TTLCache(maxsize=100, ttl=60), shared=LocalSharedCache(), pubsub=pubsub,
+                     private_shared=True)
+        for _ in range(2)
+    )
+    app_worker.get_or_load("menu", lambda: "old", scope="a")
+    app_worker.local.clear()
+
+    sync_process.invalidate()
+
+    assert app_worker.get_or_load("menu", lambda: "new", scope="a") == "new"
+
+
+def test_invalidation_advances_generations_and_epochs_once():
+    '''
+    Проверяет, что запись увеличивает поколения общего уровня и счетчики инвалидаций ровно
+    на единицу: собственное эхо pub/sub не применяется повторно.
+    '''
+    for private_shared in (False, True):
+        shared = LocalSharedCache()
+        worker = TwoTierCache(local=TTLCache(maxsize=100, ttl=60), shared=shared, pubsub=LocalPubSub(),
+                              private_shared=private_shared)
+
+        worker.invalidate("a")
+        worker.invalidate()
+
+        assert [worker._generation(scope) for scope in (None, "a", "")] == [1, 1, 1]
+        assert worker._epoch("a") == (1, 1)
+
+
+def test_crud_reads_are_cached_until_write(db_session, create_test_menu, monkeypatch):
+    '''
+    Проверяет, что чтение меню кэшируется, а обновление через crud сбрасывает кэш.
+    '''
+    monkeypatch.setattr(cache, "catalogue_cache", make_worker(LocalSharedCache(), LocalPubSub()))
+    menu_id = create_test_menu.id
+
+    def call(fn):
+        # Каждый вызов в своей сессии, как отдельный запрос
+        with SessionLocal() as db:
+            return fn(db)
+
+    assert call(lambda db: crud.get_menu(db, menu_id=menu_id))["title"] == "Test Menu"
+    db_session.query(type(create_test_menu)).filter_by(id=menu_id).update({"title": "Changed directly"})
+    db_session.commit()
+    assert call(lambda db: crud.get_menu(db, menu_id))["title"] == "Test Menu"
+
+    call(lambda db: crud.update_menu(db, menu_id, schemas.MenuUpdate(title="Updated", description="Updated")))
+    assert call(lambda db: crud.get_menu(db, menu_id=menu_id))["title"] == "Updated"
+
+
+def test_crud_write_keeps_other_menu_cached(db_session, create_test_menu, monkeypatch):
+    '''
+    Проверяет, что обновление одного меню через crud не сбрасывает кэш чтения другого меню.
+    '''
+    monkeypatch.setattr(cache, "catalogue_cache", make_worker(LocalSharedCache(), LocalPubSub()))
+    other = type(create_test_menu)(title="Other Menu", description="Other")
+    db_session.add(other)
+    db_session.commit()
+
+    with SessionLocal() as db:
+        assert crud.get_menu(db, menu_id=other.id)["title"] == "Other Menu"
+    db_session.query(type(other)).filter_by(id=other.id).update({"title": "Changed directly"})
+    db_session.commit()
+
+    with SessionLocal() as db:
+        crud.update_menu(db, create_test_menu.id, schemas.MenuUpdate(title="Updated", description="Updated"))
+    with SessionLocal() as db:
+        assert crud.get_menu(db, menu_id=other.id)["title"] == "Other Menu"
+        assert crud.get_menu(db, menu_id=create_test_menu.id)["title"] == "Updated"
+
+
+def test_crud_refresh_uses_own_session(db_session, create_test_menu, monkeypatch):
+    '''
+    Проверяет, что фоновое обновление чтения из crud открывает свою сессию и видит новые данные.
+    '''
+    monkeypatch.setattr(cache, "catalogue_cache", make_refreshing_worker())
+    monkeypatch.setattr(cache, "session_factory", SessionLocal)
+    menu_id = create_test_menu.id
+
+    with SessionLocal() as db:
+        assert crud.get_menu(db, menu_id=menu_id)["title"] == "Test Menu"
+    db_session.query(type(create_test_menu)).filter_by(id=menu_id).update({"title": "Changed directly"})
+    db_session.commit()
+    time.sleep(0.3)
+
+    # Сессия запроса закрыта до того, как фоновое обновление начнет работу
+    with SessionLocal() as db:
+        assert crud.get_menu(db, menu_id=menu_id)["title"] == "Test Menu"
+    wait_for(lambda: cache.metrics()["refreshes"] == 1)
+    with SessionLocal() as db:
+        assert crud.get_menu(db, menu_id=menu_id)["title"] == "Changed directly"
+
+
+@pytest.mark.skipif(engine.dialect.name != "postgresql", reason="LISTEN/NOTIFY есть только в Postgres")
+def test_postgres_notify_reaches_subscriber():
+    '''
+    Проверяет доставку сообщения об инвалидации через LISTEN/NOTIFY.
+    '''
+    pubsub = PostgresPubSub(engine, poll_interval=0.1)
+    received = threading.Event()
+    try:
+        pubsub.subscribe("test_catalogue_cache", lambda message: received.set())
+        started = time.monotonic()
+        pubsub.publish("test_catalogue_cache", "*")
+        assert received.wait(2)
+        assert time.monotonic() - started < 1
+    finally:
+        pubsub.close()
+
+
+@pytest.mark.skipif(engine.dialect.name != "postgresql", reason="LISTEN/NOTIFY есть только в Postgres")
+def test_postgres_pubsub_survives_dropped_connections():
+    '''
+    Проверяет, что публикация идет через одно выделенное соединение, а после разрыва соединений
+    публикация переподключается, прослушивание возобновляется и подписчик получает MESSAGES_LOST.
+    '''
+    pubsub = PostgresPubSub(engine, poll_interval=0.1)
+    received = []
+    try:
+        pubsub.subscribe("test_catalogue_cache", received.append)
+        checked_out = engine.pool.checkedout()
+        for message in ("a", "b"):
+            pubsub.publish("test_catalogue_cache", message)
+        wait_for(lambda: received == ["a", "b"])
+        publisher = pubsub._publish_connection
+        assert engine.pool.checkedout() == checked_out
+
+        with engine.connect() as connection:
+            for backend in (pubsub._listen_connection, publisher):
+                connection.execute(text("SELECT pg_terminate_backend(:pid)"), {"pid": backend.get_backend_pid()})
+        wait_for(lambda: MESSAGES_LOST in received, timeout=5)
+
+        pubsub.publish("test_catalogue_cache", "c")
+        wait_for(lambda: received[-1] == "c")
+        assert pubsub._publish_connection is not publisher
+    finally:
+        pubsub.close()
@@ -0,0 +1,122 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session
+
+import crud
+import models
+from database import engine
+
+
+def latest_watermark(client):
+    """
+    Пролистывает ленту изменений до конца и возвращает текущую отметку.
+    """
+    since = 0
+    while True:
+        page = client.get(f"/api/v1/changes?since={since}&limit=5000").json()
+        since = page["next_since"]
+        if not page["has_more"]:
+            return since
+
+
+def test_changes_since_watermark(client):
+    '''
+    Проверяет, что лента возвращает только изменения после отметки, включая удаления.
+    '''
+    menu_id = client.post("/api/v1/menus", json={"title": "Sync Menu", "description": "Sync"}).json()["id"]
+    submenu_id = client.post(f"/api/v1/menus/{menu_id}/submenus",
+                             json={"title": "Sync Submenu", "description": "Sync"}).json()["id"]
+    dish_id = client.post(f"/api/v1/menus/{menu_id}/submenus/{submenu_id}/dishes",
+                          json={"title": "Sync Dish", "description": "Sync", "price": "3.5"}).json()["id"]
+    watermark = latest_watermark(client)
+
+    client.patch(f"/api/v1/menus/{menu_id}/submenus/{submenu_id}/dishes/{dish_id}",
+                 json={"title": "Sync Dish", "description": "Sync", "price": "4.5"})
+
+    response = client.get(f"/api/v1/changes?since={watermark}")
+    assert response.status_code == 200
+    page = response.json()
+    assert [(change["entity"], change["op"], change["id"]) for change in page["changes"]] == [
+        ("dish", "upsert", dish_id),
+    ]
+    assert page["changes"][0]["data"]["price"] == "4.50"
+    assert page["next_since"] == page["changes"][-1]["seq"]
+    assert not page["has_more"]
+
+    client.delete(f"/api/v1/menus/{menu_id}/submenus/{submenu_id}")
+
+    page = client.get(f"/api/v1/changes?since={watermark}").json()
+    # Удаленные строки больше не возвращаются как upsert, остаются только надгробия
+    assert [(change["entity"], change["op"], change["id"]) for change in page["changes"]] == [
+        ("dish", "delete", dish_id),
+        ("submenu", "delete", submenu_id),
+    ]
+
+
+def test_changes_pagination(client):
+    '''
+    Проверяет постраничную выдачу: страницы не пересекаются и идут по возрастанию отметки.
+    '''
+    watermark = latest_watermark(client)
+    for i in range(3):
+        client.post("/api/v1/menus", json={"title": f"Page Menu {i}", "description": "Page"})
+
+    first = client.get(f"/api/v1/changes?since={watermark}&limit=2").json()
+    second = client.get(f"/api/v1/changes?since={first['next_since']}&limit=2").json()
+
+    assert first["has_more"]
+    assert not second["has_more"]
+    seqs = [change["seq"] for change in first["changes"] + second["changes"]]
+    assert len(seqs) == 3
+    assert seqs == sorted(seqs)
+
+
+def test_no_changes_keeps_watermark(client):
+    '''
+    Проверяет, что при отсутствии изменений отметка не меняется.
+    '''
+    watermark = latest_watermark(client)
+    page = client.get(f"/api/v1/changes?since={watermark}").json()
+    assert page == {"changes": [], "next_since": watermark, "has_more": False}
+
+
+@pytest.mark.skipif(engine.dialect.name != "postgresql", reason="параллельные транзакции проверяются на Postgres")
+def test_late_commit_is_not_skipped(tables):
+    '''
+    Проверяет, что изменение с меньшей отметкой, зафиксированное позже, не пропадает из ленты:
+    транзакция A получает отметку первой, B - второй и фиксируется раньше, а чтение ленты
+    между фиксациями дожидается A и возвращает оба изменения.
+    '''
+    with engine.connect() as connection:
+        since = models.committed_change_seq(connection)
+
+    def read_changes():
+        with Session(engine) as db:
+            return crud.get_changes(db, since=since)
+
+    first, second = engine.connect(), engine.connect()
+    try:
+        late = first.scalar(insert(models.Menu).values(title="Late", description="A")
+                            .returning(models.Menu.change_seq))
+        early = second.scalar(insert(models.Menu).values(title="Early", description="B")
+                              .returning(models.Menu.change_seq))
+        second.commit()
+        assert late < early
+
+        with ThreadPoolExecutor(1) as pool:
+            page = pool.submit(read_changes)
+            time.sleep(0.2)
+            assert not page.done()
+            first.commit()
+            page = page.result(timeout=5)
+
+        assert [change.seq for change in page.changes] == [late, early]
+        assert page.next_since == early
+    finally:
+        first.close()
+        second.close()
+        with engine.begin() as connection:
+            connection.execute(delete(models.Menu).where(models.Menu.title.in_(("Late", "Early"))))
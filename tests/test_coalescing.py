@@ -0,0 +1,139 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy import event
+
+import crud
+from coalescing import SingleFlight
+from database import SessionLocal, engine
+from models import Menu, SubMenu, Dish
+
+CALLERS = 10
+
+
+def run_concurrently(fn):
+    """
+    Запускает fn в CALLERS потоках одновременно и возвращает список результатов.
+    """
+    barrier = threading.Barrier(CALLERS)
+    results = [None] * CALLERS
+
+    def worker(index):
+        barrier.wait()
+        results[index] = fn()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@pytest.fixture
+def statement_counter():
+    """
+    Считает SQL-запросы, выполненные через движок приложения.
+    """
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        # SAVEPOINT тестовой транзакции не относятся к запросам приложения
+        if "SAVEPOINT" in statement:
+            return
+        statements.append(statement)
+        # Задержка гарантирует, что все вызовы успеют присоединиться к первому
+        time.sleep(0.05)
+
+    event.listen(engine, "before_cursor_execute", count)
+    yield statements
+    event.remove(engine, "before_cursor_execute", count)
+
+
+def call_with_session(fn):
+    db = SessionLocal()
+    try:
+        return fn(db)
+    finally:
+        db.close()
+
+
+def test_concurrent_calls_share_one_execution():
+    '''
+    Проверяет, что одновременные вызовы с одним ключом выполняют функцию один раз.
+    '''
+    flight = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+
+    results = run_concurrently(lambda: flight.do("key", slow))
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_errors_are_shared_and_not_cached():
+    '''
+    Проверяет, что исключение передается всем ожидающим, а следующий вызов выполняется заново.
+    '''
+    flight = SingleFlight()
+
+    def failing():
+        time.sleep(0.05)
+        raise ValueError("boom")
+
+    def call():
+        try:
+            flight.do("key", failing)
+        except ValueError as error:
+            return error
+
+    errors = run_concurrently(call)
+    assert all(isinstance(error, ValueError) for error in errors)
+    assert flight.do("key", lambda: 42) == 42
+
+
+def test_concurrent_get_menu_runs_one_query(db_session, create_test_menu, statement_counter):
+    '''
+    Проверяет, что N одновременных чтений одного меню выполняют один SQL-запрос.
+    '''
+    flight = SingleFlight()
+    menu_id = create_test_menu.id
+    statement_counter.clear()
+
+    results = run_concurrently(
+        lambda: flight.do(("read_menu", menu_id), lambda: call_with_session(lambda db: crud.get_menu(db, menu_id)))
+    )
+
+    assert len(statement_counter) == 1
+    assert all(result["id"] == menu_id for result in results)
+
+
+def test_concurrent_get_dishes_runs_one_query(db_session, statement_counter):
+    '''
+    Проверяет, что N одновременных чтений блюд одного подменю выполняют один SQL-запрос.
+    '''
+    menu = Menu(title="Lunch", description="Lunch menu")
+    db_session.add(menu)
+    db_session.commit()
+    submenu = SubMenu(title="Soups", description="Soups", menu_id=menu.id)
+    db_session.add(submenu)
+    db_session.commit()
+    db_session.add(Dish(title="Borsch", description="Hot", price="5.5", submenu_id=submenu.id))
+    db_session.commit()
+    menu_id, submenu_id = menu.id, submenu.id
+    statement_counter.clear()
+
+    flight = SingleFlight()
+    key = ("read_dishes", menu_id, submenu_id)
+    results = run_concurrently(
+        lambda: flight.do(key, lambda: call_with_session(
+            lambda db: crud.get_dishes_by_submenu(db, menu_id=menu_id, submenu_id=submenu_id)))
+    )
+
+    assert len(statement_counter) == 1
+    assert all(len(result) == 1 for result in results)
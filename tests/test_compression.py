@@ -0,0 +1,93 @@
+import gzip
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from middleware import CompressionMiddleware, parse_accept_encoding
+
+LARGE_BODY = "menu " * 1000
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware, minimum_size=500)
+
+
+@app.get("/large")
+def large():
+    return PlainTextResponse(LARGE_BODY)
+
+
+@app.get("/small")
+def small():
+    return PlainTextResponse("ok")
+
+
+@app.get("/stream")
+def stream():
+    def chunks():
+        for _ in range(10):
+            yield "dish " * 100
+
+    return StreamingResponse(chunks(), media_type="text/plain")
+
+
+client = TestClient(app)
+
+
+def test_large_response_is_gzipped():
+    '''
+    Проверяет, что большой ответ сжимается gzip, если клиент не принимает brotli.
+    '''
+    response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.text == LARGE_BODY
+
+
+def test_small_response_is_not_compressed():
+    '''
+    Проверяет, что ответы меньше порога отправляются без сжатия.
+    '''
+    response = client.get("/small", headers={"Accept-Encoding": "gzip, br"})
+    assert "content-encoding" not in response.headers
+    assert response.text == "ok"
+
+
+def test_streaming_response_is_compressed():
+    '''
+    Проверяет, что потоковый ответ сжимается целиком и корректно распаковывается.
+    '''
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.text == "dish " * 1000
+
+
+def test_identity_when_client_does_not_accept_compression():
+    '''
+    Проверяет, что без подходящего Accept-Encoding ответ не сжимается.
+    '''
+    response = client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.text == LARGE_BODY
+
+
+def test_brotli_preferred_when_available():
+    '''
+    Проверяет, что brotli выбирается, если клиент его принимает и библиотека установлена.
+    '''
+    brotli = pytest.importorskip("brotli")
+    with client.stream("GET", "/large", headers={"Accept-Encoding": "gzip, br"}) as response:
+        raw = b"".join(response.iter_raw())
+    assert response.headers["content-encoding"] == "br"
+    assert brotli.decompress(raw).decode() == LARGE_BODY
+    assert len(raw) < len(gzip.compress(LARGE_BODY.encode()))
+
+
+def test_parse_accept_encoding():
+    '''
+    Проверяет разбор весов и исключение кодировок с q=0.
+    '''
+    assert parse_accept_encoding("gzip;q=0.5, br, deflate;q=0") == {"gzip": 0.5, "br": 1.0}
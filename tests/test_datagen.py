@@ -0,0 +1,50 @@
+from sqlalchemy import func, select
+
+import datagen
+from models import Dish, Menu, SubMenu
+
+SPEC = datagen.DatasetSpec(dishes=500, seed=42, batch=100)
+
+
+def catalogue(connection):
+    return connection.execute(select(Dish.id, Dish.menu_id, Dish.title, Dish.price).order_by(Dish.id)).all()
+
+
+def test_generates_exact_number_of_dishes(connection):
+    '''
+    Проверяет, что генератор создает ровно заданное число блюд и согласованные счетчики.
+    '''
+    dataset = datagen.generate(connection, SPEC)
+
+    assert dataset.dishes == connection.scalar(select(func.count()).select_from(Dish)) == SPEC.dishes
+    assert dataset.menus == connection.scalar(select(func.count()).select_from(Menu))
+    assert dataset.submenus == connection.scalar(select(func.count()).select_from(SubMenu))
+    assert dataset.largest_menu is not None and dataset.samples
+
+
+def test_same_seed_gives_same_data(connection):
+    '''
+    Проверяет, что одинаковое зерно дает одинаковые данные, включая идентификаторы.
+    '''
+    first = datagen.generate(connection, SPEC)
+    rows = catalogue(connection)
+    datagen.clear(connection)
+    second = datagen.generate(connection, SPEC)
+
+    assert catalogue(connection) == rows
+    assert first.samples == second.samples
+
+
+def test_titles_are_unique_within_submenu(connection):
+    '''
+    Проверяет, что названия блюд не повторяются внутри подменю и цены лежат в заданном диапазоне.
+    '''
+    datagen.generate(connection, SPEC)
+
+    duplicates = connection.execute(
+        select(Dish.submenu_id, Dish.title).group_by(Dish.submenu_id, Dish.title).having(func.count() > 1)
+    ).all()
+    prices = connection.scalars(select(Dish.price)).all()
+
+    assert duplicates == []
+    assert all(SPEC.price_min <= float(price) <= SPEC.price_max for price in prices)
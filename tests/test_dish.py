@@ -1,10 +1,5 @@
-from fastapi.testclient import TestClient
-
-from main import app
 from models import Menu, SubMenu, Dish
 
-client = TestClient(app)
-
 
 def test_create_dish(db_session, client):
     '''
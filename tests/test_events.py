@@ -0,0 +1,190 @@
+import asyncio
+import json
+from uuid import uuid4
+
+import crud
+import events
+import schemas
+from database import SessionLocal
+from events import DISCONNECT, EventBroker, RESYNC
+from pubsub import MESSAGES_LOST, LocalPubSub
+
+
+class ConnectedRequest:
+    async def is_disconnected(self):
+        return False
+
+
+def test_events_are_delivered_to_menu_subscribers_only():
+    '''
+    Проверяет, что событие получают только подписчики своего меню.
+    '''
+
+    async def scenario():
+        broker = EventBroker(LocalPubSub())
+        menu_id, other_menu_id = uuid4(), uuid4()
+        subscription = broker.subscribe(menu_id)
+        other = broker.subscribe(other_menu_id)
+        broker.publish(menu_id, {"entity": "dish", "op": "create", "id": uuid4()})
+        event = await subscription.get(1)
+        return event, await other.get(0.01)
+
+    event, other_event = asyncio.run(scenario())
+    assert event["entity"] == "dish"
+    assert other_event is None
+
+
+def test_channel_carries_ids_and_broker_loads_data():
+    '''
+    Проверяет, что в канал уходят только идентификаторы, а данные строки брокер читает сам
+    и только для меню с подписчиками.
+    '''
+    pubsub, messages, loads = LocalPubSub(), [], []
+    pubsub.subscribe("catalogue_events", messages.append)
+
+    def load(entity, entity_id, menu_id):
+        loads.append(entity_id)
+        return {"title": "x" * 10000}
+
+    async def scenario():
+        broker = EventBroker(pubsub, load=load)
+        menu_id, dish_id = uuid4(), uuid4()
+        broker.publish(uuid4(), {"entity": "dish", "op": "update", "id": uuid4(), "seq": 1})
+        subscription = broker.subscribe(menu_id)
+        broker.publish(menu_id, {"entity": "dish", "op": "update", "id": dish_id, "seq": 2})
+        broker.publish(menu_id, {"entity": "dish", "op": "delete", "id": dish_id})
+        return dish_id, await subscription.get(1), await subscription.get(1)
+
+    dish_id, updated, deleted = asyncio.run(scenario())
+    assert all(len(message) < 200 and "data" not in json.loads(message) for message in messages)
+    assert loads == [dish_id]
+    assert len(updated["data"]["title"]) == 10000
+    assert "data" not in deleted
+
+
+def test_lost_messages_resync_all_subscribers():
+    '''
+    Проверяет, что после потери сообщений транспортом каждый подписчик получает resync.
+    '''
+
+    async def scenario():
+        pubsub = LocalPubSub()
+        broker = EventBroker(pubsub)
+        subscriptions = [broker.subscribe(uuid4()) for _ in range(2)]
+        pubsub.publish(broker.channel, MESSAGES_LOST)
+        return [await subscription.get(1) for subscription in subscriptions], subscriptions
+
+    received, subscriptions = asyncio.run(scenario())
+    assert [event["type"] for event in received] == [RESYNC, RESYNC]
+    assert [event["menu_id"] for event in received] == [str(item.menu_id) for item in subscriptions]
+
+
+def test_slow_consumer_gets_resync():
+    '''
+    Проверяет, что при переполнении буфера события заменяются одним событием resync.
+    '''
+
+    async def scenario():
+        broker = EventBroker(LocalPubSub(), buffer_size=2, overflow=RESYNC)
+        menu_id = uuid4()
+        subscription = broker.subscribe(menu_id)
+        for _ in range(5):
+            broker.publish(menu_id, {"entity": "dish", "op": "update", "id": uuid4()})
+        await asyncio.sleep(0)
+        received = []
+        while True:
+            event = await subscription.get(0.01)
+            if event is None:
+                return received
+            received.append(event)
+
+    received = asyncio.run(scenario())
+    assert received[0]["type"] == RESYNC
+    assert len(received) <= 2
+
+
+def test_slow_consumer_is_disconnected():
+    '''
+    Проверяет политику отключения медленного клиента.
+    '''
+
+    async def scenario():
+        broker = EventBroker(LocalPubSub(), buffer_size=1, overflow=DISCONNECT)
+        menu_id = uuid4()
+        subscription = broker.subscribe(menu_id)
+        for _ in range(2):
+            broker.publish(menu_id, {"entity": "dish", "op": "update", "id": uuid4()})
+        await asyncio.sleep(0)
+        return await subscription.get(0.01)
+
+    assert asyncio.run(scenario()) is events._CLOSE
+
+
+def test_crud_write_publishes_event(create_test_menu):
+    '''
+    Проверяет, что создание подменю через crud публикует событие в поток меню.
+    '''
+    menu_id = create_test_menu.id
+
+    def create_submenu():
+        with SessionLocal() as db:
+            return crud.create_submenu(db, schemas.SubMenuCreate(title="Live", description="Live"), menu_id)
+
+    async def scenario():
+        stream = events.stream(menu_id, ConnectedRequest(), heartbeat=1)
+        assert await stream.__anext__() == "retry: 3000\n\n"
+        pending = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        submenu = await asyncio.to_thread(create_submenu)
+        frame = await asyncio.wait_for(pending, 2)
+        await stream.aclose()
+        return submenu, frame
+
+    submenu, frame = asyncio.run(scenario())
+    lines = frame.strip().split("\n")
+    assert lines[1] == "event: change"
+    payload = json.loads(lines[2][len("data: "):])
+    assert payload["op"] == "create"
+    assert payload["entity"] == "submenu"
+    assert payload["id"] == str(submenu.id)
+    assert payload["data"]["title"] == "Live"
+    assert lines[0] == f"id: {payload['seq']}"
+    assert events.broker.subscriber_count(menu_id) == 0
+
+
+def test_dish_update_over_api_carries_new_price(client, create_test_menu):
+    '''
+    Проверяет, что событие изменения блюда через API несет данные блюда с новой ценой.
+    '''
+    menu_id = create_test_menu.id
+    submenu_id = client.post(f"/api/v1/menus/{menu_id}/submenus",
+                             json={"title": "Live", "description": "Live"}).json()["id"]
+    dish_url = f"/api/v1/menus/{menu_id}/submenus/{submenu_id}/dishes"
+    dish_id = client.post(dish_url, json={"title": "Live", "description": "Live", "price": "5"}).json()["id"]
+
+    def update_price():
+        return client.patch(f"{dish_url}/{dish_id}", json={"title": "Live", "description": "Live", "price": "7.25"})
+
+    async def scenario():
+        stream = events.stream(menu_id, ConnectedRequest(), heartbeat=1)
+        assert await stream.__anext__() == "retry: 3000\n\n"
+        pending = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        response = await asyncio.to_thread(update_price)
+        frame = await asyncio.wait_for(pending, 2)
+        await stream.aclose()
+        return response, frame
+
+    response, frame = asyncio.run(scenario())
+    assert response.status_code == 200
+    payload = json.loads(frame.strip().split("\n")[2][len("data: "):])
+    assert (payload["entity"], payload["op"], payload["id"]) == ("dish", "update", dish_id)
+    assert payload["data"]["price"] == "7.25"
+
+
+def test_events_for_unknown_menu_returns_404(client):
+    '''
+    Проверяет, что подписка на несуществующее меню возвращает 404.
+    '''
+    response = client.get(f"/api/v1/menus/{uuid4()}/events")
+    assert response.status_code == 404
@@ -0,0 +1,91 @@
+import msgpack
+import pytest
+from sqlalchemy import event
+
+from database import engine
+from models import Dish, SubMenu
+
+
+@pytest.fixture
+def submenu(db_session, create_test_menu):
+    submenu = SubMenu(title="Sparse", description="Sparse", menu_id=create_test_menu.id)
+    db_session.add(submenu)
+    db_session.commit()
+    db_session.add_all([
+        Dish(title=f"Sparse {i}", description="Long text " * 50, price="7.5", submenu_id=submenu.id) for i in range(2)
+    ])
+    db_session.commit()
+    return submenu
+
+
+@pytest.fixture
+def statements():
+    """
+    Собирает SQL, выполненный приложением во время теста.
+    """
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement.lower())
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def test_menus_without_counts_skip_count_joins(client, submenu, statements):
+    '''
+    Проверяет, что fields=id,title отдает только эти поля и не считает подменю и блюда.
+    '''
+    response = client.get("/api/v1/menus", params={"fields": "id,title"})
+
+    assert response.status_code == 200
+    assert all(set(menu) == {"id", "title"} for menu in response.json())
+    selects = [statement for statement in statements if statement.lstrip().startswith("select")]
+    assert selects and not any("count(" in statement or "description" in statement for statement in selects)
+
+
+def test_menus_with_requested_count(client, submenu):
+    '''
+    Проверяет, что запрошенный счетчик считается, а остальные поля не отдаются.
+    '''
+    response = client.get("/api/v1/menus", params={"fields": "dishes_count,id"})
+
+    menus = {menu["id"]: menu for menu in response.json()}
+    assert menus[str(submenu.menu_id)] == {"id": str(submenu.menu_id), "dishes_count": 2}
+
+
+def test_dishes_fields(client, submenu, statements):
+    '''
+    Проверяет выборочные поля блюд: описание не читается из БД, цена форматируется как обычно.
+    '''
+    url = f"/api/v1/menus/{submenu.menu_id}/submenus/{submenu.id}/dishes"
+
+    response = client.get(url, params={"fields": "id,price"})
+
+    assert response.status_code == 200
+    assert [set(dish) for dish in response.json()] == [{"id", "price"}] * 2
+    assert {dish["price"] for dish in response.json()} == {"7.50"}
+    dish_queries = [statement for statement in statements if "from dishes" in statement]
+    assert dish_queries and not any("description" in statement for statement in dish_queries)
+
+    packed = client.get(url, params={"fields": "title"}, headers={"Accept": "application/msgpack"})
+    assert sorted(msgpack.unpackb(packed.content), key=lambda dish: dish["title"]) == [
+        {"title": "Sparse 0"}, {"title": "Sparse 1"}]
+
+
+def test_full_fieldset_matches_default(client, submenu):
+    '''
+    Проверяет, что перечисление всех полей дает тот же ответ, что и запрос без fields.
+    '''
+    url = f"/api/v1/menus/{submenu.menu_id}/submenus/{submenu.id}/dishes"
+
+    assert client.get(url, params={"fields": "price,id,title,description"}).json() == client.get(url).json()
+
+
+@pytest.mark.parametrize("fields", ["", "id,secret", ","])
+def test_invalid_fields(client, fields):
+    '''
+    Проверяет, что пустой список полей и неизвестное поле дают 400.
+    '''
+    assert client.get("/api/v1/menus", params={"fields": fields}).status_code == 400
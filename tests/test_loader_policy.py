@@ -0,0 +1,65 @@
+import pytest
+from sqlalchemy.exc import InvalidRequestError
+
+import crud
+from database import SessionLocal, get_db
+from models import Dish, Menu, SubMenu
+
+
+@pytest.fixture
+def request_db(db_session):
+    """
+    Сессия, созданная так же, как для обработчика запроса.
+    """
+    dependency = get_db()
+    db = next(dependency)
+    yield db
+    dependency.close()
+
+
+@pytest.fixture
+def menu_tree(db_session):
+    menu = Menu(title="Tree", description="Tree")
+    db_session.add(menu)
+    db_session.flush()
+    submenu = SubMenu(title="Tree", description="Tree", menu_id=menu.id)
+    db_session.add(submenu)
+    db_session.flush()
+    db_session.add_all([
+        Dish(title="First", description="Tree", price="1", submenu_id=submenu.id),
+        Dish(title="Second", description="Tree", price="2", submenu_id=submenu.id),
+    ])
+    db_session.commit()
+    return menu.id, submenu.id
+
+
+def test_lazy_load_raises_in_request_session(request_db, menu_tree):
+    '''
+    Проверяет, что обращение к незагруженной связи в сессии запроса вызывает ошибку.
+    '''
+    menu_id, _ = menu_tree
+    menu = request_db.get(Menu, menu_id)
+
+    with pytest.raises(InvalidRequestError):
+        menu.submenus
+
+
+def test_lazy_load_allowed_outside_requests(db_session, menu_tree):
+    '''
+    Проверяет, что сессии вне обработчиков запросов (скрипты, тесты) загружают связи как раньше.
+    '''
+    menu_id, _ = menu_tree
+    with SessionLocal() as db:
+        assert len(db.get(Menu, menu_id).submenus[0].dishes) == 2
+
+
+def test_cascade_deletes_load_relationships_explicitly(request_db, menu_tree):
+    '''
+    Проверяет, что каскадное удаление меню и подменю работает в сессии запроса.
+    '''
+    menu_id, submenu_id = menu_tree
+
+    assert crud.delete_submenu(request_db, menu_id, submenu_id)
+    assert crud.delete_menu(request_db, menu_id)
+    assert request_db.get(Menu, menu_id) is None
+    assert request_db.query(Dish).filter(Dish.submenu_id == submenu_id).count() == 0
@@ -1,16 +1,12 @@
 from uuid import uuid4
 
 import pytest
-from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 
-from main import app
 from models import Menu, SubMenu, Dish
 
-client = TestClient(app)
 
-
-def test_get_menu_not_found():
+def test_get_menu_not_found(client):
     '''
     Проверяет, что при запросе несуществующего меню API возвращает статус код 404.
     '''
@@ -19,7 +15,7 @@ def test_get_menu_not_found():
     assert response.status_code == 404
 
 
-def test_get_menu(db_session, create_test_menu):
+def test_get_menu(client, create_test_menu):
     '''
     Проверяет, что при запросе существующего меню API возвращает статус код 200 и содержит информацию о меню.
     '''
@@ -29,7 +25,7 @@ def test_get_menu(db_session, create_test_menu):
     assert response.json()["id"] == str(test_menu.id)
 
 
-def test_get_menus_pagination():
+def test_get_menus_pagination(client):
     '''
     Проверяет работу пагинации, убеждаясь, что количество элементов в ответе соответствует указанному лимиту.
     '''
@@ -38,7 +34,7 @@ def test_get_menus_pagination():
     assert len(response.json()) <= 10
 
 
-def test_create_menu():
+def test_create_menu(client):
     '''
     Проверяет, что создание нового меню работает корректно и возвращает идентификатор нового меню.
     '''
@@ -72,7 +68,7 @@ def test_update_menu(db_session, client):
     assert db_updated_menu.description == "Updated Description"
 
 
-def test_delete_menu(create_test_menu):
+def test_delete_menu(client, create_test_menu):
     '''
     Проверяет, что удаление меню работает корректно и возвращает статус 200 при успешном удалении.
     '''
@@ -111,7 +107,7 @@ def test_data(db_session: Session):
     }
 
 
-def test_read_menu_details(test_data):
+def test_read_menu_details(client, test_data):
     """
     Тестирует получение детальной информации о меню, включая количество подменю и блюд.
     """
@@ -125,10 +121,22 @@ def test_read_menu_details(test_data):
     assert data["dishes_count"] == test_data["dishes_count"]
 
 
-def test_read_menu_details_not_found():
+def test_read_menu_details_not_found(client):
     """
     Проверяет, что запрос деталей несуществующего меню возвращает статус 404.
     """
     response = client.get(f"/api/v1/menus/{uuid4()}/details")
 
     assert response.status_code == 404
+
+
+def test_read_menus_counts(client, test_data):
+    """
+    Тестирует, что в списке меню количество подменю не умножается на количество блюд.
+    """
+    response = client.get("/api/v1/menus?limit=1000")
+
+    assert response.status_code == 200
+    menu = next(item for item in response.json() if item["id"] == str(test_data["menu_id"]))
+    assert menu["submenus_count"] == test_data["submenus_count"]
+    assert menu["dishes_count"] == test_data["dishes_count"]
@@ -0,0 +1,84 @@
+import msgpack
+import pytest
+
+from models import Dish, SubMenu
+from negotiation import MSGPACK, prefers_msgpack
+
+MSGPACK_HEADERS = {"Accept": MSGPACK}
+
+
+@pytest.fixture
+def submenu(db_session, create_test_menu):
+    submenu = SubMenu(title="Packed", description="Packed", menu_id=create_test_menu.id)
+    db_session.add(submenu)
+    db_session.commit()
+    db_session.add_all([
+        Dish(title=f"Packed {i}", description="Packed", price="1.50", submenu_id=submenu.id) for i in range(3)
+    ])
+    db_session.commit()
+    return submenu
+
+
+@pytest.mark.parametrize("accept, expected", [
+    ("application/msgpack", True),
+    ("application/x-msgpack", True),
+    ("application/msgpack, application/json;q=0.5", True),
+    ("application/json, application/msgpack;q=0.5", False),
+    ("application/msgpack, */*", True),
+    ("application/msgpack, application/json", False),
+    ("application/msgpack, */*;q=0.1", True),
+    ("application/msgpack;q=0", False),
+    ("*/*", False),
+    ("", False),
+])
+def test_prefers_msgpack(accept, expected):
+    '''
+    Проверяет выбор формата ответа по Accept: JSON остается по умолчанию и при равном весе с msgpack.
+    '''
+    assert prefers_msgpack(accept) is expected
+
+
+def test_list_responses_in_msgpack(client, submenu):
+    '''
+    Проверяет, что списки меню, подменю и блюд отдаются в MessagePack с той же схемой, что и в JSON.
+    '''
+    for url in ("/api/v1/menus",
+                f"/api/v1/menus/{submenu.menu_id}/submenus",
+                f"/api/v1/menus/{submenu.menu_id}/submenus/{submenu.id}/dishes"):
+        as_json = client.get(url)
+        as_msgpack = client.get(url, headers=MSGPACK_HEADERS)
+
+        assert as_json.headers["content-type"] == "application/json"
+        assert as_msgpack.headers["content-type"] == MSGPACK
+        assert "Accept" in as_msgpack.headers["vary"]
+        assert msgpack.unpackb(as_msgpack.content) == as_json.json()
+
+
+def test_create_and_update_with_msgpack_body(client, submenu):
+    '''
+    Проверяет, что POST и PATCH принимают тело в MessagePack.
+    '''
+    url = f"/api/v1/menus/{submenu.menu_id}/submenus/{submenu.id}/dishes"
+    body = msgpack.packb({"title": "Binary", "description": "Binary", "price": "2.50"})
+
+    response = client.post(url, content=body, headers={"Content-Type": MSGPACK, **MSGPACK_HEADERS})
+
+    assert response.status_code == 201
+    created = msgpack.unpackb(response.content)
+    assert created["title"] == "Binary"
+
+    body = msgpack.packb({"title": "Binary", "description": "Binary", "price": "3.00"})
+    response = client.patch(f"{url}/{created['id']}", content=body, headers={"Content-Type": MSGPACK})
+
+    assert response.status_code == 200
+    assert response.json()["price"] == "3.00"
+
+
+def test_invalid_msgpack_body(client, create_test_menu):
+    '''
+    Проверяет, что неразборчивое тело MessagePack дает 400, а тело не той схемы - 422.
+    '''
+    headers = {"Content-Type": MSGPACK}
+
+    assert client.post("/api/v1/menus", content=b"\xc1", headers=headers).status_code == 400
+    assert client.post("/api/v1/menus", content=msgpack.packb({"title": 1}), headers=headers).status_code == 422
@@ -0,0 +1,73 @@
+import re
+
+import pytest
+from sqlalchemy import text
+
+import crud
+import schemas
+from database import engine
+from models import DISH_PARTITIONS, Dish, Menu, SubMenu
+
+postgres_only = pytest.mark.skipif(engine.dialect.name != "postgresql", reason="секционирование есть только в Postgres")
+
+
+@pytest.fixture
+def submenu(db_session):
+    menu = Menu(title="Partitioned", description="Partitioned")
+    db_session.add(menu)
+    db_session.flush()
+    submenu = SubMenu(title="Partitioned", description="Partitioned", menu_id=menu.id)
+    db_session.add(submenu)
+    db_session.commit()
+    return submenu
+
+
+def explain(db_session, statement, params):
+    sql = statement.params(params).compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+    return "\n".join(db_session.execute(text(f"EXPLAIN {sql}")).scalars())
+
+
+def test_dish_takes_menu_id_from_submenu(db_session, submenu):
+    '''
+    Проверяет, что блюдо, созданное без menu_id, получает ключ секционирования из подменю.
+    '''
+    dish = Dish(title="Keyless", description="Partitioned", price="1", submenu_id=submenu.id)
+    db_session.add(dish)
+    db_session.commit()
+
+    assert dish.menu_id == submenu.menu_id
+
+
+def test_crud_sets_menu_id(db_session, submenu):
+    '''
+    Проверяет, что create_dish записывает menu_id, даже если меню не передано.
+    '''
+    dish = crud.create_dish(db_session, schemas.DishCreate(title="Created", description="Partitioned", price="1"),
+                            submenu_id=submenu.id)
+
+    assert dish.menu_id == submenu.menu_id
+
+
+@postgres_only
+def test_dishes_table_is_partitioned(db_session):
+    '''
+    Проверяет, что таблица блюд создается секционированной по хешу menu_id.
+    '''
+    partitions = db_session.execute(text(
+        "SELECT count(*) FROM pg_inherits WHERE inhparent = 'dishes'::regclass"
+    )).scalar()
+
+    assert partitions == DISH_PARTITIONS
+
+
+@postgres_only
+def test_dish_queries_prune_partitions(db_session, submenu):
+    '''
+    Проверяет, что запросы crud.py к блюдам читают одну секцию.
+    '''
+    params = {"menu_id": submenu.menu_id, "submenu_id": submenu.id, "dish_id": submenu.id}
+
+    for statement in (crud._DISHES_IN_SUBMENU, crud._DISH_IN_SUBMENU, crud._MENU_WITH_COUNTS,
+                      crud._SUBMENU_WITH_COUNT):
+        plan = explain(db_session, statement, params)
+        assert len(set(re.findall(r"dishes_p(\d+)", plan))) == 1
@@ -0,0 +1,101 @@
+"""
+Нагрузочные тесты функций crud.py на синтетических наборах datagen.py.
+
+Запускаются только при заданном PERF_DISHES (размеры наборов через запятую):
+    PERF_DISHES=10000,100000,1000000 pytest tests/test_perf.py -s
+
+Каждый набор создается один раз на модуль в транзакции, которая откатывается в конце.
+Каждая функция вызывается PERF_ROUNDS раз, записи откатываются после каждого вызова.
+Лучшее время вызова сравнивается с бюджетом PERF_BUDGET_MS.
+"""
+import os
+import time
+
+import pytest
+from sqlalchemy.orm import Session
+
+import crud
+import datagen
+import schemas
+
+SIZES = [int(size) for size in os.getenv("PERF_DISHES", "").split(",") if size.strip()]
+BUDGET_MS = float(os.getenv("PERF_BUDGET_MS", "1000"))
+ROUNDS = int(os.getenv("PERF_ROUNDS", "5"))
+
+pytestmark = pytest.mark.skipif(not SIZES, reason="PERF_DISHES не задан")
+
+MENU = schemas.MenuCreate(title="Perf", description="Perf")
+SUBMENU = schemas.SubMenuCreate(title="Perf", description="Perf")
+DISH = schemas.DishCreate(title="Perf", description="Perf", price="99.90")
+
+# Чтения вызываются без кэша, чтобы мерить запросы к БД
+CASES = {
+    "get_menu": lambda db, data: crud.get_menu.__wrapped__(db, data.largest_menu),
+    "get_menus": lambda db, data: crud.get_menus.__wrapped__(db, limit=100),
+    "get_menu_with_counts": lambda db, data: crud.get_menu_with_counts.__wrapped__(db, data.largest_menu),
+    "get_specific_submenu": lambda db, data: crud.get_specific_submenu.__wrapped__(db, *data.largest_submenu),
+    "get_submenus_by_menu": lambda db, data: crud.get_submenus_by_menu.__wrapped__(db, data.largest_menu),
+    "get_dishes_by_submenu": lambda db, data: crud.get_dishes_by_submenu.__wrapped__(db, *data.largest_submenu),
+    "get_specific_dish": lambda db, data: crud.get_specific_dish.__wrapped__(db, *data.samples[0]),
+    "get_changes": lambda db, data: crud.get_changes(db, since=0, limit=500),
+    "create_menu": lambda db, data: crud.create_menu(db, MENU),
+    "update_menu": lambda db, data: crud.update_menu(db, data.largest_menu, MENU),
+    "delete_menu": lambda db, data: crud.delete_menu(db, data.largest_menu),
+    "create_submenu": lambda db, data: crud.create_submenu(db, SUBMENU, data.largest_menu),
+    "update_submenu": lambda db, data: crud.update_submenu(db, *data.largest_submenu, SUBMENU),
+    "delete_submenu": lambda db, data: crud.delete_submenu(db, *data.largest_submenu),
+    "create_dish": lambda db, data: crud.create_dish(db, DISH, data.largest_submenu[1], data.largest_submenu[0]),
+    "create_dishes": lambda db, data: crud.create_dishes(db, [
+        (schemas.DishCreate(title=f"Perf {i}", description="Perf", price="1.00"), submenu_id, menu_id)
+        for i, (menu_id, submenu_id, _) in enumerate(data.samples)
+    ]),
+    "update_dish": lambda db, data: crud.update_dish(db, data.samples[0][2], DISH, menu_id=data.samples[0][0]),
+    "delete_dish": lambda db, data: crud.delete_dish(db, data.samples[0][2], menu_id=data.samples[0][0]),
+}
+
+# Каскадные удаления загружают все дочерние строки в сессию ради надгробий и событий,
+# поэтому их время растет с размером меню; тест оставлен как индикатор
+CASCADES = {"delete_menu", "delete_submenu"}
+
+
+@pytest.fixture(scope="module", params=SIZES or [0], ids=lambda size: f"{size}_dishes")
+def dataset(request, engine, tables):
+    """
+    Создает набор данных заданного размера в транзакции, которая откатывается после модуля.
+    """
+    connection = engine.connect()
+    transaction = connection.begin()
+    data = datagen.generate(connection, datagen.DatasetSpec(dishes=request.param))
+    print(f"\n{data.summary()}")
+    yield connection, data
+    transaction.rollback()
+    connection.close()
+
+
+def best_ms(connection, data, fn) -> float:
+    timings = []
+    for _ in range(ROUNDS):
+        savepoint = connection.begin_nested()
+        with Session(bind=connection, join_transaction_mode="create_savepoint", expire_on_commit=False) as db:
+            started = time.perf_counter()
+            fn(db, data)
+            timings.append(time.perf_counter() - started)
+        savepoint.rollback()
+    return min(timings) * 1000
+
+
+@pytest.mark.parametrize("name", [
+    pytest.param(name, marks=pytest.mark.xfail(reason="каскад через ORM")) if name in CASCADES else name
+    for name in CASES
+])
+def test_crud_function_within_budget(dataset, name, record_property):
+    '''
+    Проверяет, что функция crud.py укладывается в бюджет времени на большом наборе данных.
+    '''
+    connection, data = dataset
+
+    elapsed = best_ms(connection, data, CASES[name])
+
+    record_property("best_ms", round(elapsed, 3))
+    print(f"  {name:<24} {elapsed:10.2f} ms")
+    assert elapsed < BUDGET_MS, f"{name}: {elapsed:.1f} ms on {data.dishes} dishes"
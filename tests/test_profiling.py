@@ -0,0 +1,107 @@
+import json
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import crud
+from database import SessionLocal, engine
+from profiling import ProfilingMiddleware, _SqlRecorder, sign_token, verify_token
+
+SECRET = "profiling-secret"
+
+
+def make_app(output_dir):
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware, engine=engine, secret=SECRET, output_dir=str(output_dir),
+                       interval=0.001)
+
+    @app.get("/menus")
+    def slow_menus():
+        with SessionLocal() as db:
+            menus = crud.get_menus(db)
+        time.sleep(0.05)
+        return menus
+
+    @app.get("/busy")
+    async def busy_loop():
+        # Асинхронный обработчик занимает цикл событий, не отдавая управление
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+        return {}
+
+    return app
+
+
+def test_token_signature_and_expiry():
+    '''
+    Проверяет, что принимаются только подписанные секретом и не просроченные токены.
+    '''
+    token = sign_token(SECRET, ttl=60)
+
+    assert verify_token(SECRET, token)
+    assert not verify_token("other-secret", token)
+    assert not verify_token(SECRET, token[:-1] + ("1" if token.endswith("0") else "0"))
+    assert not verify_token(SECRET, token, now=time.time() + 120)
+    assert not verify_token("", token)
+    assert not verify_token(SECRET, "garbage")
+
+
+def test_request_without_header_is_not_profiled(db_session, tmp_path):
+    '''
+    Проверяет, что запрос без заголовка не профилируется и не подключает обработчики SQL.
+    '''
+    client = TestClient(make_app(tmp_path))
+    attached = []
+    statements = []
+
+    def spy(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+        attached.append(event.contains(engine, "before_cursor_execute", _SqlRecorder._before))
+
+    event.listen(engine, "before_cursor_execute", spy)
+    try:
+        response = client.get("/menus")
+    finally:
+        event.remove(engine, "before_cursor_execute", spy)
+
+    assert response.status_code == 200
+    assert statements and not any(attached)
+    assert "x-profile-id" not in response.headers
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_signed_request_writes_stacks_and_sql(db_session, tmp_path):
+    '''
+    Проверяет, что запрос с подписанным заголовком пишет стеки в формате folded и SQL с таймингами.
+    '''
+    client = TestClient(make_app(tmp_path))
+
+    response = client.get("/menus", headers={"X-Profile": sign_token(SECRET)})
+
+    assert response.status_code == 200
+    profile_id = response.headers["x-profile-id"]
+    folded = (tmp_path / f"{profile_id}.folded").read_text()
+    assert "slow_menus (test_profiling.py" in folded
+    stack, count = folded.splitlines()[0].rsplit(" ", 1)
+    assert int(count) > 0
+
+    report = json.loads((tmp_path / f"{profile_id}.sql.json").read_text())
+    assert report["path"] == "/menus"
+    assert any("FROM menus" in item["statement"] for item in report["statements"])
+    assert all(item["duration_ms"] >= 0 for item in report["statements"])
+    assert not event.contains(engine, "before_cursor_execute", _SqlRecorder._before)
+
+
+def test_async_handler_is_sampled(tmp_path):
+    '''
+    Проверяет, что асинхронный обработчик, выполняющийся в цикле событий, тоже попадает в стеки.
+    '''
+    client = TestClient(make_app(tmp_path))
+
+    response = client.get("/busy", headers={"X-Profile": sign_token(SECRET)})
+
+    folded = (tmp_path / f"{response.headers['x-profile-id']}.folded").read_text()
+    assert "busy_loop (test_profiling.py" in folded
@@ -0,0 +1,72 @@
+import logging
+
+import pytest
+
+import crud
+import schemas
+from database import SessionLocal, SlowQueryLog, engine
+
+
+@pytest.fixture
+def slow_query_log():
+    """
+    Подключает к движку отдельный журнал медленных запросов на время теста.
+    """
+    logs = []
+
+    def install(**kwargs):
+        log = SlowQueryLog(engine, **kwargs)
+        log.install()
+        logs.append(log)
+        return log
+
+    yield install
+    for log in logs:
+        log.remove()
+        if log._executor is not None:
+            log._executor.shutdown(wait=True)
+
+
+def test_slow_query_is_logged_with_origin(db_session, slow_query_log, caplog):
+    '''
+    Проверяет, что запрос дольше порога пишется в лог с параметрами и функцией crud.py.
+    '''
+    slow_query_log(threshold_ms=0)
+
+    with caplog.at_level(logging.WARNING, logger="database"):
+        with SessionLocal() as db:
+            crud.get_menu_with_counts(db, db_session.query(crud.models.Menu).first().id)
+
+    messages = [record.getMessage() for record in caplog.records]
+    assert any("in crud.get_menu_with_counts:" in message and "parameters:" in message for message in messages)
+
+
+def test_fast_query_is_not_logged(db_session, slow_query_log, caplog):
+    '''
+    Проверяет, что запросы быстрее порога не попадают в лог.
+    '''
+    slow_query_log(threshold_ms=60_000)
+
+    with caplog.at_level(logging.WARNING, logger="database"):
+        with SessionLocal() as db:
+            crud.get_menus(db)
+
+    assert not [record for record in caplog.records if "slow query" in record.getMessage()]
+
+
+@pytest.mark.skipif(engine.dialect.name != "postgresql", reason="EXPLAIN (ANALYZE, BUFFERS) есть только в Postgres")
+def test_plan_is_captured_for_slow_select_only(db_session, slow_query_log, caplog):
+    '''
+    Проверяет, что план снимается в фоне для медленного SELECT и не снимается для записи.
+    '''
+    log = slow_query_log(threshold_ms=0, explain=True)
+
+    with caplog.at_level(logging.WARNING, logger="database"):
+        with SessionLocal() as db:
+            crud.get_menus(db)
+            crud.create_menu(db, schemas.MenuCreate(title="Explained", description="Explained"))
+        log._executor.shutdown(wait=True)
+
+    plans = [record.getMessage() for record in caplog.records if record.getMessage().startswith("plan of slow query")]
+    assert any("in crud.get_menus:" in plan and "actual time" in plan for plan in plans)
+    assert not any("INSERT" in plan for plan in plans)
@@ -0,0 +1,187 @@
+import threading
+import time
+
+import pytest
+
+import main
+import snapshot
+from models import Dish, SubMenu
+
+
+@pytest.fixture
+def writer(tmp_path, monkeypatch):
+    """
+    Включает режим снимка с файлом во временном каталоге; фоновый поток не запускается.
+    """
+    path = tmp_path / "catalogue.json"
+    writer = snapshot.SnapshotWriter(main.render_catalogue, path, debounce=0.05, max_delay=0.5)
+    monkeypatch.setattr(snapshot, "writer", writer)
+    monkeypatch.setattr(snapshot, "files", {
+        None: snapshot.MappedFile(path),
+        "gzip": snapshot.MappedFile(path.with_name(path.name + ".gz")),
+    })
+    return writer
+
+
+@pytest.fixture
+def submenu(db_session, create_test_menu):
+    submenu = SubMenu(title="Snapshot", description="Snapshot", menu_id=create_test_menu.id)
+    db_session.add(submenu)
+    db_session.commit()
+    db_session.add_all([
+        Dish(title=f"Снимок {i}", description="Snapshot", price="12", submenu_id=submenu.id) for i in range(2)
+    ])
+    db_session.commit()
+    return submenu
+
+
+def test_snapshot_matches_api(client, writer, submenu):
+    '''
+    Проверяет, что снимок содержит все меню с подменю и блюдами в тех же схемах, что и API.
+    '''
+    writer.build()
+
+    response = client.get("/api/v1/snapshot", headers={"Accept-Encoding": "identity"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    menus = {menu["id"]: menu for menu in response.json()["menus"]}
+    menu = menus[str(submenu.menu_id)]
+    api_menu = client.get(f"/api/v1/menus/{submenu.menu_id}").json()
+    assert {key: menu[key] for key in api_menu} == api_menu
+    assert menu["dishes_count"] == 2
+    api_dishes = client.get(f"/api/v1/menus/{submenu.menu_id}/submenus/{submenu.id}/dishes").json()
+    assert menu["submenus"][0]["dishes"] == sorted(api_dishes, key=lambda dish: dish["id"])
+
+
+def test_gzip_variant_and_etag(client, writer, submenu):
+    '''
+    Проверяет, что клиенту с gzip отдается заранее сжатый вариант, а совпавший ETag дает 304.
+    '''
+    writer.build()
+
+    plain = client.get("/api/v1/snapshot", headers={"Accept-Encoding": "identity"})
+    packed = client.get("/api/v1/snapshot", headers={"Accept-Encoding": "gzip"})
+
+    assert packed.headers["content-encoding"] == "gzip"
+    assert int(packed.headers["content-length"]) < int(plain.headers["content-length"])
+    assert packed.json() == plain.json()
+    cached = client.get("/api/v1/snapshot", headers={"Accept-Encoding": "identity",
+                                                     "If-None-Match": plain.headers["etag"]})
+    assert cached.status_code == 304
+
+
+def test_snapshot_unavailable(client, writer, monkeypatch):
+    '''
+    Проверяет 503 до первой сборки и 404 без режима снимка.
+    '''
+    response = client.get("/api/v1/snapshot")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+    monkeypatch.setattr(snapshot, "writer", None)
+    assert client.get("/api/v1/snapshot").status_code == 404
+
+
+def test_write_schedules_rebuild(client, writer, create_test_menu):
+    '''
+    Проверяет, что зафиксированная запись планирует пересборку снимка.
+    '''
+    client.patch(f"/api/v1/menus/{create_test_menu.id}", json={"title": "Changed", "description": "Changed"})
+
+    assert writer._first is not None
+
+
+def test_writes_are_debounced(tmp_path):
+    '''
+    Проверяет, что серия записей дает одну пересборку после паузы.
+    '''
+    built = threading.Event()
+    writer = snapshot.SnapshotWriter(lambda: built.set() or b"[]", tmp_path / "catalogue.json",
+                                     debounce=0.2, max_delay=5.0)
+    writer.start()
+
+    for _ in range(10):
+        writer.schedule()
+        time.sleep(0.01)
+
+    assert built.wait(timeout=5)
+    time.sleep(0.3)
+    assert writer.builds == 1
+    assert (tmp_path / "catalogue.json").read_bytes() == b"[]"
+
+
+def test_unchanged_database_is_not_rebuilt(tmp_path):
+    '''
+    Проверяет, что снимок не пересобирается, пока отметка изменений не сдвинулась,
+    в том числе другим процессом с тем же путем.
+    '''
+    renders = []
+    watermark = [7]
+    path = tmp_path / "catalogue.json"
+
+    def make_writer():
+        return snapshot.SnapshotWriter(lambda: renders.append(1) or b"[]", path, watermark=lambda: watermark[0])
+
+    make_writer().build()
+    other = make_writer()
+    other.build()
+    assert len(renders) == 1
+    assert other.skipped == 1
+
+    watermark[0] = 8
+    other.build()
+    assert len(renders) == 2
+
+
+def test_concurrent_startup_builds_once(tmp_path):
+    '''
+    Проверяет, что одновременный запуск нескольких процессов дает одну сборку снимка.
+    '''
+    renders = []
+
+    def render():
+        renders.append(1)
+        time.sleep(0.1)
+        return b"[]"
+
+    writers = [snapshot.SnapshotWriter(render, tmp_path / "catalogue.json", watermark=lambda: 1) for _ in range(4)]
+    threads = [threading.Thread(target=writer.build) for writer in writers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(renders) == 1
+    assert sum(writer.skipped for writer in writers) == 3
+
+
+def test_catalogue_watermark_moves_on_write(client, create_test_menu):
+    '''
+    Проверяет, что отметка изменений для снимка сдвигается при обновлении и при удалении.
+    '''
+    url = f"/api/v1/menus/{create_test_menu.id}"
+    before = main.catalogue_watermark()
+    client.patch(url, json={"title": "Changed", "description": "Changed"})
+    updated = main.catalogue_watermark()
+    client.delete(url)
+
+    assert before < updated < main.catalogue_watermark()
+
+
+def test_mapped_file_follows_replacement(tmp_path):
+    '''
+    Проверяет, что после атомарной замены файла отображение и ETag обновляются.
+    '''
+    path = tmp_path / "catalogue.json"
+    snapshot.write_atomic(path, b'{"v": 1}')
+    mapped_file = snapshot.MappedFile(path)
+    old, old_etag = mapped_file.load()
+
+    snapshot.write_atomic(path, b'{"v": 22}')
+    new, new_etag = mapped_file.load()
+
+    assert old[:] == b'{"v": 1}'
+    assert new[:] == b'{"v": 22}'
+    assert new_etag != old_etag
+    assert [item.name for item in tmp_path.iterdir()] == ["catalogue.json"]
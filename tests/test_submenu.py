@@ -1,10 +1,5 @@
-from fastapi.testclient import TestClient
-
-from main import app
 from models import Menu, SubMenu
 
-client = TestClient(app)
-
 
 def test_create_submenu(db_session, client):
     """
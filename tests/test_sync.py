@@ -0,0 +1,162 @@
+import json
+import sys
+import uuid
+from dataclasses import replace
+
+import pytest
+from sqlalchemy import event
+
+import cache
+import events
+import main
+import models
+import snapshot
+import sync
+from config import CacheConfig, SnapshotConfig
+from database import engine
+from events import EventBroker
+from pubsub import LocalPubSub
+from sync import sync_file
+
+HEADER = "menu_title,menu_description,submenu_title,submenu_description,dish_title,dish_description,dish_price\n"
+
+CATALOGUE = HEADER + (
+    "Lunch,Lunch menu,Soups,Hot soups,Borsch,Beet soup,5.50\n"
+    "Lunch,Lunch menu,Soups,Hot soups,Solyanka,Meat soup,6.00\n"
+    "Lunch,Lunch menu,Salads,Fresh salads,Olivier,Classic,4.00\n"
+    "Dinner,Dinner menu,,,,,\n"
+)
+
+
+@pytest.fixture
+def sync_session(db_session):
+    """
+    Сессия теста с пустым каталогом: файл - эталон всего каталога.
+    """
+    for model in (models.Dish, models.SubMenu, models.Menu):
+        db_session.query(model).delete()
+    db_session.commit()
+    return db_session
+
+
+@pytest.fixture
+def catalogue_file(tmp_path):
+    path = tmp_path / "menu.csv"
+    path.write_text(CATALOGUE, encoding="utf-8")
+    return path
+
+
+def test_first_sync_creates_catalogue(sync_session, catalogue_file):
+    '''
+    Проверяет, что первая синхронизация создает все меню, подменю и блюда из файла.
+    '''
+    report = sync_file(sync_session, catalogue_file)
+
+    assert not report.skipped
+    assert report.count("menu", "create") == 2
+    assert report.count("submenu", "create") == 2
+    assert report.count("dish", "create") == 3
+    titles = {menu.title for menu in sync_session.query(models.Menu).all()}
+    assert titles == {"Lunch", "Dinner"}
+
+
+def test_unchanged_file_is_skipped(sync_session, catalogue_file):
+    '''
+    Проверяет, что повторная синхронизация того же файла пропускается по хэшу.
+    '''
+    sync_file(sync_session, catalogue_file)
+    report = sync_file(sync_session, catalogue_file)
+
+    assert report.skipped
+    assert report.changes == []
+
+
+def test_only_diff_is_applied(sync_session, catalogue_file):
+    '''
+    Проверяет, что применяются только отличия, а неизмененные строки не переписываются.
+    '''
+    sync_file(sync_session, catalogue_file)
+    olivier = sync_session.query(models.Dish).filter_by(title="Olivier").one()
+    untouched_seq = olivier.change_seq
+
+    catalogue_file.write_text(HEADER + (
+        "Lunch,Lunch menu,Soups,Hot soups,Borsch,Beet soup,5.9\n"
+        "Lunch,Lunch menu,Soups,Hot soups,Shchi,Cabbage soup,4.5\n"
+        "Lunch,Lunch menu,Salads,Fresh salads,Olivier,Classic,4\n"
+    ), encoding="utf-8")
+    report = sync_file(sync_session, catalogue_file)
+
+    changes = sorted((change["op"], change["entity"], change["title"]) for change in report.changes)
+    assert changes == [
+        ("create", "dish", "Shchi"),
+        ("delete", "dish", "Solyanka"),
+        ("delete", "menu", "Dinner"),
+        ("update", "dish", "Borsch"),
+    ]
+    sync_session.expire_all()
+    assert sync_session.query(models.Dish).filter_by(title="Olivier").one().change_seq == untouched_seq
+    assert sync_session.query(models.Dish).filter_by(title="Borsch").one().price == "5.9"
+
+
+def test_dry_run_does_not_write(sync_session, catalogue_file):
+    '''
+    Проверяет, что пробный запуск сообщает изменения, но не применяет их.
+    '''
+    report = sync_file(sync_session, catalogue_file, dry_run=True)
+
+    assert report.count("dish", "create") == 3
+    assert sync_session.query(models.Menu).filter_by(title="Lunch").count() == 0
+    assert sync_session.get(models.SyncState, catalogue_file.name) is None
+
+
+def test_events_carry_seqs_without_select_per_row(sync_session, catalogue_file, monkeypatch):
+    '''
+    Проверяет, что события синхронизации несут отметки строк, а отметки читаются
+    не отдельным запросом на строку.
+    '''
+    catalogue_file.write_text(HEADER + "".join(
+        f"Lunch,Lunch menu,Soups,Hot soups,Soup {i},Soup,{i}\n" for i in range(40)
+    ), encoding="utf-8")
+    pubsub, messages, selects = LocalPubSub(), [], []
+    monkeypatch.setattr(events, "broker", EventBroker(pubsub))
+    pubsub.subscribe(events.broker.channel, lambda message: messages.append(json.loads(message)))
+
+    def count_selects(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            selects.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count_selects)
+    try:
+        report = sync_file(sync_session, catalogue_file)
+    finally:
+        event.remove(engine, "before_cursor_execute", count_selects)
+
+    assert len(report.changes) == 42
+    assert len(selects) < 20
+    seqs = dict(sync_session.query(models.Dish.id, models.Dish.change_seq))
+    dish_events = [message for message in messages if message["entity"] == "dish"]
+    assert len(dish_events) == 40
+    assert all(message["seq"] == seqs[uuid.UUID(message["id"])] for message in dish_events)
+
+
+def test_cli_configures_cache_events_and_snapshot(sync_session, catalogue_file, tmp_path, monkeypatch):
+    '''
+    Проверяет, что запуск из командной строки настраивает кэш, события и снимок как приложение
+    и собирает снимок до выхода.
+    '''
+    path = tmp_path / "catalogue.json"
+    config = replace(main.app_config, cache=CacheConfig(enabled=True),
+                     snapshot=SnapshotConfig(enabled=True, path=str(path)))
+    monkeypatch.setattr(sync, "load_config", lambda path: config)
+    monkeypatch.setattr(sys, "argv", ["sync.py", str(catalogue_file)])
+    monkeypatch.setattr(cache, "catalogue_cache", None)
+    monkeypatch.setattr(events, "broker", EventBroker(LocalPubSub()))
+    monkeypatch.setattr(snapshot, "writer", None)
+    monkeypatch.setattr(snapshot, "files", {})
+
+    sync.main()
+
+    assert cache.catalogue_cache is not None
+    assert events.broker.channel == config.events.channel
+    assert snapshot.writer.builds == 1
+    assert {menu["title"] for menu in json.loads(path.read_bytes())["menus"]} == {"Lunch", "Dinner"}
@@ -0,0 +1,107 @@
+import pytest
+
+import crud
+import schemas
+from database import SessionLocal
+from models import Dish, SubMenu
+
+
+@pytest.fixture
+def dish(db_session, create_test_menu):
+    submenu = SubMenu(title="Versions", description="Versions", menu_id=create_test_menu.id)
+    db_session.add(submenu)
+    db_session.commit()
+    dish = Dish(title="Versioned", description="Versions", price="10", submenu_id=submenu.id)
+    db_session.add(dish)
+    db_session.commit()
+    return dish
+
+
+def test_if_match_accepts_current_version(client, create_test_menu):
+    '''
+    Проверяет, что GET отдает ETag с версией, а PATCH с этим ETag проходит и возвращает новую версию.
+    '''
+    url = f"/api/v1/menus/{create_test_menu.id}"
+    etag = client.get(url).headers["etag"]
+
+    response = client.patch(url, json={"title": "First", "description": "First"}, headers={"If-Match": etag})
+
+    assert etag == '"1"'
+    assert response.status_code == 200
+    assert response.json()["title"] == "First"
+    assert response.headers["etag"] == '"2"'
+    assert client.get(url).headers["etag"] == '"2"'
+
+
+def test_stale_if_match_is_rejected(client, create_test_menu):
+    '''
+    Проверяет, что запись по устаревшему ETag дает 412 с текущей версией и не меняет меню.
+    '''
+    url = f"/api/v1/menus/{create_test_menu.id}"
+    etag = client.get(url).headers["etag"]
+    client.patch(url, json={"title": "First", "description": "First"}, headers={"If-Match": etag})
+
+    response = client.patch(url, json={"title": "Second", "description": "Second"}, headers={"If-Match": etag})
+
+    assert response.status_code == 412
+    assert response.headers["etag"] == '"2"'
+    assert client.get(url).json()["title"] == "First"
+
+
+def test_without_if_match_last_writer_wins(client, create_test_menu):
+    '''
+    Проверяет, что без If-Match обновление применяется к любой версии и увеличивает ее.
+    '''
+    url = f"/api/v1/menus/{create_test_menu.id}"
+    for title in ("First", "Second"):
+        response = client.patch(url, json={"title": title, "description": title})
+        assert response.status_code == 200
+
+    assert response.headers["etag"] == '"3"'
+    assert client.get(url).json()["title"] == "Second"
+
+
+@pytest.mark.parametrize("if_match, status_code", [("*", 200), ('W/"1"', 412), ('"abc"', 412), ('"7", "1"', 200)])
+def test_if_match_forms(client, create_test_menu, if_match, status_code):
+    '''
+    Проверяет "*", слабый и чужой ETag и список ETag в If-Match.
+    '''
+    response = client.patch(f"/api/v1/menus/{create_test_menu.id}", json={"title": "New", "description": "New"},
+                            headers={"If-Match": if_match})
+
+    assert response.status_code == status_code
+
+
+def test_submenu_and_dish_versions(client, dish):
+    '''
+    Проверяет ETag и 412 для подменю и блюда; у отсутствующего блюда остается 404.
+    '''
+    submenu_url = f"/api/v1/menus/{dish.menu_id}/submenus/{dish.submenu_id}"
+    dish_url = f"{submenu_url}/dishes/{dish.id}"
+    body = {"title": "Changed", "description": "Changed", "price": "11"}
+
+    submenu_etag = client.get(submenu_url).headers["etag"]
+    dish_etag = client.get(dish_url).headers["etag"]
+    assert client.patch(submenu_url, json=body, headers={"If-Match": submenu_etag}).status_code == 200
+    assert client.patch(submenu_url, json=body, headers={"If-Match": submenu_etag}).status_code == 412
+    updated = client.patch(dish_url, json=body, headers={"If-Match": dish_etag})
+    assert updated.status_code == 200
+    assert updated.json()["title"] == "Changed"
+    assert client.patch(dish_url, json=body, headers={"If-Match": dish_etag}).status_code == 412
+    missing = f"{submenu_url}/dishes/{dish.submenu_id}"
+    assert client.patch(missing, json=body, headers={"If-Match": dish_etag}).status_code == 404
+
+
+def test_orm_writes_bump_version(db_session, create_test_menu):
+    '''
+    Проверяет, что обновление через ORM (например, синхронизацией) тоже увеличивает версию,
+    и crud отвергает запись по прочитанной до него версии.
+    '''
+    create_test_menu.title = "Synced"
+    db_session.commit()
+
+    assert create_test_menu.version == 2
+    with SessionLocal() as db, pytest.raises(crud.VersionConflictError) as error:
+        crud.update_menu(db, create_test_menu.id, schemas.MenuUpdate(title="Stale", description="Stale"),
+                         versions=(1,))
+    assert error.value.version == 2
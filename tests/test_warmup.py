@@ -0,0 +1,91 @@
+import time
+
+import pytest
+from sqlalchemy import func, select
+from starlette.testclient import TestClient
+
+import crud
+import main
+from database import SessionLocal
+from models import Menu
+from warmup import Warmup
+
+
+@pytest.fixture
+def warmup(engine, tables, monkeypatch):
+    warmup = Warmup(engine, SessionLocal, connections=2)
+    monkeypatch.setattr(main, "warmup", warmup)
+    return warmup
+
+
+def test_warm_up_runs_hot_statements_without_writes(db_session):
+    '''
+    Проверяет, что прогрев выполняет горячие запросы crud.py и не меняет данные.
+    '''
+    menus = db_session.scalar(select(func.count()).select_from(Menu))
+
+    executed = crud.warm_up(db_session)
+
+    assert executed == len(crud._WARM_UP) + 2
+    assert db_session.scalar(select(func.count()).select_from(Menu)) == menus
+
+
+def test_warmup_sets_ready(warmup, engine):
+    '''
+    Проверяет, что после прогрева процесс готов, а соединения остались в пуле.
+    '''
+    warmup.start()
+
+    assert warmup.wait(timeout=30)
+    assert warmup.error is None
+    assert warmup.status()["status"] == "ready"
+    if hasattr(engine.pool, "checkedin"):
+        assert engine.pool.checkedin() >= 2
+
+
+def test_failed_warmup_is_not_ready_until_retry_succeeds(warmup):
+    '''
+    Проверяет, что после ошибки прогрева процесс не готов (status="failed", 503), а повтор делает его готовым.
+    '''
+    factory = warmup.session_factory
+    calls = []
+
+    def flaky_factory(**kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("no database")
+        return factory(**kwargs)
+
+    warmup.session_factory = flaky_factory
+    warmup.retry_interval = 0.5
+
+    warmup.start()
+
+    client = TestClient(main.app)
+    time.sleep(0.2)
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "failed"
+    assert "no database" in response.json()["error"]
+    assert warmup.wait(timeout=5)
+    assert warmup.status()["status"] == "ready"
+    assert warmup.status()["attempts"] == 2
+    assert warmup.status()["error"] is None
+
+
+def test_health_endpoints(warmup):
+    '''
+    Проверяет, что /health/live отвечает сразу, а /health/ready - только после прогрева.
+    '''
+    client = TestClient(main.app)
+
+    assert client.get("/health/live").status_code == 200
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "warming"
+
+    warmup.run()
+
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
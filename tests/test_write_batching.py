@@ -0,0 +1,131 @@
+import threading
+import uuid
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+
+import main
+import schemas
+from coalescing import WriteBatcher
+from database import engine
+from models import Dish, Menu, SubMenu
+
+CALLERS = 10
+
+
+def submit_concurrently(batcher, items):
+    """
+    Отправляет элементы в batcher из отдельных потоков одновременно.
+    Возвращает для каждого элемента результат или исключение.
+    """
+    barrier = threading.Barrier(len(items))
+    results = [None] * len(items)
+
+    def worker(index):
+        barrier.wait()
+        try:
+            results[index] = batcher.submit(items[index])
+        except Exception as error:
+            results[index] = error
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(items))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@pytest.fixture
+def submenu(db_session):
+    menu = Menu(title="Batch", description="Batch")
+    db_session.add(menu)
+    db_session.flush()
+    submenu = SubMenu(title="Batch", description="Batch", menu_id=menu.id)
+    db_session.add(submenu)
+    db_session.commit()
+    return submenu
+
+
+@pytest.fixture
+def dish_inserts():
+    """
+    Считает INSERT в таблицу блюд, выполненные через движок приложения.
+    """
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO dishes"):
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    yield statements
+    event.remove(engine, "before_cursor_execute", count)
+
+
+def dish(title):
+    return schemas.DishCreate(title=title, description="Batch", price="10.5")
+
+
+def test_concurrent_creates_share_one_insert(submenu, dish_inserts):
+    '''
+    Проверяет, что одновременные создания блюд записываются одним INSERT и каждый вызов получает свою строку.
+    '''
+    batcher = WriteBatcher(main.create_dishes, window=0.05)
+
+    results = submit_concurrently(batcher, [(dish(f"Dish {i}"), submenu.id, submenu.menu_id) for i in range(CALLERS)])
+
+    assert len(dish_inserts) == 1
+    assert [result.title for result in results] == [f"Dish {i}" for i in range(CALLERS)]
+    assert len({result.id for result in results}) == CALLERS
+
+
+def test_duplicate_titles_resolve_to_one_dish(db_session, submenu):
+    '''
+    Проверяет, что повтор названия в пачке и название существующего блюда возвращают уже имеющееся блюдо.
+    '''
+    stored = Dish(title="Stored", description="Batch", price="1", submenu_id=submenu.id)
+    db_session.add(stored)
+    db_session.commit()
+    batcher = WriteBatcher(main.create_dishes, window=0.05)
+
+    results = submit_concurrently(batcher, [
+        (dish("Stored"), submenu.id, submenu.menu_id),
+        (dish("Twice"), submenu.id, submenu.menu_id),
+        (dish("Twice"), submenu.id, submenu.menu_id),
+    ])
+
+    assert results[0].id == stored.id
+    assert results[1].id == results[2].id
+    assert db_session.query(Dish).filter(Dish.submenu_id == submenu.id).count() == 2
+
+
+def test_failed_row_does_not_fail_the_batch(db_session, submenu):
+    '''
+    Проверяет, что ошибка одной строки достается только ее запросу, а остальные блюда создаются.
+    '''
+    batcher = WriteBatcher(main.create_dishes, window=0.05)
+
+    results = submit_concurrently(batcher, [
+        (dish("Good 1"), submenu.id, submenu.menu_id),
+        (dish("Orphan"), uuid.uuid4(), submenu.menu_id),
+        (dish("Good 2"), submenu.id, submenu.menu_id),
+    ])
+
+    assert isinstance(results[1], IntegrityError)
+    assert [results[0].title, results[2].title] == ["Good 1", "Good 2"]
+    assert {row.title for row in db_session.query(Dish).filter(Dish.submenu_id == submenu.id)} == {"Good 1", "Good 2"}
+
+
+def test_endpoint_uses_batcher(client, submenu, monkeypatch):
+    '''
+    Проверяет, что при включенной групповой записи маршрут создания блюда отвечает созданным блюдом.
+    '''
+    monkeypatch.setattr(main, "dish_batcher", WriteBatcher(main.create_dishes))
+
+    response = client.post(f"/api/v1/menus/{submenu.menu_id}/submenus/{submenu.id}/dishes",
+                           json={"title": "Posted", "description": "Batch", "price": "12.5"})
+
+    assert response.status_code == 201
+    assert response.json()["title"] == "Posted"
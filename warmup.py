@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+
+from sqlalchemy import text
+
+import crud
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup:
+    """
+    Прогрев процесса после запуска: заранее открывает соединения пула и выполняет горячие
+    запросы crud.py, чтобы первые запросы клиентов не платили за подключение к БД,
+    аутентификацию, настройку мапперов и компиляцию SQL.
+
+    Прогрев идет в фоновом потоке, пока процесс уже отвечает на /health/live; ready
+    выставляется только после успешного прогрева. Ошибка (обычно недоступная БД) пишется
+    в лог и в статус, а прогрев повторяется с растущей паузой, пока не пройдет: до этого
+    /health/ready отвечает 503, и балансировщик не направляет трафик на процесс без БД.
+
+    Args:
+    engine: Движок SQLAlchemy.
+    session_factory: Фабрика сессий, через которую работают запросы приложения.
+    connections (int): Сколько соединений открыть заранее; 0 - размер пула.
+    raiseload (bool): Значение session.info["raiseload"], как в get_db, чтобы прогреть
+    те же варианты запросов.
+    retry_interval (float): Пауза перед первым повтором в секундах; удваивается после
+    каждой неудачи, но не больше max_retry_interval.
+    max_retry_interval (float): Наибольшая пауза между повторами в секундах.
+    """
+
+    def __init__(self, engine, session_factory, connections: int = 0, raiseload: bool = True,
+                 retry_interval: float = 1.0, max_retry_interval: float = 30.0):
+        self.engine = engine
+        self.session_factory = session_factory
+        self.connections = connections
+        self.raiseload = raiseload
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.ready = threading.Event()
+        self.error = None
+        self.seconds = None
+        self.attempts = 0
+        self._thread = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self.ready.wait(timeout)
+
+    def run(self) -> None:
+        """
+        Повторяет прогрев, пока он не пройдет.
+        """
+        delay = self.retry_interval
+        while not self.attempt():
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_retry_interval)
+
+    def attempt(self) -> bool:
+        """
+        Одна попытка прогрева. После успешной процесс становится готовым.
+
+        Returns:
+        bool: True, если прогрев прошел.
+        """
+        self.attempts += 1
+        started = time.perf_counter()
+        try:
+            opened = self._open_connections()
+            statements = self._prepare_statements()
+        except Exception as error:
+            self.error = repr(error)
+            logger.exception("warm-up attempt %d failed", self.attempts)
+            return False
+        finally:
+            self.seconds = time.perf_counter() - started
+        logger.info("warm-up: %d connections, %d statements in %.0f ms",
+                    opened, statements, self.seconds * 1000)
+        self.error = None
+        self.ready.set()
+        return True
+
+    def _pool_size(self) -> int:
+        # У StaticPool (SQLite в памяти) одно соединение и нет size()
+        size = getattr(self.engine.pool, "size", None)
+        return size() if callable(size) else 1
+
+    def _open_connections(self) -> int:
+        # Соединения берутся одновременно, иначе пул отдавал бы одно и то же
+        count = min(self.connections or self._pool_size(), self._pool_size())
+        connections = []
+        try:
+            for _ in range(count):
+                connection = self.engine.connect()
+                connections.append(connection)
+                connection.execute(text("SELECT 1"))
+        finally:
+            for connection in connections:
+                connection.close()
+        return count
+
+    def _prepare_statements(self) -> int:
+        # bind задается явно: прогрев идет через пул движка, даже если фабрика перенастроена
+        with self.session_factory(bind=self.engine) as db:
+            db.info["raiseload"] = self.raiseload
+            return crud.warm_up(db)
+
+    def status(self) -> dict:
+        """
+        Returns:
+        dict: Статус ready, warming (первая попытка идет) или failed (последняя попытка
+        не удалась, прогрев будет повторен), длительность последней попытки, число попыток
+        и ошибка последней неудачной попытки.
+        """
+        if self.ready.is_set():
+            state = "ready"
+        elif self.error is not None:
+            state = "failed"
+        else:
+            state = "warming"
+        return {
+            "status": state,
+            "warmup_ms": round(self.seconds * 1000, 1) if self.seconds is not None else None,
+            "attempts": self.attempts,
+            "error": self.error,
+        }